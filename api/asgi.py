@@ -0,0 +1,19 @@
+# asgi.py
+"""ASGI entry point serving the catalog reads on an async engine, e.g.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5100 --workers 2
+
+GET /api/books, /api/participants and /api/roles (lists and single items) await
+their queries on an AsyncSession and GET /api/events streams on the event loop;
+every other request runs on the Flask app.
+"""
+import os
+
+from app import create_app
+from services.async_reads import AsyncReadApp
+
+flask_app = create_app(os.getenv('FLASK_CONFIG', 'prod'))
+
+import routes.async_routes  # noqa: E402,F401  registers the async read handlers
+
+app = AsyncReadApp(flask_app)
@@ -0,0 +1,83 @@
+# benchmarks/autocomplete_bench.py
+"""Time lookups in the autocomplete prefix index at catalog scale, without a database.
+
+Builds a LiveIndex of synthetic titles or participant names (the generators of
+benchmarks.catalog_gen) and times searches for prefixes typed from existing
+entries, one keystroke at a time. Run from the api/ directory:
+
+    python -m benchmarks.autocomplete_bench --entries 1000000
+    python -m benchmarks.autocomplete_bench --entries 1000000 --kind participant --limit 10
+"""
+import argparse
+import random
+import statistics
+import time
+
+from services.autocomplete import LiveIndex
+from .catalog_gen import CatalogGenerator
+
+
+def entries(kind, count, seed):
+    generator = CatalogGenerator(seed)
+    if kind == 'title':
+        return [(i, generator.title()) for i in range(1, count + 1)]
+    return [(row['participantid'], row['name']) for row in generator.participant_rows(count, 1)]
+
+
+def typed_queries(labels, count, rng):
+    """Prefixes of existing labels, as typed: 1 to 20 characters, sometimes
+    starting at a later word, sometimes with a last character that matches nothing."""
+    queries = []
+    for _ in range(count):
+        label = rng.choice(labels)
+        words = label.split()
+        start = rng.randrange(len(words)) if rng.random() < 0.3 else 0
+        text = ' '.join(words[start:])
+        query = text[:rng.randint(1, min(20, len(text)))]
+        if rng.random() < 0.1:
+            query += 'q'
+        queries.append(query)
+    return queries
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--kind', choices=('title', 'participant'), default='title')
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rows = entries(args.kind, args.entries, args.seed)
+    started = time.perf_counter()
+    index = LiveIndex(rows)
+    print(f'Built an index of {len(index)} {args.kind}s and {len(index.base.suffix_ids)} later words '
+          f'in {time.perf_counter() - started:.1f}s')
+
+    rng = random.Random(args.seed)
+    queries = typed_queries([label for _, label in rows], args.queries, rng)
+    timings, empty = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        found = index.search(query, args.limit)
+        timings.append(time.perf_counter() - started)
+        empty += not found
+    timings.sort()
+    print(f'{len(queries)} searches, {empty} without suggestions: '
+          f'mean {statistics.fmean(timings) * 1e6:.0f}us, p50 {percentile(timings, 0.5) * 1e6:.0f}us, '
+          f'p99 {percentile(timings, 0.99) * 1e6:.0f}us, max {timings[-1] * 1e6:.0f}us')
+
+    # Incremental maintenance, as done for each write reported by catalog_changed
+    started = time.perf_counter()
+    for entry_id, label in rows[:1000]:
+        index.add(entry_id, label[::-1])
+    print(f'1000 updates in {(time.perf_counter() - started) * 1e3:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Check that writes evict every cached response they make stale.
+
+Each check creates a book, a participant and a role through the API, caches GET
+responses that embed them (including `fields=` projections that leave the ids
+out), makes one write and compares what the cache then serves with a fresh
+rendering of the same URL. Run from the api/ directory against a migrated
+database; the checks delete their rows again, so the catalog is left as it was:
+
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.cache_check
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.cache_check --checks 'role.*'
+
+Exits with status 1 when a write leaves a stale response in the cache, so it can
+gate changes to the cache tags of views in CI.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import random
+import sys
+
+
+class Rows:
+    """A throwaway book, participant and role, optionally assigned to each other, and
+    a spare role to move the assignment to."""
+
+    def __init__(self, client, rng, assigned=True):
+        self.client = client
+        self.roleid, self.spare_roleid = (
+            client.post('/api/roles/', json={'description': f'Check {rng.getrandbits(64):x}'}).json['roleid']
+            for _ in range(2))
+        self.participantid = client.post(
+            '/api/participants/', json={'name': f'Check {rng.getrandbits(32)}'}).json['participantid']
+        self.bookid = client.post('/api/books/', json={
+            'title': 'Cache check', 'isbn': f'check-{rng.getrandbits(64):016x}'}).json['bookid']
+        if assigned:
+            self.assign()
+
+    def assign(self):
+        return self.client.post(f'/api/books/{self.bookid}/participants', json={
+            'participant': {'participantid': self.participantid}, 'role': {'roleid': self.roleid}})
+
+    def delete(self):
+        # Assignments go with the book; participants and roles are only deleted unassigned
+        self.client.delete(f'/api/books/{self.bookid}')
+        self.client.delete(f'/api/participants/{self.participantid}')
+        self.client.delete(f'/api/roles/{self.roleid}')
+        self.client.delete(f'/api/roles/{self.spare_roleid}')
+
+
+def embedding_paths(rows):
+    """GETs whose responses embed the book, participant and role of `rows`."""
+    b, p, r = rows.bookid, rows.participantid, rows.roleid
+    return [
+        f'/api/books/{b}', f'/api/books/{b}?fields=participants', f'/api/books/{b}?fields=title',
+        f'/api/books/?ids={b}', f'/api/books/?ids={b}&fields=participants', f'/api/books/?ids={b}&fields=title',
+        f'/api/books/{b}/participants', f'/api/books/{b}/roles/{r}/participants',
+        f'/api/participants/{p}', f'/api/participants/{p}?fields=name', f'/api/participants/?ids={p}&fields=name',
+        f'/api/participants/{p}/books',
+        f'/api/roles/{r}', f'/api/roles/{r}?fields=description', f'/api/roles/?ids={r}&fields=description',
+    ]
+
+
+# name -> (whether the rows start assigned, write made once the responses are cached)
+CHECKS = {
+    'assignment.create': (False, lambda rows: rows.assign()),
+    'assignment.update': (True, lambda rows: rows.client.put(
+        f'/api/books/{rows.bookid}/participants/{rows.participantid}/role/{rows.spare_roleid}')),
+    'assignment.replace': (True, lambda rows: rows.client.put(
+        f'/api/books/{rows.bookid}/participants', json=[])),
+    'book.put': (True, lambda rows: rows.client.put(
+        f'/api/books/{rows.bookid}', json={'title': 'Cache check, put'})),
+    'book.patch': (True, lambda rows: rows.client.patch(
+        f'/api/books/{rows.bookid}', json={'title': 'Cache check, patched'})),
+    'participant.put': (True, lambda rows: rows.client.put(
+        f'/api/participants/{rows.participantid}', json={'name': 'Cache check, renamed'})),
+    'role.put': (True, lambda rows: rows.client.put(
+        f'/api/roles/{rows.roleid}', json={'description': f'Cache check {rows.roleid}, renamed'})),
+}
+
+
+def compact(response, limit=200):
+    return json.dumps(response.json, separators=(',', ':'))[:limit]
+
+
+def run_check(name, client, cache, rng):
+    """Problems found by check `name`: uncached warm-ups and stale responses."""
+    assigned, write = CHECKS[name]
+    rows = Rows(client, rng, assigned)
+    problems = []
+    try:
+        cache.backend.clear()
+        paths = embedding_paths(rows)
+        for path in paths:
+            client.get(path)
+            response = client.get(path)
+            if response.status_code == 200 and response.headers.get('X-Cache') != 'HIT':
+                problems.append(f'{path} is not cached')
+        status = write(rows).status_code
+        if status >= 400:
+            problems.append(f'the write failed with {status}')
+        served = {path: client.get(path) for path in paths}
+        cache.backend.clear()
+        for path, response in served.items():
+            fresh = client.get(path)
+            if (response.status_code, response.get_data()) != (fresh.status_code, fresh.get_data()):
+                problems.append(f'{path} stale ({response.headers.get("X-Cache")}): '
+                                f'{compact(response)} instead of {compact(fresh)}')
+    finally:
+        rows.delete()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--checks', nargs='*', help='Check names or globs, e.g. "role.*" (default: all)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    names = [name for name in CHECKS if not args.checks
+             or any(fnmatch.fnmatchcase(name, pattern) for pattern in args.checks)]
+    if not names:
+        parser.error('no check matches ' + ' '.join(args.checks))
+
+    os.environ['CACHE_TYPE'] = 'lru'
+    from app import create_app
+
+    app = create_app(os.getenv('FLASK_CONFIG', 'dev'))
+    app.logger.disabled = True
+    client = app.test_client()
+    cache = app.extensions['response_cache']
+    rng = random.Random(args.seed)
+
+    failed = []
+    for name in names:
+        problems = run_check(name, client, cache, rng)
+        print(f'{name}: ' + ('ok' if not problems else f'{len(problems)} problems'))
+        for problem in problems:
+            print(f'  {problem}')
+        if problems:
+            failed.append(name)
+
+    if failed:
+        print(f'\n{len(failed)} checks left stale responses in the cache: ' + ', '.join(failed))
+        sys.exit(1)
+    print(f'\nEvery write evicted the responses it changed ({len(names)} checks)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Run the route scenarios against the catalog and report throughput and latency percentiles.
+
+Requests go through the Flask test client in this process by default, or to a
+running server with --url. Either way the catalog in DATABASE_URL is sampled for
+ids and names, so fill it first (see benchmarks.catalog_gen). Run from the api/
+directory:
+
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.load_bench --requests 200 \\
+        --save baselines/sqlite-100k.json
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.load_bench --requests 200 \\
+        --compare baselines/sqlite-100k.json
+
+--compare exits with status 1 when a scenario's p95 latency or throughput is more
+than --threshold worse than in the baseline. In process the response cache is
+disabled (CACHE_TYPE=null) unless --cache is given.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from sqlalchemy import func, select
+
+from .scenarios import SCENARIOS, Sample, select_scenarios
+
+
+class TestClient:
+    """Sends requests to the app in this process through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        kwargs = {}
+        if isinstance(body, str):
+            kwargs = {'data': body, 'content_type': 'application/x-ndjson'}
+        elif body is not None:
+            kwargs = {'json': body}
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Sends requests to a running server over one keep-alive connection."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+
+    def request(self, method, path, body=None):
+        headers = {}
+        if isinstance(body, str):
+            body, headers['Content-Type'] = body.encode('utf-8'), 'application/x-ndjson'
+        elif body is not None:
+            body, headers['Content-Type'] = json.dumps(body).encode('utf-8'), 'application/json'
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            raise
+        return response.status, data
+
+
+def percentile(quantiles, n):
+    return quantiles[n - 1] * 1000 if quantiles else 0.0
+
+
+def run_scenario(scenario, make_client, sample, args):
+    """Time `args.requests` requests (or `args.duration` seconds) of `scenario` over
+    `args.concurrency` clients, after `args.warmup` untimed ones."""
+    latencies, errors, statuses = [], [0], {}
+    lock = threading.Lock()
+
+    def worker(index, count=None, deadline=None, timed=True):
+        client = make_client()
+        rng = scenario.rng(args.seed + index)
+        done = 0
+        while done < count if count is not None else time.monotonic() < deadline:
+            done += 1
+            state = scenario.prepare(client, rng, sample) if scenario.prepare else None
+            method, path, body = scenario.request(rng, sample, state)
+            started = time.perf_counter()
+            try:
+                response = client.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                response = (None, b'')
+            elapsed = time.perf_counter() - started
+            if scenario.cleanup:
+                scenario.cleanup(client, state, response)
+            if timed:
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response[0]] = statuses.get(response[0], 0) + 1
+                    if response[0] not in scenario.expect:
+                        errors[0] += 1
+
+    if args.warmup:
+        worker(-1, count=args.warmup, timed=False)
+
+    if args.duration:
+        kwargs = {'deadline': time.monotonic() + args.duration}
+    else:
+        kwargs = {'count': max(1, args.requests // args.concurrency)}
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), kwargs=kwargs) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if scenario.prepare or scenario.cleanup:
+        # Wall-clock time includes the untimed setup, so derive throughput from latency
+        rps = args.concurrency / statistics.fmean(latencies) if latencies else 0.0
+    else:
+        rps = len(latencies) / elapsed if elapsed else 0.0
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'rps': rps,
+        'mean': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50': percentile(quantiles, 50),
+        'p95': percentile(quantiles, 95),
+        'p99': percentile(quantiles, 99),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change against `baseline` per scenario; return the regressed names."""
+    regressed = []
+    print(f'\nAgainst baseline from {baseline["meta"]["created"]} (threshold {threshold:.0%}):')
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'  {name:<34} new scenario')
+            continue
+        p95 = (result['p95'] - before['p95']) / before['p95'] if before['p95'] else 0.0
+        rps = (before['rps'] - result['rps']) / before['rps'] if before['rps'] else 0.0
+        flag = ''
+        if p95 > threshold or rps > threshold:
+            flag = '  REGRESSION'
+            regressed.append(name)
+        print(f'  {name:<34} p95 {p95:+7.1%}  req/s {-rps:+7.1%}{flag}')
+    return regressed
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', metavar='PATTERN',
+                        help='Scenario names or globs, e.g. "books.list.*" (default: all but heavy)')
+    parser.add_argument('--heavy', action='store_true', help='Include scenarios reading most of the catalog')
+    parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per scenario')
+    parser.add_argument('--duration', type=float, help='Seconds per scenario, instead of --requests')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent clients per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='Benchmark a running server instead of the app in this process')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache enabled in process')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a saved JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative p95 or throughput loss reported as a regression')
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f'{scenario.name}{"  (heavy)" if scenario.heavy else ""}')
+        return
+    scenarios = select_scenarios(args.scenarios, args.heavy)
+    if not scenarios:
+        parser.error('no scenario matches ' + ' '.join(args.scenarios))
+
+    if not args.cache:
+        os.environ['CACHE_TYPE'] = 'null'
+    from app import create_app
+    from models import db, Book, BookParticipant, Participant, Role
+
+    app = create_app(os.getenv('FLASK_CONFIG', 'dev'))
+    app.logger.disabled = True
+    with app.app_context():
+        sample = Sample(seed=args.seed)
+        counts = {model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+                  for model in (Book, Participant, Role, BookParticipant)}
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        def make_client():
+            return TestClient(app)
+
+    print(f'{dialect} catalog: ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+    print(f'{"scenario":<34} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}  requests')
+    results = {}
+    for scenario in scenarios:
+        r = results[scenario.name] = run_scenario(scenario, make_client, sample, args)
+        print(f'{scenario.name:<34} {r["rps"]:9.1f} {r["p50"]:9.2f} {r["p95"]:9.2f} {r["p99"]:9.2f}  '
+              f'{r["requests"]}' + (f' ({r["errors"]} unexpected: {r["statuses"]})' if r['errors'] else ''))
+
+    report = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': dialect,
+            'target': args.url or 'in-process',
+            'counts': counts,
+            'args': {key: getattr(args, key) for key in ('requests', 'duration', 'concurrency', 'warmup',
+                                                         'seed', 'cache')},
+        },
+        'results': results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nSaved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta']['counts'] != counts:
+            print(f'\nWarning: the baseline was taken on a different catalog ({baseline["meta"]["counts"]})')
+        if baseline['meta']['args'] != report['meta']['args']:
+            print(f'\nWarning: the baseline was taken with different settings ({baseline["meta"]["args"]})')
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Explain the SQL each route scenario runs and fail on full table scans.
+
+Runs every scenario once through the Flask test client, captures the statements
+of its timed request and asks the database for their plans: `EXPLAIN QUERY PLAN`
+on SQLite, `EXPLAIN (FORMAT JSON)` with sequential scans disabled on PostgreSQL,
+so a scan left in the plan means no index could serve the query. Run from the
+api/ directory against a populated catalog (see benchmarks.catalog_gen) after
+`flask db upgrade`:
+
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.plan_check
+    DATABASE_URL=sqlite:////tmp/catalog.db python -m benchmarks.plan_check --scenarios 'books.*' -v
+
+Exits with status 1 when a statement scans a table its scenario is not allowed to
+(ALLOWED_SCANS), so it can gate schema and query changes in CI. Tables of fewer
+than --min-rows rows are ignored: planners rightly read small tables whole, so
+check against a catalog of production size.
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import event, func, select
+
+from .load_bench import TestClient
+from .scenarios import Sample, select_scenarios
+
+# Scans that are the point of the request: unfiltered listings and exports read the
+# whole table, and the small roles table is listed in full.
+ALLOWED_SCANS = {
+    'books.list.all': {'books', 'bookparticipants', 'participants'},
+    'books.export': {'books', 'bookparticipants', 'participants'},
+    'participants.list.all': {'participants'},
+    'roles.list': {'roles'},
+    'roles.list.description': {'roles'},
+}
+
+# Substring filters (`ilike '%term%'`) no btree index can serve; on PostgreSQL the
+# trigram indexes of the search schema do, so these are only allowed on SQLite.
+SQLITE_SUBSTRING_SCANS = {
+    'books.list.title': {'books'},
+    'books.list.search': {'books'},
+    'books.list.search_ranked': {'books'},
+    'books.list.participant_name': {'books', 'participants'},
+    'books.list.participant_name.unpaged': {'books', 'participants'},
+    'books.list.search_participant': {'books', 'participants'},
+    'books.list.search_participant.unpaged': {'books', 'participants'},
+    'books.facets.search': {'books'},
+    'books.facets.participant_name': {'books', 'participants'},
+    'participants.list.name': {'participants'},
+}
+
+
+class StatementLog:
+    """Statements and parameters run on `engine` while `recording` is set."""
+
+    def __init__(self, engine):
+        self.recording = False
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording and not executemany:
+            self.statements.append((statement, parameters))
+
+
+def sqlite_scans(connection, statement, parameters):
+    """Tables `statement` reads without an index on SQLite."""
+    plan = [row[-1] for row in
+            connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()]
+    # Without a sort step the table is read in rowid order and LIMIT stops the scan early
+    if ' LIMIT ' in statement and not any(line.startswith('USE TEMP B-TREE FOR ORDER BY') for line in plan):
+        return set(), plan
+    # "SCAN books" reads the table; "SCAN books USING INDEX ..." walks an index and
+    # "SCAN books_fts VIRTUAL TABLE ..." is answered by the full-text index
+    scans = {line.split()[1] for line in plan
+             if line.startswith('SCAN ') and ' USING ' not in line and 'VIRTUAL TABLE' not in line}
+    return scans, plan
+
+
+def postgresql_scans(connection, statement, parameters):
+    """Tables `statement` reads without an index on PostgreSQL."""
+    with connection.begin_nested():
+        connection.exec_driver_sql('set local enable_seqscan = off')
+        plan = connection.exec_driver_sql('explain (format json) ' + statement, parameters).scalar()
+    scans, lines = set(), []
+
+    def walk(node, depth=0):
+        relation = node.get('Relation Name')
+        lines.append('  ' * depth + node['Node Type'] + (f' on {relation}' if relation else ''))
+        if node['Node Type'] == 'Seq Scan':
+            scans.add(relation)
+        for child in node.get('Plans', ()):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'])
+    return scans, lines
+
+
+EXPLAINERS = {'sqlite': sqlite_scans, 'postgresql': postgresql_scans}
+
+
+def check_scenario(scenario, client, sample, log, connection, explain, checked, verbose):
+    """Run `scenario` once and explain its statements; return the scans of `checked` tables."""
+    rng = scenario.rng(0)
+    state = scenario.prepare(client, rng, sample) if scenario.prepare else None
+    method, path, body = scenario.request(rng, sample, state)
+    log.statements.clear()
+    log.recording = True
+    try:
+        response = client.request(method, path, body)
+    finally:
+        log.recording = False
+    statements = list(log.statements)
+    if scenario.cleanup:
+        scenario.cleanup(client, state, response)
+
+    problems = []
+    seen = set()
+    for statement, parameters in statements:
+        if not statement.lstrip().lower().startswith(('select', 'with', 'update', 'delete')):
+            continue
+        key = ' '.join(statement.split())
+        if key in seen:
+            continue
+        seen.add(key)
+        scans, plan = explain(connection, statement, parameters)
+        rejected = scans & checked
+        if rejected:
+            problems.append((key, rejected, plan))
+        if verbose or rejected:
+            print(f'    {key[:160]}')
+            for line in plan:
+                print(f'      {line}')
+    return response[0], len(statements), problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', metavar='PATTERN',
+                        help='Scenario names or globs, e.g. "books.*" (default: all but heavy)')
+    parser.add_argument('--heavy', action='store_true', help='Include scenarios reading most of the catalog')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--min-rows', type=int, default=10000, help='Ignore scans of smaller tables')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every plan, not only failing ones')
+    args = parser.parse_args()
+
+    scenarios = select_scenarios(args.scenarios, args.heavy)
+    if not scenarios:
+        parser.error('no scenario matches ' + ' '.join(args.scenarios))
+
+    os.environ['CACHE_TYPE'] = 'null'
+    from app import create_app
+    from models import db
+
+    app = create_app(os.getenv('FLASK_CONFIG', 'dev'))
+    app.logger.disabled = True
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if dialect not in EXPLAINERS:
+            sys.exit(f'plan_check does not support {dialect}')
+        sample = Sample(seed=args.seed)
+        tables = {table.name for table in db.metadata.sorted_tables
+                  if db.session.execute(select(func.count()).select_from(table)).scalar() >= args.min_rows}
+        log = StatementLog(db.engine)
+        connection = db.engine.connect()
+        db.session.remove()
+    client = TestClient(app)
+
+    failed = []
+    for scenario in scenarios:
+        checked = tables - ALLOWED_SCANS.get(scenario.name, set())
+        if dialect == 'sqlite':
+            checked -= SQLITE_SUBSTRING_SCANS.get(scenario.name, set())
+        print(f'{scenario.name}')
+        status, count, problems = check_scenario(scenario, client, sample, log, connection,
+                                                 EXPLAINERS[dialect], checked, args.verbose)
+        if problems:
+            failed.append(scenario.name)
+        scanned = ', '.join(sorted(set().union(*(rejected for _, rejected, _ in problems))))
+        print(f'  {status} after {count} statements' + (f'; full scan of {scanned}' if problems else ''))
+    connection.close()
+
+    if failed:
+        print(f'\n{len(failed)} scenarios scan tables without an index: ' + ', '.join(failed))
+        sys.exit(1)
+    print(f'\nNo unexpected table scans in {len(scenarios)} scenarios '
+          f'(tables checked: {", ".join(sorted(tables)) or "none"})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""Benchmark scenarios covering every route of the books, participants, roles, autocomplete and changes namespaces.
+
+A scenario times one request per iteration. `prepare` may create what the request
+needs (a book to delete, an assignment to reassign) and `cleanup` removes what it
+left behind; neither is timed, so write scenarios leave the catalog as they found
+it. Request arguments are drawn from a `Sample` of the catalog with the
+scenario's own random generator, so a run is reproducible for a given seed.
+"""
+import fnmatch
+import json
+import random
+import time
+import zlib
+from urllib.parse import quote
+
+from sqlalchemy import func, select
+
+from models import db, Book, BookParticipant, Change, Participant, Role
+from services.changes import encode_token
+from services.pagination import encode_cursor
+
+
+class Sample:
+    """Ids and names of existing rows, drawn once per run from the database."""
+
+    def __init__(self, size=1000, seed=42):
+        rng = random.Random(seed)
+        self.bookids = self._ids(Book.bookid, size, rng)
+        self.participantids = self._ids(Participant.participantid, size, rng)
+        self.roleids = db.session.execute(select(Role.roleid).order_by(Role.roleid)).scalars().all()
+        self.titles = db.session.execute(select(Book.title).where(
+            Book.bookid.in_(self.bookids[:100]))).scalars().all()
+        self.isbns = db.session.execute(select(Book.isbn).where(
+            Book.bookid.in_(self.bookids[:100]))).scalars().all()
+        self.names = db.session.execute(select(Participant.name).where(
+            Participant.participantid.in_(self.participantids[:100]))).scalars().all()
+        # Participants and roles the delete-existence checks refuse to delete
+        self.assigned = db.session.execute(select(BookParticipant.participantid, BookParticipant.roleid).where(
+            BookParticipant.bookid.in_(self.bookids[:100]))).all()
+        self.roles = db.session.execute(select(Role.description)).scalars().all()
+        self.publishers = db.session.execute(select(Book.publisher).distinct().where(
+            Book.bookid.in_(self.bookids[:100]), Book.publisher.isnot(None))).scalars().all()
+        # The participant with the most assignments, for author pages at their largest
+        self.prolific = db.session.execute(
+            select(BookParticipant.participantid).group_by(BookParticipant.participantid)
+            .order_by(func.count().desc()).limit(1)).scalar()
+        # Sync tokens: the end of the change log, and positions spread over it
+        self.log_end = encode_token(tuple(db.session.execute(
+            select(Change.txid, Change.seq).order_by(Change.txid.desc(), Change.seq.desc()).limit(1)).one()))
+        self.log_positions = [encode_token(tuple(row)) for row in db.session.execute(
+            select(Change.txid, Change.seq).where(Change.seq.in_(self._ids(Change.seq, 100, rng))))]
+        if not self.bookids or not self.participantids or not self.roleids or not self.assigned:
+            raise RuntimeError('The catalog is empty; fill it with python -m benchmarks.catalog_gen')
+
+    @staticmethod
+    def _ids(column, size, rng):
+        """Up to `size` existing ids spread over the whole id range."""
+        low, high = db.session.execute(select(func.min(column), func.max(column))).one()
+        if low is None:
+            return []
+        candidates = sorted({rng.randint(low, high) for _ in range(size * 2)})
+        found = db.session.execute(select(column).where(column.in_(candidates))).scalars().all()
+        rng.shuffle(found)
+        return found[:size]
+
+
+class Scenario:
+    """One kind of request, built by `request(rng, sample, state)` as (method, path, body).
+
+    `prepare(client, rng, sample)` returns the state passed to `request` and
+    `cleanup(client, state, response)`; `expect` lists the statuses counted as
+    successes. Heavy scenarios read a large part of the catalog per request and
+    only run when selected by name or with --heavy.
+    """
+
+    def __init__(self, name, request, expect=(200,), prepare=None, cleanup=None, heavy=False):
+        self.name = name
+        self.request = request
+        self.expect = expect
+        self.prepare = prepare
+        self.cleanup = cleanup
+        self.heavy = heavy
+
+    def rng(self, seed):
+        return random.Random(seed ^ zlib.crc32(self.name.encode('utf-8')))
+
+
+# Helpers creating and removing throwaway rows through the API
+
+def new_isbn(rng):
+    return f'bench-{rng.getrandbits(64):016x}'
+
+
+def create_book(client, rng, sample, participants=0):
+    status, body = client.request('POST', '/api/books/', {
+        'title': rng.choice(sample.titles), 'publisher': 'Bench', 'numberofpages': 100,
+        'isbn': new_isbn(rng)})
+    bookid = json.loads(body)['bookid']
+    for participantid in rng.sample(sample.participantids, participants):
+        client.request('POST', f'/api/books/{bookid}/participants', {
+            'participant': {'participantid': participantid}, 'role': {'roleid': sample.roleids[0]}})
+    return bookid
+
+
+def delete_book(client, bookid, response=None):
+    client.request('DELETE', f'/api/books/{bookid}')
+
+
+def created_id(key, path):
+    def cleanup(client, state, response):
+        status, body = response
+        if status == 201:
+            client.request('DELETE', f'{path}{json.loads(body)[key]}')
+    return cleanup
+
+
+def create_participant(client, rng, sample):
+    status, body = client.request('POST', '/api/participants/', {'name': f'Bench {rng.getrandbits(32)}'})
+    return json.loads(body)['participantid']
+
+
+def create_role(client, rng, sample):
+    status, body = client.request('POST', '/api/roles/', {'description': f'Bench {rng.getrandbits(64):x}'})
+    return json.loads(body)['roleid']
+
+
+def with_assignment(client, rng, sample):
+    bookid = create_book(client, rng, sample)
+    participantid = rng.choice(sample.participantids)
+    client.request('POST', f'/api/books/{bookid}/participants', {
+        'participant': {'participantid': participantid}, 'role': {'roleid': sample.roleids[0]}})
+    return bookid, participantid
+
+
+def import_body(rng, sample, count=100):
+    lines = []
+    for _ in range(count):
+        lines.append(json.dumps({
+            'title': rng.choice(sample.titles), 'isbn': new_isbn(rng), 'publisher': 'Bench',
+            'participants': [{'name': rng.choice(sample.names), 'role': rng.choice(sample.roles)}]}))
+    return '\n'.join(lines) + '\n'
+
+
+def delete_imported(client, state, response):
+    """Remove the books of an import scenario by their bench- ISBNs."""
+    for isbn in state:
+        status, body = client.request('GET', f'/api/books/?isbn={isbn}&fields=bookid')
+        for book in json.loads(body) if status == 200 else []:
+            client.request('DELETE', f"/api/books/{book['bookid']}")
+
+
+def import_state(client, rng, sample):
+    body = import_body(rng, sample)
+    return body, [json.loads(line)['isbn'] for line in body.splitlines()]
+
+
+def upsert_state(client, rng, sample, count=100):
+    records = [{'title': rng.choice(sample.titles), 'isbn': new_isbn(rng), 'publisher': 'Bench'}
+               for _ in range(count)]
+    return records, [record['isbn'] for record in records]
+
+
+def stored_books(client, rng, sample, count=100):
+    """Existing books as stored, for an upsert that changes nothing."""
+    fields = 'title,description,editionnumber,publisher,publicationplace,publicationdate,numberofpages,isbn'
+    ids = ','.join(map(str, rng.sample(sample.bookids, min(count, len(sample.bookids)))))
+    status, body = client.request('GET', f'/api/books/?ids={ids}&fields={fields}')
+    return json.loads(body)
+
+
+def word(rng, sample):
+    return rng.choice(rng.choice(sample.titles).split())
+
+
+def typed(rng, text):
+    """What a user has typed so far of `text`: its first few characters."""
+    return quote(text[:rng.randint(1, min(8, len(text)))])
+
+
+def autocomplete_ready(client, rng, sample, attempts=600):
+    """Wait for the autocomplete index, which the app builds in the background."""
+    for _ in range(attempts):
+        status, _ = client.request('GET', '/api/autocomplete?q=a')
+        if status != 503:
+            return None
+        time.sleep(0.1)
+    raise RuntimeError('The autocomplete index was not built in time')
+
+
+SCENARIOS = [
+    # books namespace
+    Scenario('books.list.page', lambda rng, s, _: ('GET', '/api/books/?limit=20', None)),
+    Scenario('books.list.page_after', lambda rng, s, _: (
+        'GET', f"/api/books/?limit=20&after={encode_cursor('bookid', [rng.choice(s.bookids)])}", None)),
+    Scenario('books.list.sort_title', lambda rng, s, _: ('GET', '/api/books/?limit=20&sort=title', None)),
+    Scenario('books.list.new_releases', lambda rng, s, _: (
+        'GET', '/api/books/?limit=20&sort=-publicationdate', None)),
+    Scenario('books.list.year', lambda rng, s, _: (
+        'GET', f'/api/books/?limit=20&year={rng.randint(1850, 2024)}', None)),
+    Scenario('books.list.published_range', lambda rng, s, _: (
+        'GET', f'/api/books/?limit=20&sort=publicationdate&published_from={rng.randint(1850, 2023)}-06', None)),
+    Scenario('books.list.fields', lambda rng, s, _: ('GET', '/api/books/?limit=100&fields=bookid,title,isbn', None)),
+    Scenario('books.list.search', lambda rng, s, _: ('GET', f'/api/books/?limit=20&search={quote(word(rng, s))}', None)),
+    Scenario('books.list.search_ranked', lambda rng, s, _: (
+        'GET', f'/api/books/?search={quote(rng.choice(s.titles))}', None)),
+    Scenario('books.list.title', lambda rng, s, _: ('GET', f'/api/books/?limit=20&title={quote(word(rng, s))}', None)),
+    Scenario('books.list.isbn', lambda rng, s, _: ('GET', f'/api/books/?isbn={quote(rng.choice(s.isbns))}', None)),
+    Scenario('books.list.participant_name', lambda rng, s, _: (
+        'GET', f'/api/books/?limit=20&participant_name={quote(rng.choice(s.names))}', None)),
+    Scenario('books.list.participant_name.unpaged', lambda rng, s, _: (
+        'GET', f'/api/books/?participant_name={quote(rng.choice(s.names))}', None)),
+    Scenario('books.list.search_participant', lambda rng, s, _: (
+        'GET', f'/api/books/?limit=20&search={quote(word(rng, s))}'
+               f'&participant_name={quote(rng.choice(s.names).split()[-1])}', None)),
+    Scenario('books.list.search_participant.unpaged', lambda rng, s, _: (
+        'GET', f'/api/books/?search={quote(word(rng, s))}'
+               f'&participant_name={quote(rng.choice(s.names).split()[-1])}', None), heavy=True),
+    Scenario('books.list.ids', lambda rng, s, _: (
+        'GET', '/api/books/?ids=' + ','.join(map(str, rng.sample(s.bookids, 20))), None)),
+    Scenario('books.list.all', lambda rng, s, _: ('GET', '/api/books/', None), heavy=True),
+    Scenario('books.facets', lambda rng, s, _: ('GET', '/api/books/facets', None)),
+    Scenario('books.facets.search', lambda rng, s, _: (
+        'GET', f'/api/books/facets?search={quote(word(rng, s))}', None)),
+    Scenario('books.facets.participant_name', lambda rng, s, _: (
+        'GET', f'/api/books/facets?participant_name={quote(rng.choice(s.names))}', None)),
+    Scenario('books.create', lambda rng, s, _: ('POST', '/api/books/', {
+        'title': rng.choice(s.titles), 'publisher': 'Bench', 'isbn': new_isbn(rng)}),
+        expect=(201,), cleanup=created_id('bookid', '/api/books/')),
+    Scenario('books.import', lambda rng, s, state: ('POST', '/api/books/import', state[0]),
+             prepare=import_state, cleanup=lambda client, state, response: delete_imported(client, state[1], response)),
+    Scenario('books.upsert', lambda rng, s, state: ('POST', '/api/books/upsert', state[0]),
+             prepare=upsert_state, cleanup=lambda client, state, response: delete_imported(client, state[1], response)),
+    Scenario('books.upsert.unchanged', lambda rng, s, records: ('POST', '/api/books/upsert', records),
+             prepare=stored_books),
+    Scenario('books.export', lambda rng, s, _: ('GET', '/api/books/export', None), heavy=True),
+    Scenario('books.get', lambda rng, s, _: ('GET', f'/api/books/{rng.choice(s.bookids)}', None)),
+    Scenario('books.update', lambda rng, s, bookid: ('PUT', f'/api/books/{bookid}', {'numberofpages': 300}),
+             expect=(204,), prepare=create_book, cleanup=delete_book),
+    Scenario('books.patch', lambda rng, s, bookid: ('PATCH', f'/api/books/{bookid}', {'numberofpages': 300}),
+             expect=(204,), prepare=create_book, cleanup=delete_book),
+    Scenario('books.patch.publisher', lambda rng, s, bookid: (
+        'PATCH', f'/api/books/{bookid}', {'publisher': 'Bench Patch'}),
+        expect=(204,), prepare=create_book, cleanup=delete_book),
+    Scenario('books.delete', lambda rng, s, bookid: ('DELETE', f'/api/books/{bookid}', None),
+             expect=(204,), prepare=lambda client, rng, s: create_book(client, rng, s, participants=2)),
+    Scenario('books.participants.list', lambda rng, s, _: (
+        'GET', f'/api/books/{rng.choice(s.bookids)}/participants', None), expect=(200, 404)),
+    Scenario('books.participants.add', lambda rng, s, bookid: ('POST', f'/api/books/{bookid}/participants', {
+        'participant': {'participantid': rng.choice(s.participantids)}, 'role': {'roleid': rng.choice(s.roleids)}}),
+        expect=(201,), prepare=create_book, cleanup=delete_book),
+    Scenario('books.participants.replace', lambda rng, s, bookid: ('PUT', f'/api/books/{bookid}/participants', [
+        {'participantid': participantid, 'roleid': rng.choice(s.roleids)}
+        for participantid in rng.sample(s.participantids, 3)]),
+        prepare=lambda client, rng, s: create_book(client, rng, s, participants=2), cleanup=delete_book),
+    Scenario('books.roles.participants', lambda rng, s, _: (
+        'GET', f'/api/books/{rng.choice(s.bookids)}/roles/{rng.choice(s.roleids)}/participants', None),
+        expect=(200, 404)),
+    Scenario('books.filterbyrole.participants', lambda rng, s, _: (
+        'GET', f'/api/books/{rng.choice(s.bookids)}/filterbyrole/{rng.choice(s.roleids)}/participants', None)),
+    Scenario('books.participant.role', lambda rng, s, state: (
+        'PUT', f'/api/books/{state[0]}/participants/{state[1]}/role/{rng.choice(s.roleids)}', None),
+        expect=(204,), prepare=with_assignment, cleanup=lambda client, state, response: delete_book(client, state[0])),
+    Scenario('books.participant.delete', lambda rng, s, state: (
+        'DELETE', f'/api/books/{state[0]}/participants/{state[1]}', None),
+        expect=(204,), prepare=with_assignment, cleanup=lambda client, state, response: delete_book(client, state[0])),
+
+    # participants namespace
+    Scenario('participants.list.name', lambda rng, s, _: (
+        'GET', f"/api/participants/?name={quote(rng.choice(s.names).split()[-1])}", None)),
+    Scenario('participants.list.ids', lambda rng, s, _: (
+        'GET', '/api/participants/?ids=' + ','.join(map(str, rng.sample(s.participantids, 20))), None)),
+    Scenario('participants.list.all', lambda rng, s, _: ('GET', '/api/participants/', None), heavy=True),
+    Scenario('participants.create', lambda rng, s, _: ('POST', '/api/participants/', {
+        'name': f'Bench {rng.getrandbits(32)}'}), expect=(201,),
+        cleanup=created_id('participantid', '/api/participants/')),
+    Scenario('participants.get', lambda rng, s, _: ('GET', f'/api/participants/{rng.choice(s.participantids)}', None)),
+    Scenario('participants.books', lambda rng, s, _: (
+        'GET', f'/api/participants/{rng.choice(s.assigned)[0]}/books?limit=20', None)),
+    Scenario('participants.books.role', lambda rng, s, _: (
+        'GET', '/api/participants/{}/books?limit=20&roleid={}'.format(*rng.choice(s.assigned)), None)),
+    Scenario('participants.books.prolific', lambda rng, s, _: (
+        'GET', f'/api/participants/{s.prolific}/books?limit=100', None)),
+    Scenario('participants.update', lambda rng, s, participantid: (
+        'PUT', f'/api/participants/{participantid}', {'name': f'Bench {rng.getrandbits(32)}'}),
+        expect=(204,), prepare=create_participant,
+        cleanup=lambda client, participantid, response: client.request('DELETE', f'/api/participants/{participantid}')),
+    Scenario('participants.patch', lambda rng, s, participantid: (
+        'PATCH', f'/api/participants/{participantid}', {'name': f'Bench {rng.getrandbits(32)}'}),
+        expect=(204,), prepare=create_participant,
+        cleanup=lambda client, participantid, response: client.request('DELETE', f'/api/participants/{participantid}')),
+    Scenario('participants.delete', lambda rng, s, participantid: (
+        'DELETE', f'/api/participants/{participantid}', None), expect=(204,), prepare=create_participant),
+    Scenario('participants.delete.assigned', lambda rng, s, _: (
+        'DELETE', f'/api/participants/{rng.choice(s.assigned).participantid}', None), expect=(400,)),
+
+    # roles namespace
+    Scenario('roles.list', lambda rng, s, _: ('GET', '/api/roles/', None)),
+    Scenario('roles.list.description', lambda rng, s, _: (
+        'GET', f'/api/roles/?description={quote(rng.choice(s.roles)[:3])}', None)),
+    Scenario('roles.create', lambda rng, s, _: ('POST', '/api/roles/', {
+        'description': f'Bench {rng.getrandbits(64):x}'}), expect=(201,), cleanup=created_id('roleid', '/api/roles/')),
+    Scenario('roles.get', lambda rng, s, _: ('GET', f'/api/roles/{rng.choice(s.roleids)}', None)),
+    Scenario('roles.update', lambda rng, s, roleid: (
+        'PUT', f'/api/roles/{roleid}', {'description': f'Bench {rng.getrandbits(64):x}'}),
+        expect=(204,), prepare=create_role,
+        cleanup=lambda client, roleid, response: client.request('DELETE', f'/api/roles/{roleid}')),
+    Scenario('roles.patch', lambda rng, s, roleid: (
+        'PATCH', f'/api/roles/{roleid}', {'description': f'Bench {rng.getrandbits(64):x}'}),
+        expect=(204,), prepare=create_role,
+        cleanup=lambda client, roleid, response: client.request('DELETE', f'/api/roles/{roleid}')),
+    Scenario('roles.delete', lambda rng, s, roleid: ('DELETE', f'/api/roles/{roleid}', None),
+             expect=(204,), prepare=create_role),
+    Scenario('roles.delete.assigned', lambda rng, s, _: (
+        'DELETE', f'/api/roles/{rng.choice(s.assigned).roleid}', None), expect=(400,)),
+
+    # autocomplete namespace
+    Scenario('autocomplete.title', lambda rng, s, _: (
+        'GET', f'/api/autocomplete?q={typed(rng, rng.choice(s.titles))}', None), prepare=autocomplete_ready),
+    Scenario('autocomplete.title.word', lambda rng, s, _: (
+        'GET', f'/api/autocomplete?q={typed(rng, word(rng, s))}', None), prepare=autocomplete_ready),
+    Scenario('autocomplete.participant', lambda rng, s, _: (
+        'GET', f'/api/autocomplete?kind=participant&q={typed(rng, rng.choice(s.names))}', None),
+        prepare=autocomplete_ready),
+    Scenario('autocomplete.publisher', lambda rng, s, _: (
+        'GET', f'/api/autocomplete?kind=publisher&q={typed(rng, rng.choice(s.publishers))}', None),
+        prepare=autocomplete_ready),
+
+    # changes namespace
+    Scenario('changes.idle', lambda rng, s, _: ('GET', f'/api/changes?since={s.log_end}', None)),
+    Scenario('changes.page', lambda rng, s, _: (
+        'GET', f'/api/changes?since={rng.choice(s.log_positions)}&limit=200', None)),
+]
+
+
+def select_scenarios(patterns=None, heavy=False):
+    """Scenarios whose names match any of the glob `patterns` (all by default).
+
+    Heavy scenarios are only included when named explicitly or with `heavy`.
+    """
+    if not patterns:
+        return [scenario for scenario in SCENARIOS if heavy or not scenario.heavy]
+    selected = []
+    for scenario in SCENARIOS:
+        if scenario.name in patterns:
+            selected.append(scenario)
+        elif any(fnmatch.fnmatchcase(scenario.name, pattern) for pattern in patterns):
+            if heavy or not scenario.heavy:
+                selected.append(scenario)
+    return selected
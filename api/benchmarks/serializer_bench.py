@@ -0,0 +1,61 @@
+# benchmarks/serializer_bench.py
+"""Compare flask-restx `marshal` with the compiled serializer on book listings.
+
+Run from the api/ directory:
+
+    python -m benchmarks.serializer_bench --books 2000 --participants 5
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+from flask_restx import marshal
+
+from models import Book, BookParticipant, Participant, Role
+from routes.book_routes import book_model
+from services.serializer import compiler
+
+
+def build_books(count, participants_per_book):
+    """Transient ORM objects shaped like a joinedloaded BookList.get result."""
+    roles = [Role(roleid=i, description=name) for i, name in enumerate(('Autor', 'Tradutor', 'Editor'), 1)]
+    books = []
+    for i in range(count):
+        book = Book(bookid=i, title=f'Book {i}', description='A description ' * 20, editionnumber=1,
+                    publisher='Editora ABC', publicationplace='Rio de Janeiro',
+                    publicationdate=datetime.date(2000, 1, 1) + datetime.timedelta(days=i),
+                    numberofpages=200 + i % 300, isbn=f'978-{i:010d}')
+        for j in range(participants_per_book):
+            participant = Participant(participantid=i * participants_per_book + j, name=f'Participant {i}-{j}')
+            book.participants.append(BookParticipant(participant=participant, role=roles[j % len(roles)]))
+        books.append(book)
+    return books
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--participants', type=int, default=5, help='Participants per book')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    books = build_books(args.books, args.participants)
+    serialize = compiler.compile(book_model)
+
+    expected = json.dumps(marshal(books, book_model))
+    actual = json.dumps([serialize(book) for book in books])
+    assert actual == expected, 'compiled serializer output differs from marshal'
+
+    results = {
+        'marshal': min(timeit.repeat(lambda: marshal(books, book_model), number=1, repeat=args.repeat)),
+        'compiled': min(timeit.repeat(lambda: [serialize(book) for book in books], number=1, repeat=args.repeat)),
+    }
+    print(f'{args.books} books x {args.participants} participants, best of {args.repeat}:')
+    for name, seconds in results.items():
+        print(f'  {name:<9} {seconds * 1000:9.2f} ms  ({args.books / seconds:,.0f} books/s)')
+    print(f'  speedup   {results["marshal"] / results["compiled"]:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
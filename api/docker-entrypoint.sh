@@ -0,0 +1,20 @@
+#!/bin/sh
+# api/docker-entrypoint.sh
+# Bring the schema up to date, then run the container command (gunicorn by default).
+# ddl.catalog.sql only creates the baseline schema; the models need every migration.
+set -e
+
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+  # The database may still be running its init scripts; retry for up to a minute
+  attempt=1
+  until flask --app app:create_app db upgrade; do
+    if [ "$attempt" -ge "${MIGRATION_ATTEMPTS:-30}" ]; then
+      echo "Database migrations failed after $attempt attempts" >&2
+      exit 1
+    fi
+    attempt=$((attempt + 1))
+    sleep 2
+  done
+fi
+
+exec "$@"
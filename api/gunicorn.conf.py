@@ -0,0 +1,45 @@
+# gunicorn.conf.py
+"""Production server settings, overridable from the environment.
+
+Each worker process is a full copy of the app with its own connection pool, and
+serves GUNICORN_THREADS requests at a time. Keep the pool (DB_POOL_SIZE +
+DB_MAX_OVERFLOW) at least as large as the thread count, and workers x pool below
+the database's max_connections.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5100')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# The app is imported in each worker, so no pool connections cross a fork
+preload_app = False
+
+# On SIGTERM workers stop accepting connections and get this long to finish in-flight requests
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))  # long enough for a full catalog export
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    """Stop the event listener and close the worker's pooled connections once it has drained."""
+    app = getattr(worker, 'wsgi', None)
+    if app is None:
+        return
+    from models import db
+    from services.events import events
+    from services.replicas import replicas
+    events.close()
+    with app.app_context():
+        db.engine.dispose()
+        replicas.dispose()
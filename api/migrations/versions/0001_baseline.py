@@ -0,0 +1,201 @@
+"""Baseline: the schema of postgres/scripts/ddl.catalog.sql
+
+Databases created from ddl.catalog.sql already have these tables, so only what is
+missing is created and `flask db upgrade` works on both new and existing databases.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 19:45:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# The search schema of services/search.py at this revision, frozen so that replaying
+# this migration creates the same schema whatever the app code has become. Postgres
+# keeps a weighted tsvector on books in sync through triggers, so a search never has
+# to join participants; trigram indexes back the substring and ilike filters.
+POSTGRES_DDL = [
+    "create extension if not exists pg_trgm",
+    "alter table books add column if not exists search_vector tsvector",
+    """
+    create or replace function books_search_vector(b books) returns tsvector as $$
+        select setweight(to_tsvector('simple', coalesce(b.title, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce((
+                   select string_agg(p.name, ' ')
+                   from bookparticipants bp
+                   join participants p on p.participantid = bp.participantid
+                   where bp.bookid = b.bookid), '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(b.isbn, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(b.publisher, '') || ' ' || coalesce(b.publicationplace, '')), 'C')
+    $$ language sql stable
+    """,
+    """
+    create or replace function books_search_vector_trigger() returns trigger as $$
+    begin
+        new.search_vector := books_search_vector(new);
+        return new;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists books_search_vector_update on books",
+    """
+    create trigger books_search_vector_update before insert or update on books
+        for each row execute function books_search_vector_trigger()
+    """,
+    """
+    create or replace function bookparticipants_search_vector_trigger() returns trigger as $$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            update books set search_vector = null where bookid = old.bookid;
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            update books set search_vector = null where bookid = new.bookid;
+        end if;
+        return null;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists bookparticipants_search_vector_update on bookparticipants",
+    """
+    create trigger bookparticipants_search_vector_update after insert or update or delete on bookparticipants
+        for each row execute function bookparticipants_search_vector_trigger()
+    """,
+    """
+    create or replace function participants_search_vector_trigger() returns trigger as $$
+    begin
+        update books set search_vector = null
+        where bookid in (select bookid from bookparticipants where participantid = new.participantid);
+        return null;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists participants_search_vector_update on participants",
+    """
+    create trigger participants_search_vector_update after update of name on participants
+        for each row when (old.name is distinct from new.name)
+        execute function participants_search_vector_trigger()
+    """,
+    "create index if not exists books_search_vector_idx on books using gin (search_vector)",
+    "create index if not exists books_title_trgm_idx on books using gin (title gin_trgm_ops)",
+    "create index if not exists books_isbn_trgm_idx on books using gin (isbn gin_trgm_ops)",
+    "create index if not exists books_publisher_trgm_idx on books using gin (publisher gin_trgm_ops)",
+    "create index if not exists books_publicationplace_trgm_idx on books using gin (publicationplace gin_trgm_ops)",
+    "create index if not exists participants_name_trgm_idx on participants using gin (name gin_trgm_ops)",
+]
+
+# SQLite has no tsvector, so an FTS5 table keyed by bookid mirrors the searchable text
+SQLITE_PARTICIPANT_NAMES = """(
+    select group_concat(p.name, ' ')
+    from bookparticipants bp
+    join participants p on p.participantid = bp.participantid
+    where bp.bookid = {bookid})"""
+
+SQLITE_DDL = [
+    """
+    create virtual table if not exists books_fts using fts5(
+        title, publisher, publicationplace, isbn, participants,
+        tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    f"""
+    create trigger if not exists books_fts_insert after insert on books begin
+        insert into books_fts (rowid, title, publisher, publicationplace, isbn, participants)
+        values (new.bookid, new.title, new.publisher, new.publicationplace, new.isbn,
+                {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')});
+    end
+    """,
+    f"""
+    create trigger if not exists books_fts_update after update on books begin
+        delete from books_fts where rowid = old.bookid;
+        insert into books_fts (rowid, title, publisher, publicationplace, isbn, participants)
+        values (new.bookid, new.title, new.publisher, new.publicationplace, new.isbn,
+                {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')});
+    end
+    """,
+    """
+    create trigger if not exists books_fts_delete after delete on books begin
+        delete from books_fts where rowid = old.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_insert after insert on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')}
+        where rowid = new.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_update after update on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='old.bookid')}
+        where rowid = old.bookid;
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')}
+        where rowid = new.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_delete after delete on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='old.bookid')}
+        where rowid = old.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists participants_fts_update after update of name on participants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='books_fts.rowid')}
+        where rowid in (select bookid from bookparticipants where participantid = new.participantid);
+    end
+    """,
+]
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'participants' not in tables:
+        op.create_table(
+            'participants',
+            sa.Column('participantid', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(255), nullable=False))
+    if 'roles' not in tables:
+        op.create_table(
+            'roles',
+            sa.Column('roleid', sa.Integer(), primary_key=True),
+            sa.Column('description', sa.String(255), nullable=False, unique=True))
+    if 'books' not in tables:
+        op.create_table(
+            'books',
+            sa.Column('bookid', sa.Integer(), primary_key=True),
+            sa.Column('title', sa.String(255), nullable=False),
+            sa.Column('description', sa.Text()),
+            sa.Column('editionnumber', sa.Integer()),
+            sa.Column('publisher', sa.String(255)),
+            sa.Column('publicationplace', sa.String(255)),
+            sa.Column('publicationdate', sa.Date()),
+            sa.Column('numberofpages', sa.Integer()),
+            sa.Column('isbn', sa.String(255), nullable=False, unique=True))
+    if 'bookparticipants' not in tables:
+        op.create_table(
+            'bookparticipants',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('bookid', sa.Integer(), sa.ForeignKey('books.bookid', name='fk_book', ondelete='CASCADE')),
+            sa.Column('participantid', sa.Integer(),
+                      sa.ForeignKey('participants.participantid', name='fk_participant', ondelete='RESTRICT')),
+            sa.Column('roleid', sa.Integer(), sa.ForeignKey('roles.roleid', name='fk_role', ondelete='RESTRICT')))
+
+    # Full-text search columns, triggers and indexes; every statement is idempotent
+    dialect = op.get_bind().dialect.name
+    for statement in {'postgresql': POSTGRES_DDL, 'sqlite': SQLITE_DDL}.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('drop table if exists books_fts')
+    op.drop_table('bookparticipants')
+    op.drop_table('books')
+    op.drop_table('roles')
+    op.drop_table('participants')
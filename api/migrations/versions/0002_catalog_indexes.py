@@ -0,0 +1,54 @@
+"""Index the join table and lookup columns; make each (book, participant, role) unique
+
+Per-book participant queries are served by the unique index, which leads with
+bookid; the participant and role delete checks by their own indexes. Participant
+names get a btree index for the exact IN lookups of imports and assignments, and
+(title, bookid) one for the title-sorted book pages.
+
+The case-insensitive substring filters of BookList.get and ParticipantList.get
+(`ilike '%term%'`) cannot use a btree index on lower(column); on PostgreSQL they
+are served by the trigram GIN indexes created with the search schema.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 19:46:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest of any duplicated assignments so the unique index can be built
+    op.execute("""
+        delete from bookparticipants
+        where id not in (select min(id) from bookparticipants group by bookid, participantid, roleid)
+    """)
+
+    # Build the indexes without blocking writes to large tables on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('uq_bookparticipants_book_participant_role', 'bookparticipants',
+                        ['bookid', 'participantid', 'roleid'], unique=True, if_not_exists=True,
+                        postgresql_concurrently=True)
+        op.create_index('ix_bookparticipants_participantid', 'bookparticipants', ['participantid'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_bookparticipants_roleid', 'bookparticipants', ['roleid'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_participants_name', 'participants', ['name'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_books_title_bookid', 'books', ['title', 'bookid'],
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_books_title_bookid', 'books', if_exists=True)
+    op.drop_index('ix_participants_name', 'participants', if_exists=True)
+    op.drop_index('ix_bookparticipants_roleid', 'bookparticipants', if_exists=True)
+    op.drop_index('ix_bookparticipants_participantid', 'bookparticipants', if_exists=True)
+    op.drop_index('uq_bookparticipants_book_participant_role', 'bookparticipants', if_exists=True)
@@ -0,0 +1,64 @@
+"""Summary table of book counts per facet value
+
+facet_counts backs the unfiltered GET /api/books/facets; the book and assignment
+write handlers keep it current (services/facets.py). The upgrade counts the
+existing catalog, and leaves a facet_counts table created by catalog_gen in place.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 20:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# The columns the counts read at this revision, so replaying the migration counts
+# the same way whatever the models and services/facets.py have become
+books = sa.table('books', sa.column('bookid', sa.Integer), sa.column('publisher', sa.String),
+                 sa.column('publicationplace', sa.String), sa.column('publicationdate', sa.Date))
+bookparticipants = sa.table('bookparticipants', sa.column('bookid', sa.Integer), sa.column('roleid', sa.Integer))
+facet_counts = sa.table('facet_counts', sa.column('facet', sa.String), sa.column('value', sa.String),
+                        sa.column('count', sa.Integer))
+
+
+def grouped_counts():
+    """Frozen `services.facets.grouped_counts` over every book: (facet, value, count)
+    rows per publisher, publicationplace, year and roleid, plus the ('total', '') row."""
+    year = sa.cast(sa.extract('year', books.c.publicationdate), sa.String)
+    parts = [sa.select(sa.literal('total'), sa.literal(''), sa.func.count()).select_from(books)]
+    for facet, column in (('publisher', books.c.publisher),
+                          ('publicationplace', books.c.publicationplace),
+                          ('year', year)):
+        parts.append(sa.select(sa.literal(facet), column, sa.func.count())
+                     .where(column.isnot(None)).group_by(column))
+    parts.append(
+        sa.select(sa.literal('role'), sa.cast(bookparticipants.c.roleid, sa.String),
+                  sa.func.count(bookparticipants.c.bookid.distinct()))
+        .where(bookparticipants.c.bookid.in_(sa.select(books.c.bookid)))
+        .group_by(bookparticipants.c.roleid))
+    return sa.union_all(*parts)
+
+
+def upgrade():
+    if 'facet_counts' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'facet_counts',
+            sa.Column('facet', sa.String(32), primary_key=True),
+            sa.Column('value', sa.String(255), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False))
+    op.create_index('ix_facet_counts_rank', 'facet_counts', ['facet', sa.text('count DESC'), 'value'],
+                    if_not_exists=True)
+    op.execute(sa.delete(facet_counts))
+    op.execute(sa.insert(facet_counts).from_select(['facet', 'value', 'count'], grouped_counts()))
+
+
+def downgrade():
+    op.drop_index('ix_facet_counts_rank', 'facet_counts')
+    op.drop_table('facet_counts')
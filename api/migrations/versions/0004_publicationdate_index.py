@@ -0,0 +1,30 @@
+"""Index books by (publicationdate, bookid)
+
+Serves the published_from, published_to and year range filters of BookList.get
+and its publicationdate sorts, which page by (publicationdate, bookid) in either
+direction.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 22:10:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the index without blocking writes to books on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_publicationdate_bookid', 'books', ['publicationdate', 'bookid'],
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_books_publicationdate_bookid', 'books', if_exists=True)
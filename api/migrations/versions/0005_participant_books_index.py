@@ -0,0 +1,38 @@
+"""Index bookparticipants by (participantid, bookid, roleid)
+
+Serves GET /participants/{participantid}/books, which pages through the books of
+one participant in bookid order, from the index alone. It replaces the
+participantid index, which it covers as a prefix (the participant delete check).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 22:40:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the new index before dropping the one it replaces, without blocking
+    # writes to the join table on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('ix_bookparticipants_participant_book_role', 'bookparticipants',
+                        ['participantid', 'bookid', 'roleid'], if_not_exists=True,
+                        postgresql_concurrently=True)
+        op.drop_index('ix_bookparticipants_participantid', 'bookparticipants', if_exists=True,
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_bookparticipants_participantid', 'bookparticipants', ['participantid'],
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index('ix_bookparticipants_participant_book_role', 'bookparticipants', if_exists=True,
+                      postgresql_concurrently=True)
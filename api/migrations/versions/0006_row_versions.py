@@ -0,0 +1,34 @@
+"""Add a version column to books, participants and roles
+
+The ORM bumps it on every update (version_id_col) and PATCH checks it against
+If-Match in its UPDATE, so concurrent edits fail with 412 instead of silently
+overwriting each other. Existing rows start at version 1.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 23:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+TABLES = ('books', 'participants', 'roles')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if 'version' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'version')
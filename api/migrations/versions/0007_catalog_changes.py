@@ -0,0 +1,148 @@
+"""Track row timestamps and log changes for GET /api/changes
+
+Adds created_at and updated_at to books, participants, roles and
+bookparticipants, and the catalog_changes log that triggers keep: one entry per
+row, moved to the end of the log by every write and kept as a tombstone on
+delete, cascades included. The upgrade logs the existing rows, so a sync from
+the start gets the whole catalog, and stamps them with the time of the upgrade.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 10:00:00
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# The change triggers of services/changes.py at this revision, frozen so that
+# replaying this migration installs the same triggers whatever the models have
+# become: (entity, table, key column, columns whose update logs a change)
+ENTITIES = [
+    ('role', 'roles', 'roleid', 'description, version, created_at, updated_at'),
+    ('participant', 'participants', 'participantid', 'name, version, created_at, updated_at'),
+    ('book', 'books', 'bookid', 'title, description, editionnumber, publisher, publicationplace, '
+                                'publicationdate, numberofpages, isbn, version, created_at, updated_at'),
+    ('bookparticipant', 'bookparticipants', 'id', 'bookid, participantid, roleid, created_at, updated_at'),
+]
+TABLES = [table for _, table, _, _ in ENTITIES]
+TIMESTAMPS = ('created_at', 'updated_at')
+
+# One trigger function for all tables, told the entity and key column by the trigger.
+# An upsert moves the entry to the end of the log; txid orders it by transaction.
+POSTGRES_DDL = [
+    """
+    create or replace function catalog_changes_record() returns trigger as $$
+    declare
+        row_key integer;
+    begin
+        if tg_op = 'DELETE' then
+            row_key := (to_jsonb(old) ->> tg_argv[1])::integer;
+        else
+            row_key := (to_jsonb(new) ->> tg_argv[1])::integer;
+        end if;
+        insert into catalog_changes (entity, entityid, deleted, txid)
+        values (tg_argv[0], row_key, tg_op = 'DELETE', txid_current())
+        on conflict (entity, entityid) do update
+            set seq = excluded.seq, deleted = excluded.deleted, txid = excluded.txid, changed_at = now();
+        return null;
+    end
+    $$ language plpgsql
+    """,
+]
+for entity, table, key, tracked in ENTITIES:
+    POSTGRES_DDL += [
+        f"drop trigger if exists {table}_changes on {table}",
+        f"""
+        create trigger {table}_changes after insert or delete or update of {tracked} on {table}
+            for each row execute function catalog_changes_record('{entity}', '{key}')
+        """,
+    ]
+
+# SQLite replaces the entry with a new autoincrement seq; writes are serialized, so
+# seq order is commit order and txid stays 0
+SQLITE_DDL = []
+for entity, table, key, tracked in ENTITIES:
+    for event_name, row, deleted in (('insert', 'new', 0), (f'update of {tracked}', 'new', 0),
+                                     ('delete', 'old', 1)):
+        SQLITE_DDL.append(f"""
+        create trigger if not exists {table}_changes_{event_name.split()[0]} after {event_name} on {table} begin
+            delete from catalog_changes where entity = '{entity}' and entityid = {row}.{key};
+            insert into catalog_changes (entity, entityid, deleted) values ('{entity}', {row}.{key}, {deleted});
+        end
+        """)
+
+catalog_changes = sa.table('catalog_changes', sa.column('entity', sa.String), sa.column('entityid', sa.Integer),
+                           sa.column('deleted', sa.Boolean))
+
+
+def backfill():
+    """Log every row that has no entry yet, so a sync from the start gets the whole catalog."""
+    for entity, table, key, _ in ENTITIES:
+        key = sa.table(table, sa.column(key, sa.Integer)).c[key]
+        logged = sa.select(catalog_changes.c.entityid).where(catalog_changes.c.entity == entity)
+        op.execute(sa.insert(catalog_changes).from_select(
+            ['entity', 'entityid', 'deleted'],
+            sa.select(sa.literal(entity), key, sa.false()).where(key.not_in(logged)).order_by(key)))
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    upgraded_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    for table in TABLES:
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name in TIMESTAMPS:
+            if name in existing:
+                continue
+            if bind.dialect.name == 'sqlite':
+                # SQLite only adds columns with a constant default (the app sets both on
+                # write); updating the rows instead would rerun the search index triggers
+                op.add_column(table, sa.Column(name, sa.DateTime(timezone=True), nullable=False,
+                                               server_default=upgraded_at))
+            else:
+                op.add_column(table, sa.Column(name, sa.DateTime(timezone=True), nullable=False,
+                                               server_default=sa.func.current_timestamp()))
+
+    if 'catalog_changes' not in inspector.get_table_names():
+        op.create_table(
+            'catalog_changes',
+            sa.Column('seq', sa.BigInteger().with_variant(sa.Integer, 'sqlite'), primary_key=True),
+            sa.Column('entity', sa.String(16), nullable=False),
+            sa.Column('entityid', sa.Integer(), nullable=False),
+            sa.Column('deleted', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('txid', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False,
+                      server_default=sa.func.current_timestamp()),
+            sqlite_autoincrement=True)
+    op.create_index('uq_catalog_changes_entity', 'catalog_changes', ['entity', 'entityid'],
+                    unique=True, if_not_exists=True)
+    op.create_index('ix_catalog_changes_txid_seq', 'catalog_changes', ['txid', 'seq'], if_not_exists=True)
+    for statement in {'postgresql': POSTGRES_DDL, 'sqlite': SQLITE_DDL}.get(bind.dialect.name, []):
+        bind.exec_driver_sql(statement)
+    backfill()
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table in TABLES:
+        if bind.dialect.name == 'postgresql':
+            op.execute(f'drop trigger if exists {table}_changes on {table}')
+        else:
+            for event_name in ('insert', 'update', 'delete'):
+                op.execute(f'drop trigger if exists {table}_changes_{event_name}')
+    if bind.dialect.name == 'postgresql':
+        op.execute('drop function if exists catalog_changes_record()')
+    op.drop_table('catalog_changes')
+    for table in TABLES:
+        for name in TIMESTAMPS:
+            op.drop_column(table, name)
@@ -0,0 +1,41 @@
+"""Index books by normalized ISBN
+
+A unique index on the ISBN without hyphens or spaces, uppercased
+(`models.book.isbn_key`), the conflict target of POST /books/upsert. Books whose
+ISBNs only differ in formatting are now duplicates; the upgrade stops and lists
+them when there are any, to be merged or corrected first.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# The expression of models.book.isbn_key
+ISBN_KEY = "upper(replace(replace(isbn, '-', ''), ' ', ''))"
+
+
+def upgrade():
+    duplicates = op.get_bind().execute(sa.text(
+        f"select {ISBN_KEY} as isbn_key, count(*) from books group by 1 having count(*) > 1 "
+        f"order by 1 limit 10")).all()
+    if duplicates:
+        listed = ', '.join(f'{isbn_key} ({count} books)' for isbn_key, count in duplicates)
+        raise RuntimeError(f'Books share a normalized ISBN, merge or correct them first: {listed}')
+    with op.get_context().autocommit_block():
+        op.create_index('uq_books_isbn_key', 'books', [sa.text(ISBN_KEY)], unique=True, if_not_exists=True,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_books_isbn_key', 'books', if_exists=True, postgresql_concurrently=True)
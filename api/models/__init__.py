@@ -1,12 +1,30 @@
 # models/__init__.py
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()  # Initialize SQLAlchemy once and use it across your application
+
+class RoutedSession(Session):
+    """Session running a request's statements on the engine it was routed to
+    (`g.db_engine`, set by services.replicas), or on the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            engine = g.get('db_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Initialize SQLAlchemy once and use it across your application
+db = SQLAlchemy(session_options={'class_': RoutedSession})
 
 # Import all models so they are known to SQLAlchemy
 from .book import Book
 from .participant import Participant
 from .role import Role
 from .bookparticipant import BookParticipant
+from .facetcount import FacetCount
+from .change import Change
 
-__all__ = ['db', 'Book', 'Participant', 'Role', 'BookParticipant']
+__all__ = ['db', 'Book', 'Participant', 'Role', 'BookParticipant', 'FacetCount', 'Change']
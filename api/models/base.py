@@ -20,3 +20,14 @@ class BaseModel(db.Model):
     def delete_from_db(self):
         db.session.delete(self)
         db.session.commit()
+
+
+class TimestampMixin:
+    """created_at and updated_at columns, for clients syncing through GET /api/changes."""
+    # Set by the inserting or updating statement, so single-statement updates get them too;
+    # the server defaults cover rows written outside the ORM
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                           default=db.func.current_timestamp(), server_default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                           default=db.func.current_timestamp(), server_default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp())
@@ -1,14 +1,40 @@
 # book.py
-from .base import db, BaseModel
+from .base import db, BaseModel, TimestampMixin
 from flask_restx import fields, Namespace
+from sqlalchemy import func, literal_column
 
 # Create a dedicated namespace for book operations
 api = Namespace('books', description='Book operations')
 
+
+def isbn_key(isbn):
+    """SQL for an ISBN without hyphens or spaces, uppercased: the key books are upserted by.
+
+    Literal constants rather than bound parameters, so queries and ON CONFLICT
+    targets match the expression of the uq_books_isbn_key index.
+    """
+    for character in ('-', ' '):
+        isbn = func.replace(isbn, literal_column(f"'{character}'"), literal_column("''"))
+    return func.upper(isbn)
+
+
+def normalize_isbn(isbn):
+    """`isbn_key` in Python."""
+    return isbn.replace('-', '').replace(' ', '').upper()
+
+
 # Define book model for database
-class Book(BaseModel):
+class Book(TimestampMixin, BaseModel):
     __tablename__ = 'books'
-    
+    # Serve the title and publication date sorts of cursor pagination (then bookid)
+    # in index order; the date index also serves the publication date range filters
+    __table_args__ = (
+        db.Index('ix_books_title_bookid', 'title', 'bookid'),
+        db.Index('ix_books_publicationdate_bookid', 'publicationdate', 'bookid'),
+        # One book per normalized ISBN: '978-0-13-110362-7' and '9780131103627' are the same book
+        db.Index('uq_books_isbn_key', isbn_key(literal_column('isbn')), unique=True),
+    )
+
     bookid = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
@@ -19,10 +45,15 @@ class Book(BaseModel):
     numberofpages = db.Column(db.Integer)
     isbn = db.Column(db.String(255), unique=True, nullable=False)
     participants = db.relationship('BookParticipant', back_populates='book', cascade='all, delete-orphan')
+    # Bumped by every update of the row; guards PATCH through If-Match
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)  # Utilize the parent class constructor for setting attributes
 
+
 # API models for input/output serialization
 participant_info_model = api.model('ParticipantInfo', {
     'participantid': fields.Integer(description='Participant ID', attribute='participantid'),
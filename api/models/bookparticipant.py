@@ -1,16 +1,25 @@
 # bookparticipant.py
-from .base import db, BaseModel
+from .base import db, BaseModel, TimestampMixin
 from flask_restx import fields, Namespace
 
 api = Namespace('book_participants', description='Operations related to book participants')
 
-class BookParticipant(BaseModel):
+class BookParticipant(TimestampMixin, BaseModel):
     __tablename__ = 'bookparticipants'
+    # The unique index leads with bookid, so it also serves per-book lookups; its
+    # participant-first twin serves the books of a participant in bookid order
+    __table_args__ = (
+        db.Index('uq_bookparticipants_book_participant_role', 'bookid', 'participantid', 'roleid', unique=True),
+        db.Index('ix_bookparticipants_participant_book_role', 'participantid', 'bookid', 'roleid'),
+        db.Index('ix_bookparticipants_roleid', 'roleid'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # New primary key
-    bookid = db.Column('bookid', db.Integer, db.ForeignKey('books.bookid'))
-    participantid = db.Column('participantid', db.Integer, db.ForeignKey('participants.participantid'))
-    roleid = db.Column('roleid', db.Integer, db.ForeignKey('roles.roleid'))
+    # Constraint names and delete rules as in ddl.catalog.sql
+    bookid = db.Column('bookid', db.Integer, db.ForeignKey('books.bookid', name='fk_book', ondelete='CASCADE'))
+    participantid = db.Column('participantid', db.Integer,
+                              db.ForeignKey('participants.participantid', name='fk_participant', ondelete='RESTRICT'))
+    roleid = db.Column('roleid', db.Integer, db.ForeignKey('roles.roleid', name='fk_role', ondelete='RESTRICT'))
 
     # Relationship declared with string references to avoid circular imports
     book = db.relationship('Book', back_populates='participants')
@@ -0,0 +1,25 @@
+# change.py
+from .base import db, BaseModel
+
+
+class Change(BaseModel):
+    """The last change of each catalog row, kept by triggers (services/changes.py).
+
+    A write moves the row's entry to the end of the log: a new `seq` and, on
+    PostgreSQL, the id of the writing transaction. Deletes keep their entry as a
+    tombstone. GET /api/changes reads the log in (txid, seq) order.
+    """
+    __tablename__ = 'catalog_changes'
+    __table_args__ = (
+        db.Index('uq_catalog_changes_entity', 'entity', 'entityid', unique=True),
+        db.Index('ix_catalog_changes_txid_seq', 'txid', 'seq'),
+        # Never reuse the seq of a replaced entry, even the last one
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)  # book, participant, role or bookparticipant
+    entityid = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, server_default=db.false())
+    txid = db.Column(db.BigInteger, nullable=False, server_default='0')
+    changed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.current_timestamp())
@@ -0,0 +1,15 @@
+# facetcount.py
+from .base import db, BaseModel
+
+
+class FacetCount(BaseModel):
+    """Number of books per facet value, maintained by the write handlers (services/facets.py)."""
+    __tablename__ = 'facet_counts'
+
+    facet = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Serves the most frequent values of a facet in index order
+db.Index('ix_facet_counts_rank', FacetCount.facet, FacetCount.count.desc(), FacetCount.value)
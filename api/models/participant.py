@@ -1,17 +1,21 @@
 # participant.py
-from .base import db, BaseModel
+from .base import db, BaseModel, TimestampMixin
 from flask_restx import fields, Namespace
 
 api = Namespace('participants', description='Participant operations')
 
-class Participant(BaseModel):
+class Participant(TimestampMixin, BaseModel):
     __tablename__ = 'participants'
 
     participantid = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(255), nullable=False, index=True)  # exact lookups by name in imports and assignments
 
     # Use string for relationship to avoid circular import
     books = db.relationship('BookParticipant', back_populates='participant')
+    # Bumped by every update of the row; guards PATCH through If-Match
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
 participant_model = api.model('Participant', {
     'participantid': fields.Integer(description='Participant ID', attribute='participantid'),
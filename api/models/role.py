@@ -1,11 +1,11 @@
 #role.py
 
-from .base import db, BaseModel
+from .base import db, BaseModel, TimestampMixin
 from flask_restx import fields, Namespace
 
 api = Namespace('roles', description='Role operations')
 
-class Role(BaseModel):
+class Role(TimestampMixin, BaseModel):
     __tablename__ = 'roles'
 
     roleid = db.Column(db.Integer, primary_key=True)
@@ -13,6 +13,10 @@ class Role(BaseModel):
 
     # Ensure this matches the relationship defined in BookParticipant
     book_participants = db.relationship('BookParticipant', back_populates='role')
+    # Bumped by every update of the row; guards PATCH through If-Match
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     role_model = api.model('Role', {
         'id': fields.Integer(description='Role ID', attribute='roleid'),
@@ -0,0 +1,132 @@
+# async_routes.py
+"""Async versions of the catalog read views, served by asgi.py.
+
+Each handler mirrors the sync view of the same route: arguments, filters and
+payloads come from the route modules, and only the queries are awaited.
+"""
+from flask import Response
+from flask_restx import abort
+from sqlalchemy import select
+from models import db, Book, Participant, Role
+from routes.book_routes import (book_list_tags, book_load_options, book_model, book_tags, filter_books,
+                                keyset_order, parser as book_parser)
+from routes.event_routes import STREAM_HEADERS, stream_arguments
+from routes.participant_routes import parser as participant_parser, participant_model
+from routes.role_routes import parser as role_parser, role_model
+from services.async_reads import reads
+from services.events import events
+from services.pagination import encode_cursor, in_requested_order, next_page_headers, page_size
+from services.serializer import requested_fields
+from services.versioning import etag_headers
+
+
+async def load_books(session, book_ids, selected=None, loader=db.selectinload):
+    """Async `book_routes.load_books`: load books in the order of `book_ids`."""
+    if not book_ids:
+        return [], {}
+    result = await session.execute(
+        select(Book).options(*book_load_options(selected, loader)).where(Book.bookid.in_(book_ids)))
+    return in_requested_order(book_ids, result.unique().scalars().all(), lambda book: book.bookid)
+
+
+@reads.route('/api/books/', book_model, sparse=True, cache_tags=('books',), tags=book_list_tags)
+async def book_list(session):
+    args = book_parser.parse_args()
+    selected = requested_fields(book_model)
+
+    if args['ids'] is not None:
+        books, headers = await load_books(session, args['ids'], selected)
+        return books, 200, headers
+
+    query, score = filter_books(select(Book), args)
+
+    if args['limit'] is None and args['after'] is None:
+        if score is None:
+            result = await session.execute(query.options(*book_load_options(selected, db.selectinload)))
+            return result.scalars().all()
+        # Rank search matches, best first
+        score = score.label('score')
+        ranked = await session.execute(query.with_only_columns(Book.bookid, score).order_by(
+            score.desc(), Book.bookid))
+        return (await load_books(session, [row.bookid for row in ranked], selected))[0]
+
+    try:
+        limit = page_size(args['limit'])
+        columns, order, filters = keyset_order(args)
+    except ValueError as e:
+        abort(400, str(e))
+
+    page = (await session.execute(query.filter(*filters).with_only_columns(*columns).order_by(
+        *order).limit(limit + 1))).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    books, _ = await load_books(session, [row[-1] for row in page], selected)
+
+    cursor = encode_cursor(args['sort'], page[-1]) if has_more else None
+    return books, 200, next_page_headers(cursor)
+
+
+@reads.route('/api/books/<int:bookid>', book_model, sparse=True, view_args={'bookid': 'book'}, tags=book_tags)
+async def book_detail(session, bookid):
+    book = await session.get(Book, bookid, options=book_load_options(requested_fields(book_model)))
+    if book is None:
+        abort(404)
+    return book, 200, etag_headers(book.version)
+
+
+@reads.route('/api/participants/', participant_model, sparse=True, cache_tags=('participants',))
+async def participant_list(session):
+    args = participant_parser.parse_args()
+    query = select(Participant)
+    selected = requested_fields(participant_model)
+    if selected is not None:
+        query = query.options(db.load_only(*[getattr(Participant, key) for key in selected]))
+    if args['ids'] is not None:
+        participants = (await session.scalars(query.filter(Participant.participantid.in_(args['ids'])))).all()
+        participants, headers = in_requested_order(
+            args['ids'], participants, lambda participant: participant.participantid)
+        return participants, 200, headers
+    if args['name']:
+        query = query.filter(Participant.name.ilike(f'%{args["name"]}%'))
+    return (await session.scalars(query)).all()
+
+
+@reads.route('/api/participants/<int:participantid>', participant_model, sparse=True,
+             view_args={'participantid': 'participant'})
+async def participant_detail(session, participantid):
+    participant = await session.get(Participant, participantid)
+    if participant is None:
+        abort(404)
+    return participant, 200, etag_headers(participant.version)
+
+
+@reads.route('/api/roles/', role_model, sparse=True, cache_tags=('roles',))
+async def role_list(session):
+    args = role_parser.parse_args()
+    query = select(Role)
+    selected = requested_fields(role_model)
+    if selected is not None:
+        query = query.options(db.load_only(*[getattr(Role, key) for key in selected]))
+    if args['ids'] is not None:
+        roles = (await session.scalars(query.filter(Role.roleid.in_(args['ids'])))).all()
+        roles, headers = in_requested_order(args['ids'], roles, lambda role: role.roleid)
+        return roles, 200, headers
+    if args['description']:
+        query = query.filter(Role.description.ilike(f'%{args["description"]}%'))
+    return (await session.scalars(query)).all()
+
+
+@reads.route('/api/roles/<int:id>', role_model, sparse=True, view_args={'id': 'role'})
+async def role_detail(session, id):
+    role = await session.get(Role, id)
+    if role is None:
+        abort(404)
+    return role, 200, etag_headers(role.version)
+
+
+@reads.stream('/api/events')
+def event_stream():
+    # Waits on the event loop, so unlike the sync view it is not limited to EVENTS_MAX_STREAMS
+    return Response(events.async_stream(*stream_arguments()), mimetype='text/event-stream',
+                    headers=STREAM_HEADERS)
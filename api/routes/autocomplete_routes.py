@@ -0,0 +1,38 @@
+# autocomplete_routes.py
+from flask import current_app
+from flask_restx import Namespace, Resource, fields, reqparse
+from services.autocomplete import KINDS, autocomplete
+
+api = Namespace('autocomplete', description='Typeahead suggestions')
+
+suggestion_model = api.model('Suggestion', {
+    'id': fields.Integer(description='Book ID of a title or participant ID of a name; null for a publisher'),
+    'label': fields.String(description='Text to display and complete to')
+})
+
+parser = reqparse.RequestParser()
+parser.add_argument('q', type=str, required=True,
+                    help='Prefix to complete, matched against whole texts and their words, '
+                         'ignoring case and accents')
+parser.add_argument('kind', type=str, choices=KINDS, default='title',
+                    help='What to suggest: title, participant or publisher')
+parser.add_argument('limit', type=int,
+                    help='Number of suggestions (default and maximum AUTOCOMPLETE_LIMIT)')
+
+
+@api.route('')
+class Suggestions(Resource):
+    @api.expect(parser)
+    @api.response(200, 'Suggestions, best first', [suggestion_model])
+    @api.response(503, 'The suggestion index is still being built.')
+    def get(self):
+        """Suggest titles, participant names or publishers starting with a prefix"""
+        args = parser.parse_args()
+        maximum = current_app.config['AUTOCOMPLETE_LIMIT']
+        limit = maximum if args['limit'] is None else max(1, min(args['limit'], maximum))
+        suggestions = autocomplete.search(args['kind'], args['q'], limit)
+        if suggestions is None:
+            return {'message': 'Suggestions are not available yet'}, 503, {'Retry-After': '5'}
+        if args['kind'] == 'publisher':
+            return [{'id': None, 'label': label} for _, label in suggestions]
+        return [{'id': entry_id, 'label': label} for entry_id, label in suggestions]
@@ -1,10 +1,28 @@
 # book_routes.py
-from flask import current_app
-from flask_restx import Namespace, Resource, fields, reqparse
+import datetime
+from contextlib import nullcontext
+
+from flask import Response, current_app, request, stream_with_context
+from flask_restx import Namespace, Resource, fields, inputs, reqparse
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError
 from models import db, Book, BookParticipant, Participant, Role
-
-api = Namespace('books', description='Book operations')
+from services.assignments import AssignmentError, replace_assignments, resolve_assignments
+from services.bulk_import import BookImporter, readers, upsert_books
+from services.cache import cache, id_tags
+from services.export import encode, iter_books, writers
+from services.facets import add_books, book_facets, book_rows, tracking
+from services.lookups import lookups
+from services.pagination import (InvalidCursor, decode_cursor, encode_cursor, id_list, in_requested_order,
+                                next_page_headers, page_size)
+from services.replicas import replicas
+from services.search import search_books
+from services.serializer import marshal_list_with, marshal_with, requested_fields
+from services.signals import notify
+from services.versioning import PreconditionFailed, etag_headers, patch_values, put_values, versioned_update
+
+# GETs may be served by a read replica (services.replicas)
+api = Namespace('books', description='Book operations', decorators=[replicas.reads])
 
 # Define participant and role information models
 
@@ -51,6 +69,19 @@ book_participant_id_model = api.model('BookParticipantId', {
     'role': fields.Nested(role_id_model)
 })
 
+book_participant_assignment_model = api.model('BookParticipantAssignment', {
+    'participantid': fields.Integer(description='Participant ID'),
+    'name': fields.String(description='Participant name, used when participantid is omitted'),
+    'roleid': fields.Integer(description='Role ID'),
+    'role': fields.String(description='Role description, used when roleid is omitted')
+})
+
+assignment_result_model = api.model('AssignmentResult', {
+    'added': fields.Integer(description='Assignments created'),
+    'removed': fields.Integer(description='Assignments deleted'),
+    'unchanged': fields.Integer(description='Assignments kept as they were')
+})
+
 # Define a model for POST requests specifically
 book_post_model = api.model('BookPost', {
     'title': fields.String(required=True, description='Book title'),
@@ -74,76 +105,354 @@ book_model = api.model('Book', {
     'publicationdate': fields.String(description='Publication date'),
     'numberofpages': fields.Integer(description='Number of pages'),
     'isbn': fields.String(required=True, description='ISBN number'),
-    'participants': fields.List(fields.Nested(book_participant_model), description='Participants involved in the book', required=False)
+    'participants': fields.List(fields.Nested(book_participant_model), description='Participants involved in the book', required=False),
+    'version': fields.Integer(readOnly=True, description='Row version, sent as the ETag of the book')
 })
 
+def date_period(value):
+    """Parse YYYY, YYYY-MM or YYYY-MM-DD into the half-open range of days it covers."""
+    try:
+        parts = [int(part) for part in str(value).strip().split('-')]
+        if len(parts) == 1:
+            return datetime.date(parts[0], 1, 1), datetime.date(parts[0] + 1, 1, 1)
+        if len(parts) == 2:
+            start = datetime.date(parts[0], parts[1], 1)
+            return start, (start + datetime.timedelta(days=31)).replace(day=1)
+        if len(parts) == 3:
+            start = datetime.date(*parts)
+            return start, start + datetime.timedelta(days=1)
+    except (ValueError, OverflowError):
+        pass
+    raise ValueError(f'{value!r} is not a date as YYYY, YYYY-MM or YYYY-MM-DD')
+
+
+def year_period(value):
+    """Parse a YYYY year into the half-open range of its days."""
+    if not str(value).strip().isdigit():
+        raise ValueError(f'{value!r} is not a year as YYYY')
+    return date_period(value)
+
+
 # Argument parser for GET request filtering
 parser = reqparse.RequestParser()
-parser.add_argument('search', type=str, help='Filter by book title, participant names, publisher, publication place or ISBN')
+parser.add_argument('search', type=str, help='Full-text search over book title, participant names, publisher, publication place and ISBN; unpaginated results are ranked by relevance')
 parser.add_argument('title', type=str, help='Filter by book title')
 parser.add_argument('isbn', type=str, help='Filter by ISBN')
 parser.add_argument('publisher', type=str, help='Filter by publisher')
 parser.add_argument('editionnumber', type=int, help='Filter by edition number')
 parser.add_argument('publicationplace', type=str,
                     help='Filter by publication place')
-parser.add_argument('publicationdate', type=str,
-                    help='Filter by publication date like year')
+parser.add_argument('published_from', type=date_period,
+                    help='Books published on or after this YYYY, YYYY-MM or YYYY-MM-DD')
+parser.add_argument('published_to', type=date_period,
+                    help='Books published on or before this YYYY, YYYY-MM or YYYY-MM-DD (inclusive)')
+parser.add_argument('year', type=year_period, help='Books published in this year')
+parser.add_argument('publicationdate', type=date_period,
+                    help='Deprecated: books published in this YYYY, YYYY-MM or YYYY-MM-DD')
 parser.add_argument('participant_name', type=str,
                     help='Filter by participant name')
+parser.add_argument('limit', type=int,
+                    help='Page size; enables cursor pagination (capped at MAX_PAGE_SIZE)')
+parser.add_argument('after', type=str,
+                    help='Cursor from the X-Next-Cursor header of the previous page')
+parser.add_argument('sort', type=str, choices=('bookid', 'title', 'publicationdate', '-publicationdate'),
+                    default='bookid',
+                    help='Sort order of paginated listings: bookid, title, publicationdate or '
+                         '-publicationdate for newest first (ties broken by bookid; date sorts '
+                         'skip books without a publication date)')
+parser.add_argument('fields', type=str,
+                    help='Comma-separated book fields to return, e.g. bookid,title,isbn '
+                         '(participants are only loaded when listed)')
+parser.add_argument('ids', type=id_list,
+                    help='Comma-separated book ids to fetch in this order (at most MAX_BATCH_SIZE); '
+                         'the other filters and paging do not apply')
+
+# Argument parser for facet counts: the BookList filters and the values per facet
+facet_parser = parser.copy()
+for name in ('limit', 'after', 'sort', 'fields', 'ids'):
+    facet_parser.remove_argument(name)
+facet_parser.add_argument('size', type=int,
+                          help='Values returned per facet, most frequent first (defaults to FACET_SIZE)')
+
+facet_value_model = api.model('FacetValue', {
+    'value': fields.String(description='Facet value'),
+    'count': fields.Integer(description='Books with this value')
+})
+
+role_facet_value_model = api.inherit('RoleFacetValue', facet_value_model, {
+    'roleid': fields.Integer(description='Role ID')
+})
+
+book_facets_model = api.model('BookFacets', {
+    'total': fields.Integer(description='Books matching the filters'),
+    'publisher': fields.List(fields.Nested(facet_value_model), description='Books per publisher'),
+    'publicationplace': fields.List(fields.Nested(facet_value_model), description='Books per publication place'),
+    'year': fields.List(fields.Nested(facet_value_model), description='Books per publication year'),
+    'role': fields.List(fields.Nested(role_facet_value_model),
+                        description='Books with at least one participant in each role')
+})
+
+# Argument parser for bulk imports; the body is read as a stream, never buffered
+import_parser = reqparse.RequestParser()
+import_parser.add_argument('format', type=str, choices=tuple(readers), location='args',
+                           help='Body format: ndjson or csv (defaults from the Content-Type header)')
+import_parser.add_argument('chunk_size', type=int, location='args',
+                           help='Rows per transaction (defaults to IMPORT_CHUNK_SIZE)')
+
+import_error_model = api.model('ImportError', {
+    'line': fields.Integer(description='Line number in the uploaded file'),
+    'isbn': fields.String(description='ISBN of the failed row, when available'),
+    'message': fields.String(description='Why the row was rejected')
+})
+
+import_result_model = api.model('ImportResult', {
+    'rows': fields.Integer(description='Rows read from the upload'),
+    'inserted': fields.Integer(description='Books created'),
+    'failed': fields.Integer(description='Rows rejected'),
+    'participants_created': fields.Integer(description='Participants created by name'),
+    'roles_created': fields.Integer(description='Roles created by description'),
+    'errors': fields.List(fields.Nested(import_error_model), description='First rejected rows'),
+    'errors_truncated': fields.Boolean(description='Whether more rows failed than are listed'),
+    'elapsed_seconds': fields.Float(description='Import duration'),
+    'rows_per_second': fields.Float(description='Import throughput')
+})
+
+upsert_error_model = api.model('UpsertError', {
+    'index': fields.Integer(description='Position of the record in the batch'),
+    'isbn': fields.String(description='ISBN of the failed record, when available'),
+    'message': fields.String(description='Why the record was rejected')
+})
+
+upsert_result_model = api.model('UpsertResult', {
+    'records': fields.Integer(description='Records in the batch'),
+    'inserted': fields.Integer(description='Books created'),
+    'updated': fields.Integer(description='Books changed'),
+    'unchanged': fields.Integer(description='Books already as sent, left unwritten'),
+    'failed': fields.Integer(description='Records rejected'),
+    'errors': fields.List(fields.Nested(upsert_error_model), description='First rejected records'),
+    'errors_truncated': fields.Boolean(description='Whether more records failed than are listed'),
+    'elapsed_seconds': fields.Float(description='Upsert duration'),
+    'records_per_second': fields.Float(description='Upsert throughput')
+})
+
+# Argument parser for the full catalog export
+export_parser = reqparse.RequestParser()
+export_parser.add_argument('format', type=str, choices=tuple(writers), default='ndjson', location='args',
+                           help='Output format: ndjson or csv (the bulk import layout)')
+export_parser.add_argument('gzip', type=inputs.boolean, location='args',
+                           help='Gzip the stream (defaults to the Accept-Encoding header)')
+
+# Sort keys used by cursor pagination, always ending in the unique bookid; a
+# leading '-' pages from the highest key down
+sort_columns = {
+    'bookid': (Book.bookid,),
+    'title': (Book.title, Book.bookid),
+    'publicationdate': (Book.publicationdate, Book.bookid),
+    '-publicationdate': (Book.publicationdate, Book.bookid),
+}
+
+
+def keyset_filter(columns, key, descending=False):
+    """Build the `(c1, c2, ...) > (k1, k2, ...)` predicate (`<` when `descending`)
+    without row-value syntax."""
+    column, value = columns[0], key[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return db.or_(beyond, db.and_(column == value, keyset_filter(columns[1:], key[1:], descending)))
+
+
+def keyset_order(args):
+    """Resolve the `sort` and `after` arguments of a paginated book listing.
+
+    Returns the sort key columns to select, the ORDER BY clauses and the filters
+    placing the page after the cursor. Date sorts also leave out undated books, so
+    the (publicationdate, bookid) index serves them in either direction. Raises
+    InvalidCursor for a cursor of another sort.
+    """
+    sort = args['sort']
+    columns = sort_columns[sort]
+    descending = sort.startswith('-')
+    order = [column.desc() for column in columns] if descending else list(columns)
+    filters = []
+    if columns[0] is Book.publicationdate:
+        filters.append(Book.publicationdate.isnot(None))
+    if args['after']:
+        key = decode_cursor(args['after'], sort)
+        if len(key) != len(columns):
+            raise InvalidCursor('Malformed cursor')
+        if columns[0] is Book.publicationdate:
+            try:
+                key[0] = datetime.date.fromisoformat(key[0])
+            except (TypeError, ValueError):
+                raise InvalidCursor('Malformed cursor')
+        filters.append(keyset_filter(columns, key, descending))
+    return columns, order, filters
+
+
+def participant_filter_tags(rows):
+    """Listings filtered on participant names go stale when names or assignments change."""
+    if request.args.get('search') or request.args.get('participant_name'):
+        return {'books:by-participant'}
+    return set()
+
+
+def assignment_tags(assignments):
+    """Cache tags of the participants and roles of BookParticipant rows."""
+    return id_tags('participant', [assignment.participantid for assignment in assignments]) | \
+        id_tags('role', [assignment.roleid for assignment in assignments])
+
+
+def book_tags(books):
+    """Cache tags of a book or books, with the participants and roles they embed.
+
+    Participants are only loaded, and embedded, when the response includes them.
+    """
+    if isinstance(books, Book):
+        books = [books]
+    tags = id_tags('book', [book.bookid for book in books])
+    for book in books:
+        if 'participants' not in inspect(book).unloaded:
+            tags |= assignment_tags(book.participants)
+    return tags
+
+
+def book_list_tags(books):
+    return book_tags(books) | participant_filter_tags(books)
+
+
+def facet_tags(facets):
+    """Role facet values embed the role descriptions."""
+    return id_tags('role', [item['roleid'] for item in facets['role']]) | participant_filter_tags(facets)
+
+
+def participant_named(name):
+    """Books with a participant whose name contains `name`, as a semi-join.
+
+    The uncorrelated IN lets SQLite read the matching participants first and probe
+    books by key, where a correlated EXISTS would check every book; PostgreSQL
+    plans both as the same semi-join.
+    """
+    return Book.bookid.in_(db.select(BookParticipant.bookid).join(Participant).where(
+        Participant.name.ilike(f'%{name}%')))
+
+
+# BookList filters: query argument -> condition on books built from its value. Each
+# condition is a predicate on the books row (related tables are reached through
+# semi-joins), so any combination keeps one row per book and no DISTINCT is needed.
+BOOK_FILTERS = {
+    'title': lambda value: Book.title.ilike(f'%{value}%'),
+    'isbn': lambda value: Book.isbn == value,
+    'publisher': lambda value: Book.publisher.ilike(f'%{value}%'),
+    'editionnumber': lambda value: Book.editionnumber == value,
+    'publicationplace': lambda value: Book.publicationplace.ilike(f'%{value}%'),
+    'participant_name': participant_named,
+}
+
+
+def filter_books(query, args):
+    """Apply the BookList filters in `args` to a Book query or select() statement.
+
+    Returns the filtered query, still one row per book, and the search relevance
+    expression (None without a `search` term).
+    """
+    score = None
+    if args['search']:
+        query, score = search_books(query, args['search'])
+
+    conditions = [build(args[name]) for name, build in BOOK_FILTERS.items()
+                  if args[name] is not None and args[name] != '']
+    # Date filters are periods parsed by date_period; their intersection becomes one
+    # range predicate the (publicationdate, bookid) index serves
+    starts = [args[name][0] for name in ('published_from', 'year', 'publicationdate') if args[name]]
+    ends = [args[name][1] for name in ('published_to', 'year', 'publicationdate') if args[name]]
+    if starts:
+        conditions.append(Book.publicationdate >= max(starts))
+    if ends:
+        conditions.append(Book.publicationdate < min(ends))
+    if conditions:
+        query = query.filter(*conditions)
+    return query, score
+
+
+def book_load_options(selected=None, loader=db.joinedload):
+    """Loader options for marshalling the `selected` book_model keys (all when None).
+
+    Only the selected columns are fetched, and participants and roles are loaded
+    (by `loader`, joined by default) only when `participants` is selected.
+    """
+    if selected is None:
+        return [
+            loader(Book.participants).joinedload(
+                BookParticipant.participant),
+            loader(Book.participants).joinedload(BookParticipant.role)
+        ]
+    columns = [getattr(Book, key) for key in selected if key != 'participants']
+    options = [db.load_only(Book.bookid, Book.version, *columns)]
+    if 'participants' in selected:
+        options += [
+            loader(Book.participants).joinedload(
+                BookParticipant.participant),
+            loader(Book.participants).joinedload(BookParticipant.role)
+        ]
+    return options
+
+
+def load_books(book_ids, selected=None, loader=db.selectinload):
+    """Load books for marshalling `selected` keys, preserving the order of `book_ids`.
+
+    Participants come from one selectin query rather than multiplying the rows of
+    the IN query. Returns the books found and the X-Missing-Ids header naming the
+    others.
+    """
+    if not book_ids:
+        return [], {}
+    books = Book.query.options(*book_load_options(selected, loader)).filter(
+        Book.bookid.in_(book_ids)).all()
+    return in_requested_order(book_ids, books, lambda book: book.bookid)
 
 
 @api.route('/')
 class BookList(Resource):
     @api.expect(parser)
-    @api.marshal_list_with(book_model)
+    @cache.cached('books', tags=book_list_tags)
+    @marshal_list_with(api, book_model, sparse=True)
     def get(self):
         """List all books or filter books based on query parameters."""
         args = parser.parse_args()  # Parse arguments from query
+        selected = requested_fields(book_model)
 
-        # Start the query with joinedload options for efficient loading of relationships
-        query = Book.query.options(
-            db.joinedload(Book.participants).joinedload(
-                BookParticipant.participant),
-            db.joinedload(Book.participants).joinedload(BookParticipant.role)
-        )
-
-        # Apply filters based on arguments provided
-        if args['search']:
-            search_term = f"%{args['search']}%"
-            query = query.join(BookParticipant).join(Participant).filter(
-                db.or_(
-                    Book.title.ilike(search_term),
-                    Book.publisher.ilike(search_term),
-                    Book.publicationplace.ilike(search_term),
-                    Book.isbn.ilike(search_term),
-                    Participant.name.ilike(search_term)
-                )
-            )
-
-        if args['title']:
-            query = query.filter(Book.title.ilike(f'%{args["title"]}%'))
-        if args['isbn']:
-            query = query.filter(Book.isbn == args['isbn'])
-        if args['publisher']:
-            query = query.filter(
-                Book.publisher.ilike(f'%{args["publisher"]}%'))
-        if args['editionnumber'] is not None:
-            query = query.filter(Book.editionnumber == args['editionnumber'])
-        if args['publicationplace']:
-            query = query.filter(Book.publicationplace.ilike(
-                f'%{args["publicationplace"]}%'))
-        if args['publicationdate']:
-            query = query.filter(Book.publicationdate.like(
-                f'%{args["publicationdate"]}%'))
-        if args['participant_name']:
-            query = query.join(BookParticipant).join(Participant).filter(
-                Participant.name.ilike(f'%{args["participant_name"]}%'))
-
-        # Execute the query and return results
-        query = query.distinct()
-
-        books = query.all()
-        return books
+        if args['ids'] is not None:
+            books, headers = load_books(args['ids'], selected)
+            return books, 200, headers
+
+        query, score = filter_books(Book.query, args)
+
+        if args['limit'] is None and args['after'] is None:
+            if score is None:
+                # Execute the query and return results
+                books = query.options(*book_load_options(selected, db.selectinload)).all()
+                return books
+            # Rank search matches, best first
+            score = score.label('score')
+            ranked = query.with_entities(Book.bookid, score).order_by(score.desc(), Book.bookid).all()
+            return load_books([row.bookid for row in ranked], selected)[0]
+
+        try:
+            limit = page_size(args['limit'])
+            columns, order, filters = keyset_order(args)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        # Page over book keys first, then load the page's books with their participants
+        page = query.filter(*filters).with_entities(*columns).order_by(*order).limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        books, _ = load_books([row[-1] for row in page], selected)
+
+        cursor = encode_cursor(args['sort'], page[-1]) if has_more else None
+        return books, 200, next_page_headers(cursor)
 
     @api.expect(book_post_model, validate=True)
     @api.marshal_with(book_model, code=201)
@@ -162,9 +471,12 @@ class BookList(Resource):
             # Create the book without the participants data
             book = Book(**data)
             db.session.add(book)
+            db.session.flush()
+            add_books([book.bookid])
             db.session.commit()
 
             current_app.logger.info(f"New book added with ID {book.bookid}")
+            notify('book', 'create', bookid=book.bookid)
 
             return book, 201
         except IntegrityError as ie:
@@ -180,19 +492,116 @@ class BookList(Resource):
             return {"message": f"Failed to add book due to an unexpected error: {str(e)}"}, 500
 
 
+@api.route('/facets')
+class BookFacets(Resource):
+    @api.expect(facet_parser)
+    @cache.cached('books', 'facets', tags=facet_tags)
+    @marshal_with(api, book_facets_model)
+    def get(self):
+        """Count the books matching the BookList filters per publisher, place, year and role"""
+        args = facet_parser.parse_args()
+        size = args.pop('size')
+        if size is None:
+            size = current_app.config.get('FACET_SIZE', 20)
+        if size < 1:
+            api.abort(400, 'size must be a positive integer')
+
+        if all(value is None or value == '' for value in args.values()):
+            # Unfiltered counts are read from the summary table
+            return book_facets(size=size)
+        query, _ = filter_books(book_rows(), args)
+        return book_facets(query, size)
+
+
+@api.route('/import')
+class BookImport(Resource):
+    @api.expect(import_parser)
+    @api.doc(description='Stream books as NDJSON objects or CSV rows with the columns '
+                         'title, description, editionnumber, publisher, publicationplace, '
+                         'publicationdate, numberofpages, isbn and participants. Participants '
+                         'are given by name and role: a list of {"name", "role"} objects in '
+                         'NDJSON, or "Name|Role" pairs separated by ";" in CSV. Missing '
+                         'participants and roles are created.')
+    @api.marshal_with(import_result_model)
+    def post(self):
+        """Bulk import books with their participants"""
+        args = import_parser.parse_args()
+        fmt = args['format']
+        if fmt is None:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        chunk_size = args['chunk_size'] or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+        if chunk_size < 1:
+            api.abort(400, 'chunk_size must be a positive integer')
+
+        importer = BookImporter(chunk_size=chunk_size,
+                                max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 100))
+        stats = importer.run(readers[fmt](request.stream))
+        current_app.logger.info(
+            f"Imported {stats['inserted']} of {stats['rows']} books in {stats['elapsed_seconds']}s")
+        return stats, 200
+
+
+@api.route('/upsert')
+class BookUpsert(Resource):
+    @api.expect([book_post_model])
+    @api.doc(description='Send a JSON array of books. Each is matched by its ISBN without hyphens or '
+                         'spaces, case-insensitively: a new ISBN creates a book, a known one replaces '
+                         'its columns (the stored ISBN keeps its formatting), and books already as sent '
+                         'are left unwritten. The batch is written in one transaction; invalid records '
+                         'are reported and skipped.')
+    @api.response(413, 'More books than UPSERT_MAX_BATCH')
+    @api.marshal_with(upsert_result_model)
+    def post(self):
+        """Create or update a batch of books by ISBN"""
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            api.abort(400, 'Expected a JSON array of books')
+        max_batch = current_app.config.get('UPSERT_MAX_BATCH', 5000)
+        if len(records) > max_batch:
+            api.abort(413, f'At most {max_batch} books can be upserted at once')
+
+        stats = upsert_books(records, max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 100))
+        current_app.logger.info(
+            f"Upserted {stats['records']} books: {stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['failed']} failed in {stats['elapsed_seconds']}s")
+        return stats, 200
+
+
+@api.route('/export')
+class BookExport(Resource):
+    @api.expect(export_parser)
+    @api.produces(['application/x-ndjson', 'text/csv'])
+    @api.response(200, 'Streamed catalog with nested participants and roles')
+    def get(self):
+        """Stream the whole catalog"""
+        args = export_parser.parse_args()
+        compress = args['gzip']
+        if compress is None:
+            compress = 'gzip' in request.accept_encodings
+        lines, mimetype = writers[args['format']]
+
+        body = encode(lines(iter_books(current_app.config.get('EXPORT_BATCH_SIZE', 1000))), compress)
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f"attachment; filename=catalog.{args['format']}"
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+
 @api.route('/<int:bookid>')
 @api.param('bookid', 'The book identifier')
 @api.response(404, 'Book not found')
 class BookResource(Resource):
-    @api.marshal_with(book_model)
+    @api.doc(params={'fields': 'Comma-separated book fields to return'})
+    @cache.cached(view_args={'bookid': 'book'}, tags=book_tags)
+    @marshal_with(api, book_model, sparse=True)
     def get(self, bookid):
         """Fetch a book given its identifier"""
         book = Book.query.options(
-            db.joinedload(Book.participants).joinedload(
-                BookParticipant.participant),
-            db.joinedload(Book.participants).joinedload(BookParticipant.role)
+            *book_load_options(requested_fields(book_model))
         ).get_or_404(bookid)
-        return book
+        return book, 200, etag_headers(book.version)
 
     @api.expect(book_post_model)
     @api.response(204, 'Book successfully updated.')
@@ -200,14 +609,16 @@ class BookResource(Resource):
     def put(self, bookid):
         """Update a book given its identifier"""
         book = Book.query.get_or_404(bookid)
-        data = api.payload
+        data = put_values(api.payload, Book)
         try:
-            for key, value in data.items():
-                if key in ['editionnumber', 'numberofpages'] and value is not None:
-                    value = int(value)  # Convert to integer if necessary
-                setattr(book, key, value)
+            with tracking([bookid]):
+                for key, value in data.items():
+                    if key in ['editionnumber', 'numberofpages'] and value is not None:
+                        value = int(value)  # Convert to integer if necessary
+                    setattr(book, key, value)
             db.session.commit()
             current_app.logger.info(f"Book updated with ID {book.bookid}")
+            notify('book', 'update', bookid=bookid)
             return book, 204
         except ValueError as ve:
             # Handle ValueError if integer conversion fails
@@ -227,14 +638,52 @@ class BookResource(Resource):
             current_app.logger.error(f"Failed to update book: {e}")
             return {"message": "Failed to update book: " + str(e)}, 500
 
+    @api.expect(book_post_model)
+    @api.response(204, 'Book successfully updated.')
+    @api.response(409, 'A book with this ISBN already exists.')
+    @api.response(412, 'The book has changed since the If-Match version.')
+    def patch(self, bookid):
+        """Update some fields of a book in one statement, guarded by If-Match"""
+        try:
+            values = patch_values(api.payload, book_post_model)
+        except ValueError as e:
+            api.abort(400, str(e))
+        if values.get('publicationdate') is not None:
+            try:
+                values['publicationdate'] = datetime.date.fromisoformat(values['publicationdate'])
+            except ValueError:
+                api.abort(400, 'publicationdate must be a date as YYYY-MM-DD')
+
+        # Only changes to faceted columns need the facet counts bookkeeping
+        faceted = {'publisher', 'publicationplace', 'publicationdate'} & values.keys()
+        try:
+            with tracking([bookid]) if faceted else nullcontext():
+                version = versioned_update(Book, bookid, values)
+        except PreconditionFailed as e:
+            db.session.rollback()
+            api.abort(412, str(e))
+        except IntegrityError as ie:
+            db.session.rollback()
+            if 'isbn' in str(ie):
+                api.abort(409, "A book with this ISBN already exists.")
+            api.abort(400, "Failed to update book due to a database error.")
+        if version is None:
+            db.session.rollback()
+            api.abort(404, f"Book with ID {bookid} not found")
+        db.session.commit()
+        notify('book', 'update', bookid=bookid)
+        return '', 204, etag_headers(version)
+
     @api.response(204, 'Book successfully deleted.')
     def delete(self, bookid):
         """Delete a book given its identifier"""
         book = Book.query.get_or_404(bookid)
 
         try:
-            db.session.delete(book)
+            with tracking([bookid]):
+                db.session.delete(book)
             db.session.commit()
+            notify('book', 'delete', bookid=bookid)
             return 'Book deleted', 204
         except IntegrityError as e:
             db.session.rollback()
@@ -250,7 +699,8 @@ class BookResource(Resource):
 @api.route('/<int:bookid>/participants')
 @api.param('bookid', 'The book identifier')
 class BookParticipantList(Resource):
-    @api.marshal_list_with(book_participant_role_model)
+    @cache.cached(view_args={'bookid': 'book'}, tags=assignment_tags)
+    @marshal_list_with(api, book_participant_role_model)
     def get(self, bookid):
         """Get all participants associated with a specific book."""
         book = Book.query.get(bookid)
@@ -271,7 +721,8 @@ class BookParticipantList(Resource):
     @api.expect(book_participant_id_model, validate=True)
     @api.response(201, 'Participant added to book.')
     @api.response(400, 'Bad request.')
-    @api.response(404, 'Book or participant not found.')
+    @api.response(404, 'Book, participant or role not found.')
+    @api.response(409, 'The participant already has this role in the book.')
     def post(self, bookid):
         """Add a participant to a book"""
         data = api.payload
@@ -286,32 +737,79 @@ class BookParticipantList(Resource):
         role_id = data.get('role', {}).get('roleid')
 
         try:
-            # Fetch participant and role by IDs
-            participant = Participant.query.get(
+            # Fetch participant and role by IDs from the lookup cache
+            participant = lookups.participant(
                 participant_id) if participant_id else None
-            role = Role.query.get(role_id) if role_id else None
+            role = lookups.role(role_id) if role_id else None
 
             if not participant or not role:
                 return {"message": "Invalid participant ID or role ID"}, 400
 
             # Create and add the new BookParticipant entry
-            book_participant = BookParticipant(
-                bookid=bookid, participantid=participant.participantid, roleid=role.roleid)
-            db.session.add(book_participant)
+            with tracking([bookid]):
+                db.session.add(BookParticipant(
+                    bookid=bookid, participantid=participant.participantid, roleid=role.roleid))
             db.session.commit()
+            notify('assignment', 'create', bookid=bookid,
+                   participantid=participant.participantid, roleid=role.roleid)
             return {"message": "Participant added successfully"}, 201
 
+        except IntegrityError:
+            db.session.rollback()
+            # The lookup cache may still hold a participant or role deleted by another process
+            participantids, roleids = lookups.missing([participant.participantid], [role.roleid])
+            if participantids:
+                return {"message": "Participant not found"}, 404
+            if roleids:
+                return {"message": "Role not found"}, 404
+            return {"message": "Participant already has this role in the book"}, 409
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f"Failed to add participant to book: {e}")
             return {"message": "Failed to add participant to book"}, 500
 
+    @api.expect([book_participant_assignment_model])
+    @api.doc(description='Replace the participants of a book with the given list. Each entry '
+                         'names a participant by participantid or name and a role by roleid '
+                         'or role description. Assignments already present are kept, the '
+                         'rest are added or removed in a single transaction.')
+    @api.response(200, 'Participants replaced.', assignment_result_model)
+    @api.response(400, 'Bad request.')
+    @api.response(404, 'Book not found.')
+    def put(self, bookid):
+        """Replace all participants of a book"""
+        try:
+            pairs = resolve_assignments(api.payload)
+        except AssignmentError as e:
+            return {"message": str(e)}, 400
+
+        try:
+            result = replace_assignments(bookid, pairs)
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, IntegrityError):
+                # The lookup cache may still hold participants or roles deleted by another process
+                participantids, roleids = lookups.missing({p for p, _ in pairs}, {r for _, r in pairs})
+                unknown = [f'participant {p}' for p in sorted(participantids)] + \
+                    [f'role {r}' for r in sorted(roleids)]
+                if unknown:
+                    return {"message": f"Unknown {', '.join(unknown)}"}, 400
+            current_app.logger.error(f"Failed to replace participants of book ({bookid}): {e}")
+            return {"message": "Failed to replace participants of book"}, 500
+        if result is None:
+            return {"message": "Book not found"}, 404
+
+        if result['added'] or result['removed']:
+            notify('assignment', 'update', bookid=bookid)
+        return result, 200
+
 
 @api.route('/<int:bookid>/roles/<int:roleid>/participants')
 @api.param('bookid', 'The book identifier')
 @api.param('roleid', 'The role identifier')
 class BookRoleList(Resource):
-    @api.marshal_list_with(book_participant_role_model)
+    @cache.cached(view_args={'bookid': 'book'}, tags=assignment_tags)
+    @marshal_list_with(api, book_participant_role_model)
     def get(self, bookid, roleid):
         """Get all participants of role associated with a specific book."""
         book = Book.query.get(bookid)
@@ -334,7 +832,8 @@ class BookRoleList(Resource):
 @api.param('bookid', 'The book identifier')
 @api.param('roleid', 'The role identifier')
 class BookFilterRoleList(Resource):
-    @api.marshal_list_with(book_participant_role_model)
+    @cache.cached(view_args={'bookid': 'book'}, tags=assignment_tags)
+    @marshal_list_with(api, book_participant_role_model)
     def get(self, bookid, roleid):
         """Get all participants of the book filtered by role."""
         book = Book.query.get(bookid)
@@ -361,6 +860,7 @@ class BookParticipantUpdateResource(Resource):
     @api.response(204, 'Participant role updated successfully.')
     @api.response(400, 'Bad request.')
     @api.response(404, 'Book, participant or role not found.')
+    @api.response(409, 'The participant already has this role in the book.')
     def put(self, bookid, participantid, roleid):
         """Update a specific participant's role in a book."""
         # Validate book exists
@@ -374,13 +874,23 @@ class BookParticipantUpdateResource(Resource):
             return {"message": "Participant not found in this book"}, 404
 
         # Validate the new role exists
-        role = Role.query.get(roleid)
+        role = lookups.role(roleid)
         if not role:
             return {"message": "Role not found"}, 404
 
         # Update the role ID for the participant
-        book_participant.roleid = roleid
-        db.session.commit()
+        try:
+            with tracking([bookid]):
+                book_participant.roleid = roleid
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            # The lookup cache may still hold a role deleted by another process
+            if lookups.missing(roleids=[roleid])[1]:
+                return {"message": "Role not found"}, 404
+            return {"message": "Participant already has this role in the book"}, 409
+        notify('assignment', 'update', bookid=bookid,
+               participantid=participantid, roleid=roleid)
         return {"message": "Participant role updated successfully"}, 204
 
 
@@ -398,8 +908,11 @@ class BookParticipantDeleteResource(Resource):
             return {"message": "Participant not found in this book"}, 404
 
         try:
-            db.session.delete(book_participant)
+            with tracking([bookid]):
+                db.session.delete(book_participant)
             db.session.commit()
+            notify('assignment', 'delete', bookid=bookid,
+                   participantid=participantid)
             return '', 204
 
         except Exception as e:
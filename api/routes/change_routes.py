@@ -0,0 +1,105 @@
+# change_routes.py
+from types import SimpleNamespace
+
+from flask import current_app
+from flask_restx import Namespace, Resource, fields, reqparse
+from services.changes import decode_token, changed_rows, encode_token, read_changes
+from services.replicas import replicas
+from services.serializer import marshal_with
+
+# GETs may be served by a read replica (services.replicas)
+api = Namespace('changes', description='Incremental catalog sync', decorators=[replicas.reads])
+
+timestamps = {
+    'created_at': fields.DateTime(description='When the row was inserted'),
+    'updated_at': fields.DateTime(description='When the row was last updated'),
+}
+
+book_row_model = api.model('BookRow', {
+    'bookid': fields.Integer(description='Book ID'),
+    'title': fields.String(description='Book title'),
+    'description': fields.String(description='Book description'),
+    'editionnumber': fields.Integer(description='Edition number of the book'),
+    'publisher': fields.String(description='Book publisher'),
+    'publicationplace': fields.String(description='Place of publication'),
+    'publicationdate': fields.String(description='Publication date'),
+    'numberofpages': fields.Integer(description='Number of pages'),
+    'isbn': fields.String(description='ISBN number'),
+    'version': fields.Integer(description='Row version'),
+    **timestamps
+})
+
+participant_row_model = api.model('ParticipantRow', {
+    'participantid': fields.Integer(description='Participant ID'),
+    'name': fields.String(description='Participant name'),
+    'version': fields.Integer(description='Row version'),
+    **timestamps
+})
+
+role_row_model = api.model('RoleRow', {
+    'roleid': fields.Integer(description='Role ID'),
+    'description': fields.String(description='Role description'),
+    'version': fields.Integer(description='Row version'),
+    **timestamps
+})
+
+bookparticipant_row_model = api.model('BookParticipantRow', {
+    'id': fields.Integer(description='Assignment ID'),
+    'bookid': fields.Integer(description='Book ID'),
+    'participantid': fields.Integer(description='Participant ID'),
+    'roleid': fields.Integer(description='Role ID'),
+    **timestamps
+})
+
+changed_model = api.model('ChangedRows', {
+    'roles': fields.List(fields.Nested(role_row_model)),
+    'participants': fields.List(fields.Nested(participant_row_model)),
+    'books': fields.List(fields.Nested(book_row_model)),
+    'bookparticipants': fields.List(fields.Nested(bookparticipant_row_model)),
+})
+
+deleted_model = api.model('DeletedIds', {
+    'roles': fields.List(fields.Integer),
+    'participants': fields.List(fields.Integer),
+    'books': fields.List(fields.Integer),
+    'bookparticipants': fields.List(fields.Integer),
+})
+
+changes_model = api.model('Changes', {
+    'changed': fields.Nested(changed_model, description='Current rows inserted or updated since the token'),
+    'deleted': fields.Nested(deleted_model, description='Ids of the rows deleted since the token'),
+    'token': fields.String(description='Pass as `since` to get the changes after these'),
+    'more': fields.Boolean(description='Whether more changes are ready; fetch them right away'),
+})
+
+parser = reqparse.RequestParser()
+parser.add_argument('since', type=str,
+                    help='Token of the previous sync; omit it to get the whole catalog')
+parser.add_argument('limit', type=int,
+                    help='Changed rows per page (default and maximum CHANGES_PAGE_SIZE)')
+
+
+@api.route('')
+class Changes(Resource):
+    @api.expect(parser)
+    @marshal_with(api, changes_model)
+    def get(self):
+        """Get the rows changed and deleted since a sync token, a page at a time"""
+        args = parser.parse_args()
+        maximum = current_app.config['CHANGES_PAGE_SIZE']
+        try:
+            limit = maximum if args['limit'] is None else min(args['limit'], maximum)
+            if limit < 1:
+                raise ValueError('limit must be a positive integer')
+            position = decode_token(args['since'])
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        # Nothing new costs the one log read; the rows are fetched per table otherwise
+        entries, more = read_changes(position, limit)
+        changed, deleted = changed_rows(entries)
+        if entries:
+            position = (entries[-1].txid, entries[-1].seq)
+        # Attributes rather than dicts keep the compiled serializer on its fast path
+        return SimpleNamespace(changed=SimpleNamespace(**changed), deleted=SimpleNamespace(**deleted),
+                               token=encode_token(position), more=more)
@@ -0,0 +1,60 @@
+# event_routes.py
+from flask import Response, request
+from flask_restx import Namespace, Resource, reqparse
+from services.events import TOPICS, events
+from services.pagination import id_list
+
+# Streams are live: no response cache and no read replicas
+api = Namespace('events', description='Live catalog change notifications')
+
+
+def topic_list(value):
+    """Parse a comma-separated `topics` argument."""
+    topics = {part.strip() for part in str(value).split(',') if part.strip()}
+    if not topics:
+        raise ValueError('topics needs at least one topic')
+    unknown = topics.difference(TOPICS)
+    if unknown:
+        raise ValueError(f'Unknown topics: {", ".join(sorted(unknown))}')
+    return topics
+
+
+parser = reqparse.RequestParser()
+parser.add_argument('topics', type=topic_list,
+                    help=f'Only events of these comma-separated topics: {", ".join(TOPICS)}')
+parser.add_argument('bookids', type=id_list,
+                    help='Only events about these comma-separated books (up to MAX_BATCH_SIZE)')
+parser.add_argument('last_event_id', type=str,
+                    help='Resume after this event, for clients that cannot send Last-Event-ID')
+
+
+def stream_arguments():
+    """The (topics, bookids, last_event_id) of a stream request; aborts with 400 when invalid."""
+    args = parser.parse_args()
+    last_event_id = request.headers.get('Last-Event-ID', args['last_event_id'])
+    return args['topics'], args['bookids'], last_event_id
+
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # nginx would otherwise hold events back
+}
+
+
+@api.route('')
+class EventStream(Resource):
+    @api.expect(parser)
+    @api.produces(['text/event-stream'])
+    @api.response(200, 'Server-sent events, one per committed change')
+    @api.response(503, 'Too many open streams in this worker')
+    @api.doc(params={'Last-Event-ID': {'in': 'header', 'type': 'string',
+                                       'description': 'Id of the last event received, to get the ones missed since'}})
+    def get(self):
+        """Stream book, participant, role and assignment changes as they are committed"""
+        topics, bookids, last_event_id = stream_arguments()
+        # Each stream holds a worker thread; keep some free for regular requests
+        if events.streams >= events.max_streams:
+            return Response('Too many open event streams, retry later', 503,
+                            {'Retry-After': str(events.heartbeat)}, mimetype='text/plain')
+        return Response(events.stream(topics, bookids, last_event_id), mimetype='text/event-stream',
+                        headers=STREAM_HEADERS)
@@ -0,0 +1,45 @@
+# health_routes.py
+from flask import current_app
+from flask_restx import Namespace, Resource
+from sqlalchemy import text
+from models import db
+from services.replicas import replicas
+
+api = Namespace('health', description='Liveness and readiness probes')
+
+
+def pool_status(pool):
+    """Counters of a QueuePool; other pool classes report only their name."""
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            status[name] = counter()
+    return status
+
+
+@api.route('/live')
+class Liveness(Resource):
+    def get(self):
+        """The process is up and serving requests"""
+        return {'status': 'ok'}, 200
+
+
+@api.route('/ready')
+class Readiness(Resource):
+    @api.response(200, 'A pooled database connection works.')
+    @api.response(503, 'The database cannot be reached.')
+    def get(self):
+        """The worker can check out a database connection and run a query"""
+        engine = db.engine
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            current_app.logger.warning(f"Readiness check failed: {e}")
+            return {'status': 'unavailable', 'pool': pool_status(engine.pool)}, 503
+        status = {'status': 'ready', 'pool': pool_status(engine.pool)}
+        if replicas.replicas:
+            # Reads fall back to the primary, so an unhealthy replica does not make the worker unready
+            status['replicas'] = replicas.status()
+        return status, 200
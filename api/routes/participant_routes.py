@@ -2,35 +2,88 @@
 
 from flask import current_app
 from flask_restx import Namespace, Resource, fields, reqparse
-from sqlalchemy import exists
+from sqlalchemy import exists, select
 from sqlalchemy.exc import IntegrityError
-from models import db, Participant, BookParticipant
+from models import db, Book, Participant, BookParticipant
+from services.cache import cache, id_tags
+from services.lookups import lookups
+from services.pagination import (InvalidCursor, decode_cursor, encode_cursor, id_list, in_requested_order,
+                                next_page_headers, page_size)
+from services.replicas import replicas
+from services.serializer import marshal_list_with, marshal_with, requested_fields
+from services.signals import notify
+from services.versioning import PreconditionFailed, etag_headers, patch_values, put_values, versioned_update
 
-api = Namespace('participants', description='Participant operations')
+# GETs may be served by a read replica (services.replicas)
+api = Namespace('participants', description='Participant operations', decorators=[replicas.reads])
 
 participant_model = api.model('Participant', {
     'participantid': fields.Integer(readOnly=True, description='The participant unique identifier', attribute='participantid'),
-    'name': fields.String(required=True, description='The name of the participant')
+    'name': fields.String(required=True, description='The name of the participant'),
+    'version': fields.Integer(readOnly=True, description='Row version, sent as the ETag of the participant')
 })
 
 participant_name = api.model('ParticipantName', {
     'name': fields.String(required=True, description='The name of the participant')
 })
 
+participant_role_model = api.model('ParticipantRole', {
+    'roleid': fields.Integer(description='Role ID'),
+    'description': fields.String(description='Role description')
+})
+
+participant_book_model = api.model('ParticipantBook', {
+    'bookid': fields.Integer(description='Book ID'),
+    'title': fields.String(description='Book title'),
+    'publicationdate': fields.String(description='Publication date'),
+    'isbn': fields.String(description='ISBN number'),
+    'roles': fields.List(fields.Nested(participant_role_model),
+                         description='Roles of the participant in the book')
+})
+
+
+def participant_book_tags(books):
+    """Cache tags of the books of a participant and the roles they embed."""
+    return id_tags('book', [book['bookid'] for book in books]) | \
+        id_tags('role', [role['roleid'] for book in books for role in book['roles']])
+
+
 # Argument parser for GET request filtering
 parser = reqparse.RequestParser()
 parser.add_argument('name', type=str,
                     help='Filter by participant name')
+parser.add_argument('fields', type=str,
+                    help='Comma-separated participant fields to return')
+parser.add_argument('ids', type=id_list,
+                    help='Comma-separated participant ids to fetch in this order (at most MAX_BATCH_SIZE)')
+
+# Argument parser for the books of a participant
+books_parser = reqparse.RequestParser()
+books_parser.add_argument('roleid', type=int,
+                          help='Only books in which the participant has this role')
+books_parser.add_argument('limit', type=int,
+                          help='Page size (default and maximum MAX_PAGE_SIZE)')
+books_parser.add_argument('after', type=str,
+                          help='Cursor from X-Next-Cursor to fetch the following page')
 
 @api.route('/')
 class ParticipantList(Resource):
     @api.expect(parser)
-    @api.marshal_list_with(participant_model)
+    @cache.cached('participants')
+    @marshal_list_with(api, participant_model, sparse=True)
     def get(self):
         """List all participants"""
         args = parser.parse_args()  # Parse arguments from query
         query = Participant.query
+        selected = requested_fields(participant_model)
+        if selected is not None:
+            query = query.options(db.load_only(*[getattr(Participant, key) for key in selected]))
         try:
+            if args['ids'] is not None:
+                participants = query.filter(Participant.participantid.in_(args['ids'])).all()
+                participants, headers = in_requested_order(
+                    args['ids'], participants, lambda participant: participant.participantid)
+                return participants, 200, headers
             # Apply filters based on arguments provided
             if args['name']:
                 query = query.filter(Participant.name.ilike(f'%{args["name"]}%'))
@@ -49,6 +102,7 @@ class ParticipantList(Resource):
         db.session.add(participant)
         try:
             db.session.commit()
+            notify('participant', 'create', participantid=participant.participantid)
             return participant, 201
         except Exception as e:
             db.session.rollback()
@@ -59,12 +113,14 @@ class ParticipantList(Resource):
 @api.param('participantid', 'The participant identifier')
 @api.response(404, 'Participant not found')
 class ParticipantResource(Resource):
-    @api.marshal_with(participant_model)
+    @api.doc(params={'fields': 'Comma-separated participant fields to return'})
+    @cache.cached(view_args={'participantid': 'participant'})
+    @marshal_with(api, participant_model, sparse=True)
     def get(self, participantid):
         """Fetch a participant given their identifier"""
         participant = Participant.query.get(participantid)
         if participant:
-            return participant
+            return participant, 200, etag_headers(participant.version)
         else:
             api.abort(404, f"Participant with ID {participantid} not found")
 
@@ -76,13 +132,35 @@ class ParticipantResource(Resource):
         participant = Participant.query.get(participantid)
         if not participant:
             api.abort(404, f"Participant with ID {participantid} not found")
-        data = api.payload
+        data = put_values(api.payload, Participant)
         for key, value in data.items():
             if hasattr(participant, key):
                 setattr(participant, key, value)
         db.session.commit()
+        notify('participant', 'update', participantid=participantid)
         return participant, 204
 
+    @api.expect(participant_name)
+    @api.response(204, 'Participant successfully updated.')
+    @api.response(412, 'The participant has changed since the If-Match version.')
+    def patch(self, participantid):
+        """Update a participant in one statement, guarded by If-Match"""
+        try:
+            values = patch_values(api.payload, participant_name)
+        except ValueError as e:
+            api.abort(400, str(e))
+        try:
+            version = versioned_update(Participant, participantid, values)
+        except PreconditionFailed as e:
+            db.session.rollback()
+            api.abort(412, str(e))
+        if version is None:
+            db.session.rollback()
+            api.abort(404, f"Participant with ID {participantid} not found")
+        db.session.commit()
+        notify('participant', 'update', participantid=participantid)
+        return '', 204, etag_headers(version)
+
     @api.response(204, 'Participant successfully deleted.')
     def delete(self, participantid):
         """Delete a participant given their identifier"""
@@ -106,4 +184,59 @@ class ParticipantResource(Resource):
             db.session.rollback()
             current_app.logger.error(f"Failed to delete participant ({participantid}): {e}")
             api.abort(500, f"Failed to delete participant ({participantid}).")  # Use api.abort to send the correct status and message
+        notify('participant', 'delete', participantid=participantid)
         return {'message': 'Participant deleted'}, 204
+
+
+@api.route('/<int:participantid>/books')
+@api.param('participantid', 'The participant identifier')
+@api.response(404, 'Participant not found')
+class ParticipantBookList(Resource):
+    @api.expect(books_parser)
+    @cache.cached('books', 'books:by-participant', view_args={'participantid': 'participant'},
+                  tags=participant_book_tags)
+    @marshal_list_with(api, participant_book_model)
+    def get(self, participantid):
+        """List the books of a participant, a page at a time in bookid order"""
+        args = books_parser.parse_args()
+        if lookups.participant(participantid) is None:
+            api.abort(404, f"Participant with ID {participantid} not found")
+        filters = [BookParticipant.participantid == participantid]
+        if args['roleid'] is not None:
+            filters.append(BookParticipant.roleid == args['roleid'])
+        try:
+            limit = page_size(args['limit'])
+            if args['after']:
+                key = decode_cursor(args['after'], 'bookid')
+                if len(key) != 1 or not isinstance(key[0], int):
+                    raise InvalidCursor('Malformed cursor')
+                filters.append(BookParticipant.bookid > key[0])
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        # The page of bookids and the book columns come from one statement; both
+        # walk the (participantid, bookid, roleid) index of the join table
+        page = select(BookParticipant.bookid).where(*filters).distinct().order_by(
+            BookParticipant.bookid).limit(limit + 1)
+        rows = db.session.execute(
+            select(Book.bookid, Book.title, Book.publicationdate, Book.isbn, BookParticipant.roleid)
+            .join(BookParticipant, BookParticipant.bookid == Book.bookid)
+            .where(*filters, BookParticipant.bookid.in_(page))
+            .order_by(BookParticipant.bookid, BookParticipant.roleid)).all()
+
+        books = {}
+        for row in rows:
+            book = books.setdefault(row.bookid, {
+                'bookid': row.bookid, 'title': row.title, 'publicationdate': row.publicationdate,
+                'isbn': row.isbn, 'roles': []})
+            book['roles'].append(row.roleid)
+        roles = lookups.roles({roleid for book in books.values() for roleid in book['roles']})
+        books = list(books.values())
+        has_more = len(books) > limit
+        books = books[:limit]
+        for book in books:
+            book['roles'] = [{'roleid': roleid, 'description': roles[roleid].description}
+                             for roleid in book['roles'] if roleid in roles]
+
+        cursor = encode_cursor('bookid', [books[-1]['bookid']]) if has_more else None
+        return books, 200, next_page_headers(cursor)
@@ -4,8 +4,15 @@ from flask_restx import Namespace, Resource, fields, reqparse
 from sqlalchemy.sql import select
 from sqlalchemy.exc import IntegrityError
 from models import db, Role, BookParticipant
+from services.cache import cache
+from services.pagination import id_list, in_requested_order
+from services.replicas import replicas
+from services.serializer import marshal_list_with, marshal_with, requested_fields
+from services.signals import notify
+from services.versioning import PreconditionFailed, etag_headers, patch_values, versioned_update
 
-api = Namespace('roles', description='Role operations')
+# GETs may be served by a read replica (services.replicas)
+api = Namespace('roles', description='Role operations', decorators=[replicas.reads])
 
 role_description_model = api.model('RoleDescription', {
     'description': fields.String(required=True, description='Role description')
@@ -13,23 +20,36 @@ role_description_model = api.model('RoleDescription', {
 
 role_model = api.model('Role', {
     'roleid': fields.Integer(readOnly=True, description='Role ID', attribute='roleid'),
-    'description': fields.String(required=True, description='Role description')
+    'description': fields.String(required=True, description='Role description'),
+    'version': fields.Integer(readOnly=True, description='Row version, sent as the ETag of the role')
 })
 
 # Argument parser for GET request filtering
 parser = reqparse.RequestParser()
 parser.add_argument('description', type=str,
                     help='Filter by role description')
+parser.add_argument('fields', type=str,
+                    help='Comma-separated role fields to return')
+parser.add_argument('ids', type=id_list,
+                    help='Comma-separated role ids to fetch in this order (at most MAX_BATCH_SIZE)')
 
 @api.route('/')
 class RoleList(Resource):
     @api.expect(parser)
-    @api.marshal_list_with(role_model)
+    @cache.cached('roles')
+    @marshal_list_with(api, role_model, sparse=True)
     def get(self):
         """List all roles"""
         args = parser.parse_args()  # Parse arguments from query
         query = Role.query
+        selected = requested_fields(role_model)
+        if selected is not None:
+            query = query.options(db.load_only(*[getattr(Role, key) for key in selected]))
         try:
+            if args['ids'] is not None:
+                roles = query.filter(Role.roleid.in_(args['ids'])).all()
+                roles, headers = in_requested_order(args['ids'], roles, lambda role: role.roleid)
+                return roles, 200, headers
             # Apply filters based on arguments provided
             if args['description']:
                 query = query.filter(Role.description.ilike(f'%{args["description"]}%'))
@@ -48,6 +68,7 @@ class RoleList(Resource):
         db.session.add(role)
         try:
             db.session.commit()
+            notify('role', 'create', roleid=role.roleid)
             return role, 201
         except Exception as e:
             db.session.rollback()
@@ -59,12 +80,14 @@ class RoleList(Resource):
 @api.param('id', 'The role identifier')
 @api.response(404, 'Role not found')
 class RoleResource(Resource):
-    @api.marshal_with(role_model)
+    @api.doc(params={'fields': 'Comma-separated role fields to return'})
+    @cache.cached(view_args={'id': 'role'})
+    @marshal_with(api, role_model, sparse=True)
     def get(self, id):
         """Fetch a role given its identifier"""
         role = Role.query.get(id)
         if role:
-            return role
+            return role, 200, etag_headers(role.version)
         else:
             api.abort(404, f"Role with ID {id} not found")
 
@@ -80,8 +103,34 @@ class RoleResource(Resource):
         if 'description' in data:
             role.description = data['description']
         db.session.commit()
+        notify('role', 'update', roleid=id)
         return role, 204
 
+    @api.expect(role_description_model)
+    @api.response(204, 'Role successfully updated.')
+    @api.response(409, 'Another role has this description.')
+    @api.response(412, 'The role has changed since the If-Match version.')
+    def patch(self, id):
+        """Update a role in one statement, guarded by If-Match"""
+        try:
+            values = patch_values(api.payload, role_description_model)
+        except ValueError as e:
+            api.abort(400, str(e))
+        try:
+            version = versioned_update(Role, id, values)
+        except PreconditionFailed as e:
+            db.session.rollback()
+            api.abort(412, str(e))
+        except IntegrityError:
+            db.session.rollback()
+            api.abort(409, "Another role has this description.")
+        if version is None:
+            db.session.rollback()
+            api.abort(404, f"Role with ID {id} not found")
+        db.session.commit()
+        notify('role', 'update', roleid=id)
+        return '', 204, etag_headers(version)
+
     @api.response(204, 'Role successfully deleted.')
     def delete(self, id):
         """Delete a role given its identifier"""
@@ -106,5 +155,6 @@ class RoleResource(Resource):
             db.session.rollback()
             current_app.logger.error(f"Failed to delete role ({id}): {e}")
             api.abort(500, f'Failed to delete role ({id})')
-    
+
+        notify('role', 'delete', roleid=id)
         return {'message': 'Role deleted'}, 204
@@ -0,0 +1,112 @@
+# services/assignments.py
+from sqlalchemy import delete, insert, select
+
+from models import db, Book, BookParticipant, Participant, Role
+from .facets import tracking
+from .lookups import lookups
+
+
+class AssignmentError(ValueError):
+    """The requested participant list of a book cannot be applied."""
+
+
+def resolve_assignments(entries):
+    """Resolve `[{participantid | name, roleid | role}]` into a list of unique
+    `(participantid, roleid)` pairs, keeping the input order.
+
+    Ids are validated against the lookup cache and names with one IN query per kind,
+    so the cost does not grow with the number of entries. Names must match existing
+    participants and roles; a name shared by several participants resolves to the
+    oldest one.
+    """
+    if not isinstance(entries, list):
+        raise AssignmentError('Expected a list of participant assignments')
+
+    refs = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise AssignmentError(f'Entry {index}: expected an object')
+        participant = entry.get('participantid') or entry.get('name')
+        role = entry.get('roleid') or entry.get('role')
+        if not participant or not role:
+            raise AssignmentError(f'Entry {index}: needs a participantid or name and a roleid or role')
+        if isinstance(participant, bool) or not isinstance(participant, (int, str)) \
+                or isinstance(role, bool) or not isinstance(role, (int, str)):
+            raise AssignmentError(f'Entry {index}: ids must be integers and names strings')
+        refs.append((participant, role))
+
+    participant_ids = lookups.participants({p for p, _ in refs if isinstance(p, int)})
+    role_ids = lookups.roles({r for _, r in refs if isinstance(r, int)})
+
+    participant_names = {p for p, _ in refs if isinstance(p, str)}
+    by_name = {}
+    if participant_names:
+        for participantid, name in db.session.execute(
+                select(Participant.participantid, Participant.name)
+                .where(Participant.name.in_(participant_names))
+                .order_by(Participant.participantid.desc())):
+            by_name[name] = participantid
+    role_descriptions = {r for _, r in refs if isinstance(r, str)}
+    by_description = {}
+    if role_descriptions:
+        for roleid, description in db.session.execute(
+                select(Role.roleid, Role.description)
+                .where(Role.description.in_(role_descriptions))
+                .order_by(Role.roleid.desc())):
+            by_description[description] = roleid
+
+    pairs = []
+    unknown = []
+    for participant, role in refs:
+        participantid = by_name.get(participant) if isinstance(participant, str) \
+            else participant if participant in participant_ids else None
+        roleid = by_description.get(role) if isinstance(role, str) \
+            else role if role in role_ids else None
+        if participantid is None:
+            unknown.append(f'participant {participant!r}')
+        if roleid is None:
+            unknown.append(f'role {role!r}')
+        if participantid is not None and roleid is not None and (participantid, roleid) not in pairs:
+            pairs.append((participantid, roleid))
+    if unknown:
+        raise AssignmentError(f"Unknown {', '.join(dict.fromkeys(unknown))}")
+    return pairs
+
+
+def replace_assignments(bookid, pairs):
+    """Make `(participantid, roleid)` pairs the exact participant list of a book.
+
+    Existing rows are diffed against `pairs`, so unchanged assignments keep their
+    ids, and the deletes and inserts run in a single transaction together with the
+    facet count update. The book row is locked first so concurrent replacements of
+    the same book apply one after the other. Returns `{'added', 'removed', 'unchanged'}` counts, or None when the book
+    does not exist.
+    """
+    if db.session.execute(
+            select(Book.bookid).where(Book.bookid == bookid).with_for_update()).first() is None:
+        return None
+
+    wanted = set(pairs)
+    keep = set()
+    stale = []
+    for row_id, participantid, roleid in db.session.execute(
+            select(BookParticipant.id, BookParticipant.participantid, BookParticipant.roleid)
+            .where(BookParticipant.bookid == bookid)):
+        pair = (participantid, roleid)
+        if pair in wanted and pair not in keep:
+            keep.add(pair)
+        else:
+            stale.append(row_id)
+    added = [pair for pair in pairs if pair not in keep]
+
+    if stale or added:
+        with tracking([bookid]):
+            if stale:
+                db.session.execute(delete(BookParticipant).where(BookParticipant.id.in_(stale)))
+            if added:
+                db.session.execute(insert(BookParticipant), [
+                    {'bookid': bookid, 'participantid': participantid, 'roleid': roleid}
+                    for participantid, roleid in added
+                ])
+    db.session.commit()
+    return {'added': len(added), 'removed': len(stale), 'unchanged': len(keep)}
@@ -0,0 +1,226 @@
+# services/async_reads.py
+import asyncio
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from flask_restx.utils import unpack
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from .cache import cache
+from .instrumentation import instrumentation
+from .serializer import compiler, output_json, requested_fields
+
+# Async driver replacing the sync one of each supported database URL
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """Swap the driver of a sync SQLAlchemy URL for its async counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver known for {backend} URLs; set ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncRoutes:
+    """Registry of async GET handlers mirroring sync routes.
+
+    A handler takes an AsyncSession plus the integer view arguments of its rule and
+    returns the same `data` or `(data, code, headers)` as the sync view, before
+    marshalling with `model`. `cache_tags`, `tags` and `view_args` are the arguments
+    of the sync view's `cache.cached`.
+
+    A `stream` handler takes the view arguments only and returns a Response whose
+    body is an async iterator of text, sent chunk by chunk until the client leaves.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.streams = []
+
+    @staticmethod
+    def compile(rule):
+        return re.compile('^' + re.sub(r'<int:(\w+)>', r'(?P<\1>\\d+)', rule) + '$')
+
+    def route(self, rule, model, sparse=False, cache_tags=(), tags=None, view_args=None):
+        pattern = self.compile(rule)
+
+        def decorator(f):
+            self.routes.append((pattern, f, model, sparse, cache_tags, tags, view_args))
+            return f
+        return decorator
+
+    def stream(self, rule):
+        pattern = self.compile(rule)
+
+        def decorator(f):
+            self.streams.append((pattern, f))
+            return f
+        return decorator
+
+    def match(self, path, routes=None):
+        for pattern, *route in self.routes if routes is None else routes:
+            match = pattern.match(path)
+            if match:
+                kwargs = {key: int(value) for key, value in match.groupdict().items()}
+                return route, kwargs
+        return None
+
+    def match_stream(self, path):
+        return self.match(path, self.streams)
+
+
+reads = AsyncRoutes()
+
+
+class AsyncReadApp:
+    """ASGI application serving the reads registered on `reads` with an AsyncSession.
+
+    Handlers run inside a Flask request context, so they parse arguments, serialize
+    and use the response cache exactly like the sync views; only their queries are
+    awaited. Every
+    other request goes to the Flask app through a WSGI adapter (in a thread pool),
+    as do reads that end in an HTTP error or send a field mask header, so those
+    responses are the usual ones.
+    """
+
+    def __init__(self, app, routes=reads):
+        self.app = app
+        self.routes = routes
+        self.wsgi = WsgiToAsgi(app)
+        url = app.config.get('ASYNC_DATABASE_URL') or async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        self.engine = create_async_engine(url, **app.config.get('ASYNC_ENGINE_OPTIONS', {}))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        if instrumentation.enabled:
+            instrumentation.instrument_engine(self.engine.sync_engine, 'async')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = self.routes.match(scope['path'])
+            if match is not None:
+                response = await self.dispatch(scope, *match)
+                if response is not None:
+                    return await self.send_response(response, send)
+            match = self.routes.match_stream(scope['path'])
+            if match is not None:
+                response = self.open_stream(scope, *match)
+                if response is not None:
+                    return await self.send_stream(response, receive, send)
+        await self.wsgi(scope, receive, send)
+
+    def request_context(self, scope):
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+        server = scope.get('server') or ('localhost', 80)
+        host = dict(headers).get('host') or f'{server[0]}:{server[1]}'
+        return self.app.test_request_context(
+            scope['path'], base_url=f"{scope['scheme']}://{host}{scope.get('root_path', '')}",
+            query_string=scope['query_string'].decode('latin-1'), headers=headers)
+
+    async def dispatch(self, scope, route, kwargs):
+        """Run the handler of `route` and return the Flask response, or None to defer
+        to the sync view."""
+        handler, model, sparse, cache_tags, tags, view_args = route
+        with self.request_context(scope):
+            if request.headers.get(self.app.config['RESTX_MASK_HEADER']):
+                return None
+            if self.app.preprocess_request() is not None:
+                return None
+            key = None
+            if cache.backend is not None:
+                key, entry = cache.lookup()
+                if entry is not None:
+                    return self.app.process_response(cache.respond(entry, 'HIT'))
+            try:
+                only = requested_fields(model) if sparse else None
+                async with self.sessions() as session:
+                    data, code, response_headers = unpack(await handler(session, **kwargs))
+            except HTTPException:
+                return None
+            rows = data
+            serialize = compiler.compile(model, only)
+            if isinstance(data, (list, tuple)):
+                data = [serialize(item) for item in data]
+            else:
+                data = serialize(data)
+            if key is not None and code == 200:
+                entry = cache.store(key, data, code, response_headers,
+                                    cache.entry_tags(cache_tags, tags, view_args, rows, kwargs))
+                return self.app.process_response(cache.respond(entry, 'MISS'))
+            return self.app.process_response(output_json(data, code, response_headers))
+
+    def open_stream(self, scope, route, kwargs):
+        """Start the stream of `route` and return its response, or None to defer to the
+        sync view (which answers errors the usual way)."""
+        handler, = route
+        with self.request_context(scope):
+            if self.app.preprocess_request() is not None:
+                return None
+            try:
+                response = handler(**kwargs)
+            except HTTPException:
+                return None
+            return self.app.process_response(response)
+
+    async def send_stream(self, response, receive, send):
+        """Send the async body of `response` as it is produced, until it ends or the
+        client disconnects."""
+        body = response.response
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items()],
+        })
+        disconnected = asyncio.ensure_future(self.disconnect(receive))
+        try:
+            while True:
+                chunk = asyncio.ensure_future(body.__anext__())
+                await asyncio.wait((chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if not chunk.done():
+                    # Cancelling runs the body's cleanup before it is closed below
+                    chunk.cancel()
+                    await asyncio.gather(chunk, return_exceptions=True)
+                    return
+                try:
+                    text = chunk.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await body.aclose()
+
+    @staticmethod
+    async def disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def send_response(response, send):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,311 @@
+# services/autocomplete.py
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Book, Participant
+from .signals import catalog_changed
+
+# Suggestion kinds served by GET /api/autocomplete
+KINDS = ('title', 'participant', 'publisher')
+
+COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Fold case and accents and reduce `text` to single-space separated words."""
+    return NON_WORD.sub(' ', COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', text))).casefold().strip()
+
+
+def word_starts(key):
+    """(offset, word) of the words after the first in the normalized text `key`."""
+    offset = key.find(' ')
+    while offset >= 0:
+        end = key.find(' ', offset + 1)
+        yield offset + 1, key[offset + 1:end if end >= 0 else None]
+        offset = end
+
+
+class PrefixIndex:
+    """Entries of one kind, found by a prefix of their text or of one of its words.
+
+    Normalized texts are kept in a sorted list with the entry ids alongside. So are
+    the places where their later words start, as (entry id, offset) pairs ordered
+    by the text from there on. A lookup is a binary search in each followed by a
+    walk of about as many entries as it returns, whatever the size of the index.
+    """
+
+    def __init__(self, entries=()):
+        self.labels = {}  # entry id -> (label, normalized text)
+        pairs, starts = [], {}
+        for entry_id, label in entries:
+            key = normalize(label or '')
+            if key:
+                self.labels[entry_id] = (label, key)
+                pairs.append((key, entry_id))
+                for offset, word in word_starts(key):
+                    starts.setdefault(word, []).append((entry_id, offset))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [entry_id for _, entry_id in pairs]
+        # Texts are single-space separated and a space sorts before any word character,
+        # so ordering by the starting word first gives the order of the whole suffixes
+        # while only materializing one word's suffixes at a time
+        self.suffix_ids, self.suffix_offsets = [], []
+        for word in sorted(starts):
+            group = starts.pop(word)
+            group.sort(key=lambda item: (self.labels[item[0]][1][item[1]:], item[0]))
+            self.suffix_ids.extend(entry_id for entry_id, _ in group)
+            self.suffix_offsets.extend(offset for _, offset in group)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suffix(self, position):
+        return self.labels[self.suffix_ids[position]][1][self.suffix_offsets[position]:]
+
+    def key_position(self, key, entry_id):
+        """Position of `entry_id` with text `key` in the texts, ties ordered by id."""
+        low = bisect.bisect_left(self.keys, key)
+        high = bisect.bisect_right(self.keys, key, low)
+        while low < high:
+            middle = (low + high) // 2
+            if self.ids[middle] < entry_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def suffix_position(self, text, entry_id=None):
+        """Position of the first word-start suffix not ordered before `text` (and,
+        among equal suffixes, before `entry_id`)."""
+        low, high = 0, len(self.suffix_ids)
+        while low < high:
+            middle = (low + high) // 2
+            suffix = self.suffix(middle)
+            if suffix < text or (suffix == text and entry_id is not None and self.suffix_ids[middle] < entry_id):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def add(self, entry_id, label):
+        """Index `label` under `entry_id`, replacing its previous label."""
+        self.remove(entry_id)
+        key = normalize(label or '')
+        if not key:
+            return
+        self.labels[entry_id] = (label, key)
+        position = self.key_position(key, entry_id)
+        self.keys.insert(position, key)
+        self.ids.insert(position, entry_id)
+        for offset, _ in word_starts(key):
+            position = self.suffix_position(key[offset:], entry_id)
+            self.suffix_ids.insert(position, entry_id)
+            self.suffix_offsets.insert(position, offset)
+
+    def remove(self, entry_id):
+        item = self.labels.get(entry_id)
+        if item is None:
+            return
+        key = item[1]
+        position = self.key_position(key, entry_id)
+        del self.keys[position]
+        del self.ids[position]
+        for offset, _ in word_starts(key):
+            position = self.suffix_position(key[offset:], entry_id)
+            del self.suffix_ids[position]
+            del self.suffix_offsets[position]
+        del self.labels[entry_id]
+
+    def matches(self, key, limit, hidden=()):
+        """Up to `limit` entries whose normalized text starts with `key`, and up to
+        `limit` others with a later word starting with it, not counting `hidden` ids.
+
+        Returns the two lists of (matched text, id), each in alphabetical order.
+        """
+        whole, later = [], []
+        position = bisect.bisect_left(self.keys, key)
+        while position < len(self.keys) and len(whole) < limit and self.keys[position].startswith(key):
+            if self.ids[position] not in hidden:
+                whole.append((self.keys[position], self.ids[position]))
+            position += 1
+        seen = {entry_id for _, entry_id in whole}
+        position = self.suffix_position(key)
+        while position < len(self.suffix_ids) and len(later) < limit:
+            suffix = self.suffix(position)
+            if not suffix.startswith(key):
+                break
+            entry_id = self.suffix_ids[position]
+            if entry_id not in seen and entry_id not in hidden:
+                seen.add(entry_id)
+                later.append((suffix, entry_id))
+            position += 1
+        return whole, later
+
+
+class LiveIndex:
+    """A PrefixIndex built in one go, plus the changes made to its entries since.
+
+    Inserting into the sorted lists of a large index moves most of them, so
+    changed entries go to a small second index instead and hide their old version
+    in the first. Both are searched and their matches merged; a rebuild folds the
+    changes back in.
+    """
+
+    def __init__(self, entries=()):
+        self.base = PrefixIndex(entries)
+        self.changed = PrefixIndex()
+        self.hidden = set()  # ids of base entries changed or removed since
+
+    def __contains__(self, entry_id):
+        return entry_id in self.changed.labels or (entry_id in self.base.labels and entry_id not in self.hidden)
+
+    def __len__(self):
+        return len(self.base) - len(self.hidden) + len(self.changed)
+
+    def add(self, entry_id, label):
+        """Index `label` under `entry_id`, replacing its previous label."""
+        if entry_id in self.base.labels:
+            self.hidden.add(entry_id)
+        self.changed.add(entry_id, label)
+
+    def remove(self, entry_id):
+        if entry_id in self.base.labels:
+            self.hidden.add(entry_id)
+        self.changed.remove(entry_id)
+
+    def search(self, query, limit):
+        """Up to `limit` (id, label) matches of `query`, best first.
+
+        Texts starting with the query come first, then texts with a later word
+        starting with it; each alphabetically from the matched word on, so an exact
+        match leads.
+        """
+        key = normalize(query)
+        if not key or limit < 1:
+            return []
+        base_whole, base_later = self.base.matches(key, limit, self.hidden)
+        changed_whole, changed_later = self.changed.matches(key, limit)
+        found = [entry_id for _, entry_id in heapq.merge(base_whole, changed_whole)][:limit]
+        found += [entry_id for _, entry_id in heapq.merge(base_later, changed_later)][:limit - len(found)]
+        labels = self.changed.labels
+        return [(entry_id, (labels.get(entry_id) or self.base.labels[entry_id])[0]) for entry_id in found]
+
+
+class Autocomplete:
+    """In-process typeahead over book titles, participant names and publishers.
+
+    The indexes are built from the database in a background thread when the app
+    starts (AUTOCOMPLETE_WARM) and kept current by `catalog_changed`, so lookups
+    never query the database. Writes made by other processes show up when the
+    indexes are rebuilt, AUTOCOMPLETE_TTL seconds after the last build. Publishers
+    are only added incrementally; one no book uses any more goes at the rebuild.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.indexes = None  # kind -> LiveIndex, None until the first build
+        self.built_at = 0.0
+        self._pending = None  # changes made while a build runs, replayed on its result
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AUTOCOMPLETE_TTL', 300)
+        app.extensions['autocomplete'] = self
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+        if app.config.get('AUTOCOMPLETE_WARM', True):
+            self.refresh(app)
+
+    def refresh(self, app):
+        """Rebuild the indexes from the database in a background thread."""
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+        threading.Thread(target=self._build, args=(app,), name='autocomplete-build', daemon=True).start()
+
+    def _build(self, app):
+        started = time.perf_counter()
+        indexes = None
+        try:
+            with app.app_context():
+                books = db.session.execute(select(Book.bookid, Book.title, Book.publisher)).all()
+                participants = db.session.execute(select(Participant.participantid, Participant.name)).all()
+            indexes = {
+                'title': LiveIndex((row.bookid, row.title) for row in books),
+                'participant': LiveIndex(participants),
+                'publisher': LiveIndex((publisher, publisher) for publisher in
+                                       {row.publisher for row in books if row.publisher}),
+            }
+            app.logger.info(f"Autocomplete index built with {len(books)} books and {len(participants)} "
+                            f"participants in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            # The database may not be ready yet; the next lookup tries again
+            app.logger.warning(f"Could not build autocomplete index: {e}")
+        finally:
+            with self._lock:
+                if indexes is not None:
+                    for changes in self._pending:
+                        self._apply(indexes, changes)
+                    self.indexes = indexes
+                    self.built_at = time.monotonic()
+                self._pending = None
+
+    def search(self, kind, query, limit):
+        """Up to `limit` (id, label) suggestions of `kind` for `query`, or None until
+        the indexes are built. Publishers have no id; theirs is the label."""
+        if self.indexes is None or time.monotonic() - self.built_at > self.ttl:
+            self.refresh(current_app._get_current_object())
+        with self._lock:
+            if self.indexes is None:
+                return None
+            return self.indexes[kind].search(query, limit)
+
+    @staticmethod
+    def _apply(indexes, changes):
+        """Apply (kind, id, label) changes to `indexes`; a None label removes the entry."""
+        for kind, entry_id, label in changes:
+            if label is None:
+                indexes[kind].remove(entry_id)
+            elif kind != 'publisher':
+                indexes[kind].add(entry_id, label)
+            elif entry_id not in indexes[kind]:
+                indexes[kind].add(entry_id, label)
+
+    def _on_catalog_changed(self, sender, entity, action, **ids):
+        if entity not in ('book', 'participant') or (self.indexes is None and self._pending is None):
+            return
+        if entity == 'book':
+            entity_ids = ids.get('bookids') or [ids.get('bookid')]
+            rows = [] if action == 'delete' else db.session.execute(
+                select(Book.bookid, Book.title, Book.publisher).where(Book.bookid.in_(entity_ids))).all()
+            changes = [('title', entity_id, None) for entity_id in entity_ids]
+            for row in rows:
+                changes.append(('title', row.bookid, row.title))
+                if row.publisher:
+                    changes.append(('publisher', row.publisher, row.publisher))
+        else:
+            entity_ids = ids.get('participantids') or [ids.get('participantid')]
+            rows = [] if action == 'delete' else db.session.execute(
+                select(Participant.participantid, Participant.name)
+                .where(Participant.participantid.in_(entity_ids))).all()
+            changes = [('participant', entity_id, None) for entity_id in entity_ids]
+            changes += [('participant', row.participantid, row.name) for row in rows]
+        with self._lock:
+            if self.indexes is not None:
+                self._apply(self.indexes, changes)
+            if self._pending is not None:
+                self._pending.append(changes)
+
+
+autocomplete = Autocomplete()
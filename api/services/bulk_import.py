@@ -0,0 +1,380 @@
+# services/bulk_import.py
+import csv
+import datetime
+import io
+import json
+import time
+
+from flask import current_app
+from sqlalchemy import func, insert, or_, select
+
+from models import db, Book, BookParticipant, Participant, Role
+from models.book import isbn_key, normalize_isbn
+from .facets import add_books, tracking, upserts
+from .signals import notify
+
+BOOK_COLUMNS = ('title', 'description', 'editionnumber', 'publisher', 'publicationplace',
+                'publicationdate', 'numberofpages', 'isbn')
+CSV_COLUMNS = BOOK_COLUMNS + ('participants',)
+# Columns an upsert overwrites; the stored ISBN keeps its formatting
+UPSERT_COLUMNS = tuple(column for column in BOOK_COLUMNS if column != 'isbn')
+
+
+class RowError(ValueError):
+    """A single input row that cannot be imported."""
+
+
+def parse_participants(value):
+    """Parse the CSV participants cell: `Name|Role` pairs separated by `;`."""
+    participants = []
+    for item in (value or '').split(';'):
+        if not item.strip():
+            continue
+        name, _, role = item.partition('|')
+        participants.append({'name': name.strip(), 'role': role.strip()})
+    return participants
+
+
+def format_participants(participants):
+    """Inverse of `parse_participants`, used by the CSV export."""
+    return ';'.join(f"{p['name']}|{p['role']}" for p in participants)
+
+
+def read_ndjson(stream):
+    """Yield `(line, record, error)` for each non-blank line of an NDJSON byte stream."""
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, record, None
+
+
+def read_csv(stream):
+    """Yield `(line, record, error)` for each data row of a CSV byte stream with a header row."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    for record in reader:
+        record = {key: value for key, value in record.items() if key is not None}
+        record['participants'] = parse_participants(record.get('participants'))
+        yield reader.line_num, record, None
+
+
+readers = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def _optional_int(record, key):
+    value = record.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{key} must be an integer')
+
+
+def _optional_date(record, key):
+    value = record.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(f'{key} must be a YYYY-MM-DD date')
+
+
+def _optional_str(record, key):
+    value = record.get(key)
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def validate(record):
+    """Normalize an input record into `(book values, [(participant name, role)])`."""
+    book = {
+        'title': _optional_str(record, 'title'),
+        'description': _optional_str(record, 'description'),
+        'editionnumber': _optional_int(record, 'editionnumber'),
+        'publisher': _optional_str(record, 'publisher'),
+        'publicationplace': _optional_str(record, 'publicationplace'),
+        'publicationdate': _optional_date(record, 'publicationdate'),
+        'numberofpages': _optional_int(record, 'numberofpages'),
+        'isbn': _optional_str(record, 'isbn'),
+    }
+    if not book['title']:
+        raise RowError('title is required')
+    if not book['isbn']:
+        raise RowError('isbn is required')
+
+    participants = record.get('participants') or []
+    if not isinstance(participants, list):
+        raise RowError('participants must be a list')
+    credits = []
+    for participant in participants:
+        if not isinstance(participant, dict) or not participant.get('name') or not participant.get('role'):
+            raise RowError('each participant needs a name and a role')
+        credits.append((str(participant['name']).strip(), str(participant['role']).strip()))
+    return book, credits
+
+
+class BookImporter:
+    """Imports a stream of book records in chunked transactions.
+
+    Only one chunk of rows is held in memory at a time; participants and roles are
+    resolved by name with one query per chunk and created when missing. Error
+    reporting is capped at `max_errors` entries so it stays bounded too.
+    """
+
+    def __init__(self, chunk_size=1000, max_errors=100):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.roles = {}  # role description -> roleid, small enough to keep for the whole run
+        self.stats = {
+            'rows': 0,
+            'inserted': 0,
+            'failed': 0,
+            'participants_created': 0,
+            'roles_created': 0,
+            'errors': [],
+            'errors_truncated': False,
+        }
+
+    def run(self, rows):
+        started = time.perf_counter()
+        chunk = []
+        for line, record, error in rows:
+            self.stats['rows'] += 1
+            if error is not None:
+                self.fail(line, record, error)
+                continue
+            chunk.append((line, record))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+
+        elapsed = time.perf_counter() - started
+        self.stats['elapsed_seconds'] = round(elapsed, 3)
+        self.stats['rows_per_second'] = round(self.stats['rows'] / elapsed, 1) if elapsed else None
+        return self.stats
+
+    def fail(self, line, record, message):
+        self.stats['failed'] += 1
+        if len(self.stats['errors']) < self.max_errors:
+            isbn = record.get('isbn') if isinstance(record, dict) else None
+            self.stats['errors'].append({'line': line, 'isbn': isbn, 'message': message})
+        else:
+            self.stats['errors_truncated'] = True
+
+    def import_chunk(self, chunk):
+        valid = []
+        seen_isbns = set()
+        for line, record in chunk:
+            try:
+                book, credits = validate(record)
+            except RowError as e:
+                self.fail(line, record, str(e))
+                continue
+            key = normalize_isbn(book['isbn'])
+            if key in seen_isbns:
+                self.fail(line, record, 'Duplicate ISBN within the import')
+                continue
+            seen_isbns.add(key)
+            valid.append((line, record, book, credits))
+        if not valid:
+            return
+
+        # ISBNs are unique once normalized, so '978-0-13-110362-7' exists as '9780131103627'
+        existing = set(db.session.scalars(select(isbn_key(Book.isbn)).where(isbn_key(Book.isbn).in_(seen_isbns))))
+        rows = []
+        for line, record, book, credits in valid:
+            if normalize_isbn(book['isbn']) in existing:
+                self.fail(line, record, 'A book with this ISBN already exists.')
+            else:
+                rows.append((line, record, book, credits))
+        if not rows:
+            return
+
+        try:
+            participant_ids, created_participants = self.resolve_participants(
+                {name for _, _, _, credits in rows for name, _ in credits})
+            role_ids, created_roles = self.resolve_roles(
+                {role for _, _, _, credits in rows for _, role in credits})
+
+            inserted = db.session.execute(
+                insert(Book).returning(Book.bookid, Book.isbn, sort_by_parameter_order=True),
+                [book for _, _, book, _ in rows]
+            ).all()
+            book_ids = {isbn: bookid for bookid, isbn in inserted}
+
+            # A credit listed twice would break the unique (book, participant, role) index
+            assignments = list(dict.fromkeys(
+                (book_ids[book['isbn']], participant_ids[name], role_ids[role])
+                for _, _, book, credits in rows
+                for name, role in credits
+            ))
+            self.insert_assignments(assignments)
+            add_books(list(book_ids.values()))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to import chunk of {len(rows)} books: {e}")
+            # Forget roles created in the rolled back transaction
+            self.roles = {}
+            for line, record, _, _ in rows:
+                self.fail(line, record, f'Chunk failed: {e.__class__.__name__}')
+            return
+
+        self.stats['inserted'] += len(rows)
+        self.stats['participants_created'] += len(created_participants)
+        self.stats['roles_created'] += len(created_roles)
+        if created_roles:
+            notify('role', 'create', roleids=created_roles)
+        if created_participants:
+            notify('participant', 'create', participantids=created_participants)
+        notify('book', 'create', bookids=list(book_ids.values()))
+
+    def resolve_participants(self, names):
+        """Map participant names to ids, creating the missing ones. Duplicated names
+        resolve to the oldest participant."""
+        ids = {}
+        if names:
+            for participantid, name in db.session.execute(
+                    select(Participant.participantid, Participant.name)
+                    .where(Participant.name.in_(names))
+                    .order_by(Participant.participantid.desc())):
+                ids[name] = participantid
+        missing = sorted(names - ids.keys())
+        created = []
+        if missing:
+            for participantid, name in db.session.execute(
+                    insert(Participant).returning(Participant.participantid, Participant.name,
+                                                  sort_by_parameter_order=True),
+                    [{'name': name} for name in missing]):
+                ids[name] = participantid
+                created.append(participantid)
+        return ids, created
+
+    def resolve_roles(self, descriptions):
+        """Map role descriptions to ids, creating the missing ones."""
+        unknown = descriptions - self.roles.keys()
+        if unknown:
+            for roleid, description in db.session.execute(
+                    select(Role.roleid, Role.description).where(Role.description.in_(unknown))):
+                self.roles[description] = roleid
+        missing = sorted(descriptions - self.roles.keys())
+        created = []
+        if missing:
+            for roleid, description in db.session.execute(
+                    insert(Role).returning(Role.roleid, Role.description, sort_by_parameter_order=True),
+                    [{'description': description} for description in missing]):
+                self.roles[description] = roleid
+                created.append(roleid)
+        return self.roles, created
+
+    def insert_assignments(self, assignments):
+        if not assignments:
+            return
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # COPY streams the rows in a single round trip within the chunk's transaction
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(assignments)
+            buffer.seek(0)
+            cursor = db.session.connection().connection.cursor()
+            try:
+                cursor.copy_expert(
+                    'COPY bookparticipants (bookid, participantid, roleid) FROM STDIN WITH (FORMAT csv)',
+                    buffer)
+            finally:
+                cursor.close()
+        else:
+            db.session.execute(insert(BookParticipant), [
+                {'bookid': bookid, 'participantid': participantid, 'roleid': roleid}
+                for bookid, participantid, roleid in assignments
+            ])
+
+
+def upsert_books(records, max_errors=100):
+    """Insert or update a batch of book records by normalized ISBN, in one transaction.
+
+    A record replaces the columns of the book with its ISBN, in any formatting,
+    or creates it. One INSERT ... ON CONFLICT DO UPDATE writes the batch and skips
+    the books it would not change, so resending a record costs no write. Returns
+    the counts per outcome and the first `max_errors` rejected records.
+    """
+    started = time.perf_counter()
+    stats = {'records': len(records), 'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0,
+             'errors': [], 'errors_truncated': False}
+
+    def fail(index, record, message):
+        stats['failed'] += 1
+        if len(stats['errors']) < max_errors:
+            isbn = record.get('isbn') if isinstance(record, dict) else None
+            stats['errors'].append({'index': index, 'isbn': isbn, 'message': message})
+        else:
+            stats['errors_truncated'] = True
+
+    books = {}
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise RowError('Expected a JSON object')
+            book, credits = validate(record)
+            if credits:
+                raise RowError('participants are not upserted; assign them through /books/{bookid}/participants')
+            key = normalize_isbn(book['isbn'])
+            if not key:
+                raise RowError('isbn is required')
+        except RowError as e:
+            fail(index, record, str(e))
+            continue
+        if key in books:
+            fail(index, record, 'Duplicate ISBN within the batch')
+            continue
+        books[key] = (index, record, book)
+
+    if books:
+        upsert = upserts[db.session.get_bind().dialect.name](Book)
+        excluded = upsert.excluded
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[isbn_key(Book.isbn)],
+            set_={**{column: excluded[column] for column in UPSERT_COLUMNS},
+                  'version': Book.version + 1, 'updated_at': func.current_timestamp()},
+            where=or_(*(getattr(Book, column).is_distinct_from(excluded[column]) for column in UPSERT_COLUMNS)),
+        ).returning(Book.bookid, Book.version)
+        try:
+            existing = db.session.scalars(select(Book.bookid).where(isbn_key(Book.isbn).in_(books))).all()
+            with tracking(existing):
+                written = db.session.execute(upsert, [book for _, _, book in books.values()]).all()
+            # New rows start at version 1; updated ones were bumped past it
+            inserted = [bookid for bookid, version in written if version == 1]
+            updated = [bookid for bookid, version in written if version != 1]
+            add_books(inserted)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to upsert batch of {len(books)} books: {e}")
+            for index, record, _ in books.values():
+                fail(index, record, f'Batch failed: {e.__class__.__name__}')
+        else:
+            stats['inserted'], stats['updated'] = len(inserted), len(updated)
+            stats['unchanged'] = len(books) - len(written)
+            if inserted:
+                notify('book', 'create', bookids=inserted)
+            if updated:
+                notify('book', 'update', bookids=updated)
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['records_per_second'] = round(len(records) / elapsed, 1) if elapsed else None
+    return stats
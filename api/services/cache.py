@@ -0,0 +1,357 @@
+# services/cache.py
+import fnmatch
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from flask_restx.utils import unpack
+from werkzeug.http import unquote_etag
+
+from .signals import catalog_changed
+
+# Headers set by handlers that belong to the cached representation
+CACHED_HEADERS = ('Link', 'X-Next-Cursor', 'X-Missing-Ids')
+
+
+class LRUBackend:
+    """In-process LRU cache with a per-entry TTL and a tag index for invalidation."""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, entry, tags)
+        self._tags = {}  # tag -> set of keys
+        self._invalidated_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, tags):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, entry, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._discard(key)
+            self._invalidated_at = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._invalidated_at = time.time()
+
+    def invalidated_at(self):
+        """Wall-clock time of the last invalidation or clear (0 if none)."""
+        return self._invalidated_at
+
+    def _discard(self, key):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SharedBackend:
+    """Cache stored in a Redis-compatible server, shared by every worker process.
+
+    `client` only needs the get/set/delete/sadd/smembers/expire/scan_iter subset of
+    the redis-py API, so tests can pass an `InMemoryClient` instead of a real server.
+    """
+
+    def __init__(self, client, ttl=60, prefix='catalog-cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, entry, tags):
+        self.client.set(self.prefix + key, json.dumps(entry), ex=self.ttl)
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            self.client.sadd(tag_key, key)
+            self.client.expire(tag_key, self.ttl)
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = [self.prefix + (k.decode() if isinstance(k, bytes) else k)
+                    for k in self.client.smembers(tag_key)]
+            self.client.delete(tag_key, *keys)
+        self.client.set(self.prefix + 'invalidated-at', time.time())
+
+    def clear(self):
+        # SCAN in batches rather than KEYS, which would block the server on a large cache
+        batch = []
+        for name in self.client.scan_iter(match=f'{self.prefix}*', count=500):
+            batch.append(name)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+        self.client.set(self.prefix + 'invalidated-at', time.time())
+
+    def invalidated_at(self):
+        """Wall-clock time of the last invalidation or clear by any worker (0 if none)."""
+        return float(self.client.get(self.prefix + 'invalidated-at') or 0)
+
+
+class InMemoryClient:
+    """Local stand-in for a Redis client, implementing what SharedBackend uses."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, name):
+        item = self._values.get(name)
+        if item is not None and item[0] is not None and item[0] < time.monotonic():
+            del self._values[name]
+            return None
+        return item
+
+    def get(self, name):
+        with self._lock:
+            item = self._live(name)
+            return item[1] if item else None
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._values[name] = (time.monotonic() + ex if ex else None, value)
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._values.pop(name, None) is not None for name in names)
+
+    def sadd(self, name, *members):
+        with self._lock:
+            item = self._live(name)
+            if item is None:
+                item = self._values[name] = (None, set())
+            item[1].update(members)
+
+    def smembers(self, name):
+        with self._lock:
+            item = self._live(name)
+            return set(item[1]) if item else set()
+
+    def scan_iter(self, match='*', count=None):
+        with self._lock:
+            names = [name for name in list(self._values) if self._live(name) and fnmatch.fnmatchcase(name, match)]
+        return iter(names)
+
+    def expire(self, name, seconds):
+        with self._lock:
+            item = self._live(name)
+            if item:
+                self._values[name] = (time.monotonic() + seconds, item[1])
+
+
+def id_tags(entity, ids):
+    """`<entity>:<id>` tags (entity 'book', 'participant' or 'role') for `ids`."""
+    return {f'{entity}:{entity_id}' for entity_id in ids if entity_id is not None}
+
+
+def tags_for_change(entity, action, **ids):
+    """Map a catalog change to the cache tags it makes stale.
+
+    Listings are tagged with their namespace ('books', 'participants', 'roles'),
+    and every view with the entities it embeds, as declared by its `cache.cached`;
+    listings filtered on participant names also with 'books:by-participant', book
+    facet counts with 'facets', as assignments change their role counts. Anything that can change which rows match a listing evicts
+    the whole namespace; anything that only changes embedded values evicts the
+    entries embedding that entity.
+    """
+    if entity == 'book':
+        tags = {'books'}
+        if action != 'create':
+            tags.update(f"book:{bookid}" for bookid in ids.get('bookids') or [ids['bookid']])
+        return tags
+    if entity == 'assignment':
+        return {f"book:{ids['bookid']}", 'books:by-participant', 'facets'}
+    if entity == 'participant':
+        tags = {'participants'}
+        if action != 'create':
+            tags.add(f"participant:{ids['participantid']}")
+        if action == 'update':
+            tags.add('books:by-participant')
+        return tags
+    if entity == 'role':
+        tags = {'roles'}
+        if action != 'create':
+            tags.add(f"role:{ids['roleid']}")
+        return tags
+    return set()
+
+
+class ResponseCache:
+    """Caches rendered GET responses keyed by path and normalized query arguments.
+
+    Responses carry a strong ETag so clients can revalidate with If-None-Match, and
+    entries are evicted by tag whenever `services.signals.catalog_changed` fires.
+    """
+
+    def __init__(self, app=None, api=None):
+        self.backend = None
+        self.api = None
+        if app is not None:
+            self.init_app(app, api)
+
+    def init_app(self, app, api):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        ttl = app.config.get('CACHE_TTL', 60)
+        if cache_type == 'lru':
+            self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 1024), ttl)
+        elif cache_type == 'shared':
+            client = app.config.get('CACHE_CLIENT')
+            if client is None:
+                import redis  # optional dependency, only needed for the shared backend
+                client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+            self.backend = SharedBackend(client, ttl)
+        elif cache_type == 'null':
+            self.backend = None
+        else:
+            raise ValueError(f'Unknown CACHE_TYPE {cache_type!r}')
+        self.api = api
+        app.extensions['response_cache'] = self
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+    def _on_catalog_changed(self, sender, entity, action, **ids):
+        self.invalidate(*tags_for_change(entity, action, **ids))
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.invalidate(tags)
+
+    @staticmethod
+    def make_key():
+        args = sorted((key, sorted(values)) for key, values in request.args.lists()
+                      if any(values))
+        return f'{request.path}?{json.dumps(args, separators=(",", ":"))}'
+
+    def lookup(self):
+        """Return the cache key of the current request and its entry (None on a miss)."""
+        key = self.make_key()
+        return key, self.backend.get(key)
+
+    def store(self, key, data, code, headers, entry_tags):
+        """Render marshalled `data`, store it under `key` with `entry_tags` and return the entry.
+
+        Data read from a replica that may predate the last invalidation is rendered
+        but not stored (see `replica_may_be_stale`).
+        """
+        rendered = self.api.make_response(data, code, headers)
+        body = rendered.get_data(as_text=True)
+        etag = hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest()
+        if 'ETag' in rendered.headers:
+            # Views of versioned rows send the row version as their ETag; it leads the
+            # digest so PATCH can check If-Match without reading the row
+            etag = f"{unquote_etag(rendered.headers['ETag'])[0]}-{etag}"
+        entry = {
+            'body': body,
+            'etag': etag,
+            'headers': {name: rendered.headers[name] for name in CACHED_HEADERS
+                        if name in rendered.headers},
+        }
+        if not self.replica_may_be_stale():
+            self.backend.set(key, entry, entry_tags)
+        return entry
+
+    def replica_may_be_stale(self):
+        """Whether the current request read a replica (services.replicas) within
+        REPLICA_MAX_LAG seconds of the last invalidation.
+
+        The replica may not have the write behind that invalidation yet, and storing
+        what it returned would cache the old data again, after its tags were evicted.
+        """
+        if g.get('db_replica') is None:
+            return False
+        max_lag = current_app.extensions['replicas'].max_lag
+        return time.time() - self.backend.invalidated_at() < max_lag
+
+    @staticmethod
+    def entry_tags(namespace_tags, tags, view_args, rows, kwargs):
+        """Tags of an entry: `namespace_tags`, an `<entity>:<value>` tag for each view
+        argument named in `view_args` and `tags(rows)`, from the rows the view
+        returned before marshalling (whatever fields the response leaves out)."""
+        entry_tags = set(namespace_tags)
+        for name, entity in (view_args or {}).items():
+            entry_tags.update(id_tags(entity, [kwargs.get(name)]))
+        if tags is not None:
+            entry_tags.update(tags(rows))
+        return entry_tags
+
+    @staticmethod
+    def respond(entry, status):
+        """Build the (possibly 304) response for a cache entry."""
+        response = Response(entry['body'], 200, entry['headers'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = status
+        return response.make_conditional(request)
+
+    def cached(self, *namespace_tags, tags=None, view_args=None):
+        """Cache the decorated GET handler, marshalled with `serializer.marshal_with`.
+
+        Each view declares what its entries depend on: `namespace_tags` are attached
+        to every entry, `view_args` maps view arguments to the entity they name
+        (e.g. `{'bookid': 'book'}` tags `book:<bookid>`) and `tags(rows)` returns
+        the tags of the rows the handler returned, before marshalling, typically
+        the entities they embed (see `tags_for_change`).
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                # Masked responses (X-Fields) are partial: keep them out of the shared entries
+                if self.backend is None or request.headers.get(current_app.config['RESTX_MASK_HEADER']):
+                    return f(*args, **kwargs)
+
+                # A client reading its own writes (services.replicas) skips what others cached
+                key, entry = (self.make_key(), None) if g.get('fresh_read') else self.lookup()
+                status = 'HIT'
+                if entry is None:
+                    status = 'MISS'
+                    data, code, headers = unpack(f(*args, **kwargs))
+                    if code != 200:
+                        return data, code, headers
+                    # marshal_with keeps the rows it marshalled, with every field
+                    rows = g.pop('view_rows', data)
+                    entry = self.store(key, data, code, headers,
+                                       self.entry_tags(namespace_tags, tags, view_args, rows, kwargs))
+                return self.respond(entry, status)
+            return wrapper
+        return decorator
+
+
+cache = ResponseCache()
@@ -0,0 +1,162 @@
+# services/changes.py
+from sqlalchemy import DDL, event, false, func, insert, literal, select, union_all
+
+from models import db, Book, BookParticipant, Change, Participant, Role
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Entities whose rows GET /api/changes reports, by the name their log entries carry.
+# Clients apply changed rows in this order and deleted ones in reverse, so
+# references always point at rows they have.
+ENTITIES = {
+    'role': Role,
+    'participant': Participant,
+    'book': Book,
+    'bookparticipant': BookParticipant,
+}
+
+# Log position before every entry: the migration logs existing rows with txid 0
+START = (-1, 0)
+
+
+def tracked_columns(model):
+    """Columns whose update logs a change: those of the model, which leaves out the
+    search vector that triggers maintain on PostgreSQL."""
+    return ', '.join(column.name for column in model.__table__.columns
+                     if not column.primary_key)
+
+
+def key_column(model):
+    return model.__mapper__.primary_key[0].name
+
+
+# One trigger function for all tables, told the entity and key column by the trigger.
+# An upsert moves the entry to the end of the log; txid orders it by transaction.
+POSTGRES_DDL = [
+    """
+    create or replace function catalog_changes_record() returns trigger as $$
+    declare
+        row_key integer;
+    begin
+        if tg_op = 'DELETE' then
+            row_key := (to_jsonb(old) ->> tg_argv[1])::integer;
+        else
+            row_key := (to_jsonb(new) ->> tg_argv[1])::integer;
+        end if;
+        insert into catalog_changes (entity, entityid, deleted, txid)
+        values (tg_argv[0], row_key, tg_op = 'DELETE', txid_current())
+        on conflict (entity, entityid) do update
+            set seq = excluded.seq, deleted = excluded.deleted, txid = excluded.txid, changed_at = now();
+        return null;
+    end
+    $$ language plpgsql
+    """,
+]
+for entity, model in ENTITIES.items():
+    table = model.__tablename__
+    POSTGRES_DDL += [
+        f"drop trigger if exists {table}_changes on {table}",
+        f"""
+        create trigger {table}_changes after insert or delete or update of {tracked_columns(model)} on {table}
+            for each row execute function catalog_changes_record('{entity}', '{key_column(model)}')
+        """,
+    ]
+
+# SQLite replaces the entry with a new autoincrement seq; writes are serialized, so
+# seq order is commit order and txid stays 0
+SQLITE_DDL = []
+for entity, model in ENTITIES.items():
+    table, key = model.__tablename__, key_column(model)
+    for event_name, row, deleted in (('insert', 'new', 0), (f'update of {tracked_columns(model)}', 'new', 0),
+                                     ('delete', 'old', 1)):
+        SQLITE_DDL.append(f"""
+        create trigger if not exists {table}_changes_{event_name.split()[0]} after {event_name} on {table} begin
+            delete from catalog_changes where entity = '{entity}' and entityid = {row}.{key};
+            insert into catalog_changes (entity, entityid, deleted) values ('{entity}', {row}.{key}, {deleted});
+        end
+        """)
+
+DDL_BY_DIALECT = {
+    'postgresql': POSTGRES_DDL,
+    'sqlite': SQLITE_DDL,
+}
+
+# bookparticipants is created last by create_all, like the search triggers
+for dialect, statements in DDL_BY_DIALECT.items():
+    for statement in statements:
+        event.listen(BookParticipant.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+
+def install(connection):
+    """Create the change triggers, for databases whose tables predate them."""
+    for statement in DDL_BY_DIALECT.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+
+def backfill(connection):
+    """Log every row that has no entry yet, so a sync from the start gets the whole catalog."""
+    for entity, model in ENTITIES.items():
+        key = model.__mapper__.primary_key[0]
+        logged = select(Change.entityid).where(Change.entity == entity)
+        connection.execute(insert(Change).from_select(
+            ['entity', 'entityid', 'deleted'],
+            select(literal(entity), key, false()).where(key.not_in(logged)).order_by(key)))
+
+
+def encode_token(position):
+    return encode_cursor('changes', position)
+
+
+def decode_token(token):
+    """Log position of a token from `read_changes`; InvalidCursor when malformed."""
+    if token is None:
+        return START
+    position = decode_cursor(token, 'changes')
+    if len(position) != 2 or not all(isinstance(part, int) for part in position):
+        raise InvalidCursor('Malformed token')
+    return tuple(position)
+
+
+def read_changes(position, limit):
+    """Up to `limit` log entries after `position`, in log order, plus whether more follow.
+
+    On PostgreSQL, entries of transactions not older than the oldest one still
+    running are left for a later read: those may be followed by commits with a
+    smaller seq, which a token past them would skip.
+    """
+    txid, seq = position
+    columns = (Change.txid, Change.seq, Change.entity, Change.entityid, Change.deleted)
+    # Two index ranges rather than one (txid, seq) > position: SQLite bounds a row
+    # value comparison by its first column only, so it would walk all of txid
+    same_transaction = select(*columns).where(Change.txid == txid, Change.seq > seq)
+    later_transactions = select(*columns).where(Change.txid > txid)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        finished = Change.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())
+        same_transaction = same_transaction.where(finished)
+        later_transactions = later_transactions.where(finished)
+    entries = union_all(
+        *(select(part.order_by(Change.txid, Change.seq).limit(limit + 1).subquery())
+          for part in (same_transaction, later_transactions))).subquery()
+    rows = db.session.execute(select(entries).order_by(entries.c.txid, entries.c.seq).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+
+def changed_rows(entries):
+    """The current rows of the changed entries and the ids of the deleted ones, per table.
+
+    A row deleted since its entry was read is left out; its tombstone follows
+    in a later page.
+    """
+    changed = {model.__tablename__: [] for model in ENTITIES.values()}
+    deleted = {model.__tablename__: [] for model in ENTITIES.values()}
+    ids = {}
+    for entry in entries:
+        if entry.deleted:
+            deleted[ENTITIES[entry.entity].__tablename__].append(entry.entityid)
+        else:
+            ids.setdefault(entry.entity, []).append(entry.entityid)
+    for entity, entity_ids in ids.items():
+        model = ENTITIES[entity]
+        key = model.__mapper__.primary_key[0]
+        changed[model.__tablename__] = db.session.execute(
+            select(*model.__table__.columns).where(key.in_(entity_ids)).order_by(key)).all()
+    return changed, deleted
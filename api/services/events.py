@@ -0,0 +1,286 @@
+# services/events.py
+import asyncio
+import collections
+import itertools
+import json
+import os
+import queue
+import re
+import select
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from models import db
+from .signals import catalog_changed
+
+# Event types, named after the entities of `catalog_changed`; `reset` is always sent
+TOPICS = ('book', 'participant', 'role', 'assignment')
+RESET = 'reset'
+
+# Ids per event, which keeps a NOTIFY payload well under PostgreSQL's 8000 bytes
+MAX_IDS = 500
+
+# Milliseconds EventSource clients wait before reconnecting
+RETRY_MS = 3000
+
+Event = collections.namedtuple('Event', 'id topic data')
+
+
+def book_ids(event):
+    """The books an event is about, from its `bookid` or `bookids`."""
+    if 'bookid' in event.data:
+        return {event.data['bookid']}
+    return set(event.data.get('bookids') or ())
+
+
+def matches(event, topics=None, bookids=None):
+    """Whether a stream filtered to `topics` and `bookids` (None for any) gets `event`."""
+    if event.topic == RESET:
+        return True
+    if topics is not None and event.topic not in topics:
+        return False
+    return bookids is None or not book_ids(event).isdisjoint(bookids)
+
+
+def message(event):
+    """`event` in the text/event-stream format."""
+    return f'id: {event.id}\nevent: {event.topic}\ndata: {json.dumps(event.data, separators=(",", ":"))}\n\n'
+
+
+KEEPALIVE = ': keepalive\n\n'
+
+
+class EventBroker:
+    """Fans the catalog changes announced by `catalog_changed` out to event streams.
+
+    Every process keeps the last EVENTS_HISTORY events, so a client reconnecting
+    with Last-Event-ID gets what it missed; when that event is no longer known
+    it gets a `reset` event and should resync through GET /api/changes. On
+    PostgreSQL (EVENTS_BACKEND) changes are published with NOTIFY and each process
+    delivers what it receives on EVENTS_CHANNEL, so all of them see every write
+    in commit order. Otherwise events stay in the process that made the change.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.distributed = False
+        self.channel = 'catalog_events'
+        self.history = collections.deque(maxlen=1000)
+        self.queue_size = 1000
+        self.heartbeat = 15
+        self.max_streams = 4
+        self.streams = 0  # open streams served from a thread
+        self.subscribers = set()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._closed = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        backend = app.config.get('EVENTS_BACKEND', 'auto')
+        if backend == 'auto':
+            backend = 'postgres' if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'postgresql' \
+                else 'local'
+        self.distributed = backend == 'postgres'
+        self.channel = app.config.get('EVENTS_CHANNEL', 'catalog_events')
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', self.channel):
+            raise ValueError(f'EVENTS_CHANNEL must be a lowercase identifier, not {self.channel!r}')
+        self.history = collections.deque(maxlen=app.config.get('EVENTS_HISTORY', 1000))
+        self.queue_size = app.config.get('EVENTS_QUEUE_SIZE', 1000)
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT', 15)
+        self.max_streams = app.config.get('EVENTS_MAX_STREAMS', 4)
+        app.extensions['events'] = self
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+    def new_event(self, topic, data):
+        # Unique across processes, so a client can resume on another worker
+        return Event(f'{time.time_ns():x}-{os.getpid():x}-{next(self._ids):x}', topic, data)
+
+    def _on_catalog_changed(self, sender, entity, action, **ids):
+        batches = []
+        for name, value in ids.items():
+            if isinstance(value, (list, tuple)):
+                batches += [{name: list(value[start:start + MAX_IDS])} for start in range(0, len(value), MAX_IDS)]
+        single = {name: value for name, value in ids.items() if not isinstance(value, (list, tuple))}
+        events = [self.new_event(entity, {'entity': entity, 'action': action, **single, **batch})
+                  for batch in batches or [{}]]
+        if not self.distributed:
+            for event in events:
+                self.publish(event)
+            return
+        try:
+            with db.engine.connect() as connection:
+                for event in events:
+                    connection.execute(text('select pg_notify(:channel, :payload)'), {
+                        'channel': self.channel, 'payload': json.dumps(event._asdict(), separators=(',', ':'))})
+                connection.commit()
+        except Exception as e:
+            # The write is committed; streams miss the event but GET /api/changes has it
+            sender.logger.warning(f'Could not publish {entity} {action} event: {e}')
+
+    def publish(self, event):
+        """Deliver `event` to this process's streams and remember it for resuming ones."""
+        with self._lock:
+            self.history.append(event)
+            for deliver in list(self.subscribers):
+                deliver(event)
+
+    def subscribe(self, deliver, last_event_id=None):
+        """Call `deliver(event)` with every event published from now on; it must not block.
+
+        Returns the events after `last_event_id` to send first, or None when they
+        are no longer known.
+        """
+        with self._lock:
+            if self.distributed:
+                self._start_listener()
+            missed = []
+            if last_event_id is not None:
+                ids = [event.id for event in self.history]
+                missed = list(self.history)[ids.index(last_event_id) + 1:] if last_event_id in ids else None
+            self.subscribers.add(deliver)
+        return missed
+
+    def unsubscribe(self, deliver):
+        with self._lock:
+            self.subscribers.discard(deliver)
+
+    def reset(self):
+        """A reset event carrying the id of the newest known event, so a client
+        resyncing from here resumes after it."""
+        return Event(self.history[-1].id if self.history else '', RESET, {})
+
+    def opening(self, missed, topics, bookids):
+        """The messages starting a stream: the reconnection delay, then the missed
+        events or a reset."""
+        messages = [f'retry: {RETRY_MS}\n\n']
+        if missed is None:
+            messages.append(message(self.reset()))
+        else:
+            messages += [message(event) for event in missed if matches(event, topics, bookids)]
+        return messages
+
+    def stream(self, topics=None, bookids=None, last_event_id=None):
+        """Yield a client's events as text/event-stream messages, from a thread.
+
+        A comment is sent every EVENTS_HEARTBEAT seconds without events, which
+        keeps proxies from closing the connection and detects clients that left.
+        A stream more than EVENTS_QUEUE_SIZE events behind ends with a reset.
+        """
+        events, lagging = queue.Queue(self.queue_size), threading.Event()
+
+        def deliver(event):
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                lagging.set()
+                self.subscribers.discard(deliver)  # publish holds the lock
+
+        missed = self.subscribe(deliver, last_event_id)
+        with self._lock:
+            self.streams += 1
+        try:
+            yield from self.opening(missed, topics, bookids)
+            while True:
+                try:
+                    event = events.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    event = None
+                if lagging.is_set():
+                    yield message(self.reset())
+                    return
+                if event is None:
+                    yield KEEPALIVE
+                elif matches(event, topics, bookids):
+                    yield message(event)
+        finally:
+            self.unsubscribe(deliver)
+            with self._lock:
+                self.streams -= 1
+
+    async def async_stream(self, topics=None, bookids=None, last_event_id=None):
+        """`stream` for an event loop: the same messages, without holding a thread."""
+        loop = asyncio.get_running_loop()
+        events, lagging = asyncio.Queue(self.queue_size), asyncio.Event()
+
+        def put(event):
+            try:
+                events.put_nowait(event)
+            except asyncio.QueueFull:
+                lagging.set()
+                self.unsubscribe(deliver)
+
+        def deliver(event):
+            try:
+                loop.call_soon_threadsafe(put, event)
+            except RuntimeError:
+                self.subscribers.discard(deliver)  # the loop is closed
+
+        missed = self.subscribe(deliver, last_event_id)
+        try:
+            for opening in self.opening(missed, topics, bookids):
+                yield opening
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    event = None
+                if lagging.is_set():
+                    yield message(self.reset())
+                    return
+                if event is None:
+                    yield KEEPALIVE
+                elif matches(event, topics, bookids):
+                    yield message(event)
+        finally:
+            self.unsubscribe(deliver)
+
+    def _start_listener(self):
+        # Listening starts with the first stream, so processes without any hold no connection
+        if self._listener is None or not self._listener.is_alive():
+            self._closed.clear()
+            self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        app, delay, listened = self.app, 1, False
+        while not self._closed.is_set():
+            connection = None
+            try:
+                with app.app_context():
+                    connection = db.engine.raw_connection()
+                connection.detach()  # held for good, outside the pool
+                dbapi = connection.driver_connection
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f'LISTEN {self.channel}')
+                if listened:
+                    # Events published while reconnecting are lost; streams resync
+                    self.publish(self.new_event(RESET, {}))
+                listened, delay = True, 1
+                while not self._closed.is_set():
+                    if select.select([dbapi], [], [], self.heartbeat) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        notification = dbapi.notifies.pop(0)
+                        self.publish(Event(**json.loads(notification.payload)))
+            except Exception as e:
+                app.logger.warning(f'Event listener on {self.channel} failed, reconnecting in {delay}s: {e}')
+                self._closed.wait(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def close(self):
+        """Stop listening for events of other processes."""
+        self._closed.set()
+
+
+events = EventBroker()
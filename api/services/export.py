@@ -0,0 +1,102 @@
+# services/export.py
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from models import db, Book, BookParticipant
+from .bulk_import import CSV_COLUMNS, format_participants
+
+# Bytes buffered before a chunk is handed to the WSGI server
+FLUSH_SIZE = 64 * 1024
+
+
+def iter_books(batch_size):
+    """Yield every book ordered by bookid as a plain dict, `batch_size` rows at a time.
+
+    yield_per streams rows through a server-side cursor where the driver supports it,
+    and selectinload fetches the participants of each batch with one extra query, so
+    only one batch of ORM objects is alive at any time.
+    """
+    stmt = select(Book).options(
+        db.selectinload(Book.participants).joinedload(BookParticipant.participant),
+        db.selectinload(Book.participants).joinedload(BookParticipant.role)
+    ).order_by(Book.bookid).execution_options(yield_per=batch_size)
+
+    for partition in db.session.execute(stmt).scalars().partitions():
+        for book in partition:
+            yield {
+                'bookid': book.bookid,
+                'title': book.title,
+                'description': book.description,
+                'editionnumber': book.editionnumber,
+                'publisher': book.publisher,
+                'publicationplace': book.publicationplace,
+                'publicationdate': book.publicationdate.isoformat() if book.publicationdate else None,
+                'numberofpages': book.numberofpages,
+                'isbn': book.isbn,
+                'participants': [{
+                    'participantid': bp.participant.participantid,
+                    'name': bp.participant.name,
+                    'roleid': bp.role.roleid,
+                    'role': bp.role.description
+                } for bp in book.participants if bp.participant and bp.role]
+            }
+
+
+def ndjson_lines(books):
+    for book in books:
+        yield json.dumps(book, ensure_ascii=False) + '\n'
+
+
+def csv_lines(books):
+    """CSV in the layout accepted by POST /api/books/import, plus the bookid."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('bookid',) + CSV_COLUMNS)
+    for book in books:
+        writer.writerow([book['bookid']] + [
+            format_participants(book['participants']) if column == 'participants' else book[column]
+            for column in CSV_COLUMNS
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+writers = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def encode(lines, compress=False):
+    """Encode text lines to UTF-8 chunks of about FLUSH_SIZE bytes, gzipped if asked.
+
+    The first line is flushed on its own so clients see the first byte as soon as the
+    first batch of rows arrives.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    size = 0
+    flush_size = 1
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= flush_size:
+            chunk = b''.join(pending)
+            if compressor:
+                mode = zlib.Z_SYNC_FLUSH if flush_size == 1 else zlib.Z_NO_FLUSH
+                chunk = compressor.compress(chunk) + (compressor.flush(mode) if mode else b'')
+            pending, size, flush_size = [], 0, FLUSH_SIZE
+            if chunk:
+                yield chunk
+    chunk = b''.join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
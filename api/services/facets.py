@@ -0,0 +1,146 @@
+# services/facets.py
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import String, cast, delete, extract, func, insert, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Book, BookParticipant, FacetCount
+from .lookups import lookups
+
+# Facets reported by GET /api/books/facets, in output order
+FACETS = ('publisher', 'publicationplace', 'year', 'role')
+
+# facet_counts row holding the number of books
+TOTAL = ('total', '')
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+upserts = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def book_rows():
+    """Select the book columns the facets group on; filter it to count a subset."""
+    return select(Book.bookid, Book.publisher, Book.publicationplace, Book.publicationdate)
+
+
+def grouped_counts(books):
+    """A single statement counting the `books` subquery or CTE per facet value.
+
+    Yields (facet, value, count) rows, plus the TOTAL row. `books` needs one row per
+    book with the columns of `book_rows`. A role counts the books with at least one
+    participant in it, keyed by roleid.
+    """
+    year = cast(extract('year', books.c.publicationdate), String)
+    parts = [select(literal(TOTAL[0]), literal(TOTAL[1]), func.count()).select_from(books)]
+    for facet, column in (('publisher', books.c.publisher),
+                          ('publicationplace', books.c.publicationplace),
+                          ('year', year)):
+        parts.append(select(literal(facet), column, func.count())
+                     .where(column.isnot(None)).group_by(column))
+    parts.append(
+        select(literal('role'), cast(BookParticipant.roleid, String), func.count(BookParticipant.bookid.distinct()))
+        .where(BookParticipant.bookid.in_(select(books.c.bookid)))
+        .group_by(BookParticipant.roleid))
+    return union_all(*parts)
+
+
+def contributions(bookids):
+    """What the books `bookids` currently add to each facet value, as a Counter."""
+    if not bookids:
+        return Counter()
+    books = book_rows().where(Book.bookid.in_(bookids)).subquery()
+    return Counter({(facet, value): count for facet, value, count in db.session.execute(grouped_counts(books))})
+
+
+def apply(deltas):
+    """Add the `(facet, value) -> delta` Counter to facet_counts in one upsert."""
+    rows = [{'facet': facet, 'value': value, 'count': delta}
+            for (facet, value), delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    upsert = upserts[db.session.get_bind().dialect.name](FacetCount).values(rows)
+    db.session.execute(upsert.on_conflict_do_update(
+        index_elements=[FacetCount.facet, FacetCount.value],
+        set_={'count': FacetCount.count + upsert.excluded['count']}))
+    shrunk = {row['facet'] for row in rows if row['count'] < 0}
+    if shrunk:
+        db.session.execute(delete(FacetCount).where(FacetCount.facet.in_(shrunk), FacetCount.count <= 0))
+
+
+def add_books(bookids):
+    """Count newly inserted books; call after flushing them, before the commit."""
+    apply(contributions(bookids))
+
+
+@contextmanager
+def tracking(bookids):
+    """Keep facet_counts in step with changes made to existing books in the block.
+
+    The books are locked (on PostgreSQL), their contributions counted before and
+    after the block, and only the difference written, within the caller's
+    transaction. Deleting a book in the block removes its counts.
+    """
+    db.session.execute(select(Book.bookid).where(Book.bookid.in_(bookids)).with_for_update())
+    before = contributions(bookids)
+    yield
+    db.session.flush()
+    after = contributions(bookids)
+    after.subtract(before)
+    apply(after)
+
+
+def rebuild(connection):
+    """Recount every book into facet_counts through `connection` (or a session)."""
+    connection.execute(delete(FacetCount))
+    connection.execute(insert(FacetCount).from_select(
+        ['facet', 'value', 'count'], grouped_counts(book_rows().subquery())))
+
+
+def summary_counts(size):
+    """The `size` most frequent values of every facet, read from facet_counts."""
+    parts = [select(FacetCount.facet, FacetCount.value, FacetCount.count)
+             .where(FacetCount.facet == TOTAL[0], FacetCount.value == TOTAL[1])]
+    for facet in FACETS:
+        parts.append(select(FacetCount.facet, FacetCount.value, FacetCount.count)
+                     .where(FacetCount.facet == facet)
+                     .order_by(FacetCount.count.desc(), FacetCount.value)
+                     .limit(size).subquery().select())
+    return db.session.execute(union_all(*parts)).all()
+
+
+def book_facets(query=None, size=20):
+    """Facet counts of the books matched by `query`, or of the whole catalog.
+
+    `query` is `book_rows()` with the BookList filters applied. Without it the
+    counts come from facet_counts, so the cost does not grow with the catalog;
+    with it they come from one grouped query over the matching books. Returns
+    `{'total': n, facet: [{'value', 'count'}, ...]}` with the `size` most frequent
+    values per facet, most frequent first; role values also carry their roleid.
+    """
+    if query is None:
+        rows = summary_counts(size)
+    else:
+        # A CTE read by every facet is evaluated once (materialized), not once per facet;
+        # the BookList filters keep it at one row per book
+        rows = db.session.execute(grouped_counts(query.cte('matches'))).all()
+
+    result = {'total': 0, **{facet: [] for facet in FACETS}}
+    for facet, value, count in rows:
+        if (facet, value) == TOTAL:
+            result['total'] = count
+        elif facet in result:
+            result[facet].append({'value': value, 'count': count})
+    for facet in FACETS:
+        result[facet].sort(key=lambda item: (-item['count'], item['value']))
+        del result[facet][size:]
+
+    # Roles are counted by id; report them by description
+    roles = lookups.roles({int(item['value']) for item in result['role']})
+    result['role'] = [{'roleid': roles[int(item['value'])].roleid,
+                       'value': roles[int(item['value'])].description,
+                       'count': item['count']}
+                      for item in result['role'] if int(item['value']) in roles]
+    return result
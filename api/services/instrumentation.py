@@ -0,0 +1,233 @@
+# services/instrumentation.py
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# JSON line per request, kept apart from the app logger so it can be routed on its own
+request_logger = logging.getLogger('catalog.requests')
+
+# Upper bounds of the latency and query count histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """Statements run while serving one request."""
+
+    __slots__ = ('started', 'queries', 'db_time', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    def repeated(self, threshold):
+        """Statements run at least `threshold` times, most repeated first."""
+        if not threshold:
+            return []
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+class Histogram:
+    """Cumulative Prometheus histogram, one series per label tuple."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, name, label_names):
+        for labels, series in sorted(self.series.items()):
+            base = format_labels(label_names, labels)
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                le = format_labels(label_names + ('le',), labels + (str(bound),))
+                yield f'{name}_bucket{le} {total}'
+            yield f'{name}_count{base} {total}'
+            yield f'{name}_sum{base} {series[-1]:.6f}'
+
+
+def format_labels(names, values):
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Instrumentation:
+    """Per-request SQL accounting built on engine events and request hooks.
+
+    With INSTRUMENTATION on, each request counts its statements and database time,
+    reports them in a `Server-Timing` header (INSTRUMENTATION_SERVER_TIMING) and a
+    JSON log line (INSTRUMENTATION_LOG), and warns when one statement runs
+    N_PLUS_ONE_THRESHOLD times or more. Route latencies, query counts and pool
+    usage are served at /metrics in the Prometheus text format; each worker process
+    reports its own. With INSTRUMENTATION off nothing is registered, so requests
+    and queries pay nothing.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.n_plus_one_threshold = 3
+        self._lock = threading.Lock()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.query_counts = Histogram(QUERY_BUCKETS)
+        self.requests = Counter()  # (method, route, status) -> count
+        self.db_seconds = Counter()  # (method, route) -> seconds
+        self.n_plus_one = Counter()  # (method, route) -> flagged requests
+        self.engines = {}  # name -> Engine
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INSTRUMENTATION', False)
+        app.extensions['instrumentation'] = self
+        if not self.enabled:
+            return
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 3)
+        self.server_timing = app.config.get('INSTRUMENTATION_SERVER_TIMING', True)
+        self.log = app.config.get('INSTRUMENTATION_LOG', True)
+        if self.log and not request_logger.handlers:
+            request_logger.addHandler(logging.StreamHandler())
+            request_logger.setLevel(logging.INFO)
+            request_logger.propagate = False
+
+        from models import db
+        with app.app_context():
+            self.instrument_engine(db.engine, 'default')
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def instrument_engine(self, engine, name):
+        """Count the statements `engine` runs during requests and report its pool as `name`."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self.engines[name] = engine
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._instrumentation_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context():
+            return
+        stats = g.get('sql_stats')
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - context._instrumentation_started
+        stats.statements[statement] += 1
+
+    @staticmethod
+    def _before_request():
+        g.sql_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        repeated = stats.repeated(self.n_plus_one_threshold)
+
+        with self._lock:
+            self.latency.observe((request.method, route), elapsed)
+            self.query_counts.observe((request.method, route), stats.queries)
+            self.requests[request.method, route, response.status_code] += 1
+            self.db_seconds[request.method, route] += stats.db_time
+            if repeated:
+                self.n_plus_one[request.method, route] += 1
+
+        if self.server_timing:
+            response.headers.add('Server-Timing', f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"')
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        if repeated:
+            current_app.logger.warning(
+                f"Possible N+1 in {request.method} {route}: " + '; '.join(
+                    f"{count}x {' '.join(statement.split())[:200]}" for statement, count in repeated))
+        if self.log:
+            request_logger.info(json.dumps({
+                'event': 'request',
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 2),
+                'queries': stats.queries,
+                'db_ms': round(stats.db_time * 1000, 2),
+                'repeated_statements': len(repeated),
+            }))
+        return response
+
+    def render(self):
+        """The collected metrics in the Prometheus text exposition format."""
+        from routes.health_routes import pool_status
+
+        labels = ('method', 'route')
+        with self._lock:
+            lines = ['# HELP catalog_request_duration_seconds Request latency by route.',
+                     '# TYPE catalog_request_duration_seconds histogram']
+            lines.extend(self.latency.render('catalog_request_duration_seconds', labels))
+            lines += ['# HELP catalog_request_queries SQL statements per request by route.',
+                      '# TYPE catalog_request_queries histogram']
+            lines.extend(self.query_counts.render('catalog_request_queries', labels))
+            lines += ['# HELP catalog_requests_total Requests by route and status.',
+                      '# TYPE catalog_requests_total counter']
+            lines.extend(f'catalog_requests_total{format_labels(labels + ("status",), key)} {count}'
+                         for key, count in sorted(self.requests.items()))
+            lines += ['# HELP catalog_db_seconds_total Time spent in SQL statements by route.',
+                      '# TYPE catalog_db_seconds_total counter']
+            lines.extend(f'catalog_db_seconds_total{format_labels(labels, key)} {seconds:.6f}'
+                         for key, seconds in sorted(self.db_seconds.items()))
+            lines += ['# HELP catalog_n_plus_one_total Requests repeating one statement '
+                      'N_PLUS_ONE_THRESHOLD times or more.',
+                      '# TYPE catalog_n_plus_one_total counter']
+            lines.extend(f'catalog_n_plus_one_total{format_labels(labels, key)} {count}'
+                         for key, count in sorted(self.n_plus_one.items()))
+
+        lines += ['# HELP catalog_db_pool_connections Connections of the pool by state.',
+                  '# TYPE catalog_db_pool_connections gauge']
+        for name, engine in sorted(self.engines.items()):
+            status = pool_status(engine.pool)
+            for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+                if state in status:
+                    lines.append(f'catalog_db_pool_connections'
+                                 f'{format_labels(("engine", "state"), (name, state))} {status[state]}')
+
+        lookups = current_app.extensions.get('lookups')
+        if lookups is not None:
+            stats = lookups.stats()
+            kinds = (('role', 'roles'), ('participant', 'participants'))
+            for counter, help_text in (('hits', 'served from'), ('misses', 'read from the database by')):
+                lines += [f'# HELP catalog_lookup_cache_{counter}_total Role and participant lookups '
+                          f'{help_text} the lookup cache, by kind.',
+                          f'# TYPE catalog_lookup_cache_{counter}_total counter']
+                lines.extend(f'catalog_lookup_cache_{counter}_total{format_labels(("kind",), (kind,))} '
+                             f'{stats[f"{kind}_{counter}"]}' for kind, _ in kinds)
+            lines += ['# HELP catalog_lookup_cache_entries Rows held by the lookup cache, by kind.',
+                      '# TYPE catalog_lookup_cache_entries gauge']
+            lines.extend(f'catalog_lookup_cache_entries{format_labels(("kind",), (kind,))} {stats[size]}'
+                         for kind, size in kinds)
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,179 @@
+# services/lookups.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+
+from models import db, Participant, Role
+from .signals import catalog_changed
+
+RoleRef = namedtuple('RoleRef', 'roleid description')
+ParticipantRef = namedtuple('ParticipantRef', 'participantid name')
+
+
+class LookupCache:
+    """Process-local cache of the reference rows the write paths validate against.
+
+    Roles are few and rarely change, so the whole table is kept. Participants are
+    kept in an LRU of PARTICIPANT_CACHE_SIZE entries. Entries are dropped when
+    `catalog_changed` reports a write in this process, and expire after LOOKUP_TTL
+    seconds to bound staleness from writes made by other processes; a write that
+    fails on a foreign key re-checks its references with `missing`.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.participant_capacity = 10000
+        self._roles = {}  # roleid -> (expires_at, RoleRef)
+        self._participants = OrderedDict()  # participantid -> (expires_at, ParticipantRef)
+        self._lock = threading.Lock()
+        self.counters = {'role_hits': 0, 'role_misses': 0, 'participant_hits': 0, 'participant_misses': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LOOKUP_TTL', 300)
+        self.participant_capacity = app.config.get('PARTICIPANT_CACHE_SIZE', 10000)
+        app.extensions['lookups'] = self
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+    def warm(self):
+        """Load every role and the first participants up to the LRU capacity."""
+        expires = time.monotonic() + self.ttl
+        roles = db.session.execute(db.select(Role.roleid, Role.description)).all()
+        participants = db.session.execute(
+            db.select(Participant.participantid, Participant.name)
+            .order_by(Participant.participantid).limit(self.participant_capacity)).all()
+        with self._lock:
+            self._roles = {row.roleid: (expires, RoleRef(*row)) for row in roles}
+            self._participants = OrderedDict(
+                (row.participantid, (expires, ParticipantRef(*row))) for row in participants)
+        current_app.logger.info(
+            f"Lookup cache warmed with {len(roles)} roles and {len(participants)} participants")
+
+    def role(self, roleid):
+        """Return the RoleRef for `roleid`, or None if no such role exists."""
+        with self._lock:
+            item = self._roles.get(roleid)
+            if item is not None and item[0] >= time.monotonic():
+                self.counters['role_hits'] += 1
+                return item[1]
+            self.counters['role_misses'] += 1
+        row = db.session.execute(
+            db.select(Role.roleid, Role.description).where(Role.roleid == roleid)).first()
+        if row is None:
+            return None
+        ref = RoleRef(*row)
+        with self._lock:
+            self._roles[roleid] = (time.monotonic() + self.ttl, ref)
+        return ref
+
+    def participant(self, participantid):
+        """Return the ParticipantRef for `participantid`, or None if it does not exist."""
+        with self._lock:
+            item = self._participants.get(participantid)
+            if item is not None and item[0] >= time.monotonic():
+                self._participants.move_to_end(participantid)
+                self.counters['participant_hits'] += 1
+                return item[1]
+            self.counters['participant_misses'] += 1
+        row = db.session.execute(
+            db.select(Participant.participantid, Participant.name)
+            .where(Participant.participantid == participantid)).first()
+        if row is None:
+            return None
+        ref = ParticipantRef(*row)
+        self.remember_participants([ref])
+        return ref
+
+    def roles(self, roleids):
+        """Return {roleid: RoleRef} for the existing roles among `roleids`, with one
+        query for the ones not cached."""
+        found, missing = self._cached(self._roles, roleids, 'role')
+        if missing:
+            refs = [RoleRef(*row) for row in db.session.execute(
+                db.select(Role.roleid, Role.description).where(Role.roleid.in_(missing)))]
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                for ref in refs:
+                    self._roles[ref.roleid] = (expires, ref)
+            found.update((ref.roleid, ref) for ref in refs)
+        return found
+
+    def participants(self, participantids):
+        """Return {participantid: ParticipantRef} for the existing participants among
+        `participantids`, with one query for the ones not cached."""
+        found, missing = self._cached(self._participants, participantids, 'participant')
+        if missing:
+            refs = [ParticipantRef(*row) for row in db.session.execute(
+                db.select(Participant.participantid, Participant.name)
+                .where(Participant.participantid.in_(missing)))]
+            self.remember_participants(refs)
+            found.update((ref.participantid, ref) for ref in refs)
+        return found
+
+    def missing(self, participantids=(), roleids=()):
+        """Return the (participantids, roleids) among those given that are not in the
+        database, checked with a query each and bypassing the cache.
+
+        A write that fails on a foreign key may have referenced a row another
+        process deleted while it was still cached here; the missing rows are
+        dropped from the cache so the next lookup reports them.
+        """
+        participantids, roleids = set(participantids), set(roleids)
+        if participantids:
+            participantids -= set(db.session.scalars(
+                db.select(Participant.participantid).where(Participant.participantid.in_(participantids))))
+        if roleids:
+            roleids -= set(db.session.scalars(db.select(Role.roleid).where(Role.roleid.in_(roleids))))
+        with self._lock:
+            for participantid in participantids:
+                self._participants.pop(participantid, None)
+            for roleid in roleids:
+                self._roles.pop(roleid, None)
+        return participantids, roleids
+
+    def _cached(self, entries, ids, kind):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for entity_id in set(ids):
+                item = entries.get(entity_id)
+                if item is not None and item[0] >= now:
+                    found[entity_id] = item[1]
+                    if entries is self._participants:
+                        entries.move_to_end(entity_id)
+                else:
+                    missing.append(entity_id)
+            self.counters[f'{kind}_hits'] += len(found)
+            self.counters[f'{kind}_misses'] += len(missing)
+        return found, missing
+
+    def remember_participants(self, refs):
+        """Add participants fetched elsewhere (e.g. by a set-based query) to the LRU."""
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for ref in refs:
+                self._participants[ref.participantid] = (expires, ref)
+                self._participants.move_to_end(ref.participantid)
+            while len(self._participants) > self.participant_capacity:
+                self._participants.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, roles=len(self._roles), participants=len(self._participants))
+
+    def _on_catalog_changed(self, sender, entity, action, **ids):
+        if entity == 'role':
+            entries, entity_ids = self._roles, ids.get('roleids') or [ids.get('roleid')]
+        elif entity == 'participant':
+            entries, entity_ids = self._participants, ids.get('participantids') or [ids.get('participantid')]
+        else:
+            return
+        with self._lock:
+            for entity_id in entity_ids:
+                entries.pop(entity_id, None)
+
+
+lookups = LookupCache()
@@ -0,0 +1,78 @@
+# services/pagination.py
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+
+class InvalidCursor(ValueError):
+    """Raised when an `after` cursor cannot be decoded for the requested sort."""
+
+
+def page_size(limit):
+    """Clamp a requested page size to the configured maximum."""
+    max_size = current_app.config.get('MAX_PAGE_SIZE', 100)
+    if limit is None:
+        return max_size
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, max_size)
+
+
+def id_list(value):
+    """Parse a comma-separated `ids` argument, keeping its order and dropping repeats.
+
+    At most MAX_BATCH_SIZE ids are accepted.
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in str(value).split(',') if part.strip()))
+    except ValueError:
+        raise ValueError(f'{value!r} is not a comma-separated list of ids')
+    if not ids:
+        raise ValueError('ids needs at least one id')
+    max_size = current_app.config.get('MAX_BATCH_SIZE', 100)
+    if len(ids) > max_size:
+        raise ValueError(f'At most {max_size} ids can be fetched at once')
+    return ids
+
+
+def in_requested_order(ids, rows, key):
+    """Order the rows fetched for `ids` (by `key(row)`) as requested.
+
+    Returns the rows and the X-Missing-Ids header listing the ids without a row.
+    """
+    by_id = {key(row): row for row in rows}
+    missing = [str(entity_id) for entity_id in ids if entity_id not in by_id]
+    headers = {'X-Missing-Ids': ','.join(missing)} if missing else {}
+    return [by_id[entity_id] for entity_id in ids if entity_id in by_id], headers
+
+
+def encode_cursor(sort, key):
+    """Encode the sort key of the last row of a page into an opaque cursor."""
+    # Dates in sort keys are written as ISO 8601 strings
+    raw = json.dumps({'s': sort, 'k': list(key)}, separators=(',', ':'), default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Decode a cursor produced by `encode_cursor`, checking it matches `sort`."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(data, dict) or data.get('s') != sort or not isinstance(data.get('k'), list):
+        raise InvalidCursor(f'Cursor does not belong to sort order "{sort}"')
+    return data['k']
+
+
+def next_page_headers(cursor):
+    """Build the Link/X-Next-Cursor headers pointing at the page after `cursor`."""
+    if cursor is None:
+        return {}
+    args = request.args.to_dict(flat=False)
+    args['after'] = [cursor]
+    url = f"{request.base_url}?{urlencode(args, doseq=True)}"
+    return {'Link': f'<{url}>; rel="next"', 'X-Next-Cursor': cursor}
@@ -0,0 +1,178 @@
+# services/replicas.py
+import itertools
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import g, request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+
+from models import db
+from .instrumentation import instrumentation
+
+# Request methods a replica may serve
+READ_METHODS = ('GET', 'HEAD')
+
+# Seconds a replica trails its primary, by dialect; 0 while it has replayed all it received
+LAG_QUERIES = {
+    'postgresql': text(
+        'select case when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0 '
+        'else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0) end'),
+}
+
+
+class Replica:
+    """A read replica's engine and the outcome of its last health check."""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = None  # seconds behind the primary, where the dialect reports it
+        self.checked_at = 0.0
+        self.checking = False
+
+    def status(self):
+        return {'name': self.name, 'healthy': self.healthy, 'lag': self.lag}
+
+
+class ReplicaRouter:
+    """Routes the reads of opted-in views to read replicas, and the rest to the primary.
+
+    Views opt in with `reads` (the catalog namespaces apply it to all their
+    resources). Their GETs go to the healthy replicas in turn, unless the client
+    wrote within READ_YOUR_WRITES_WINDOW seconds: each successful write sets a
+    cookie pinning that client's reads to the primary until then. A replica is
+    checked at most every REPLICA_CHECK_INTERVAL seconds and left out while it
+    cannot be reached or lags more than REPLICA_MAX_LAG seconds; a connection
+    error takes it out at once. Without a healthy replica, reads go to the primary.
+
+    The window must be at least REPLICA_MAX_LAG, so a pin outlasts the lag of any
+    replica serving reads and the writer sees its own changes. (On SQLite, and
+    between checks, the lag is not measured and this only holds approximately.)
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.window = 30
+        self.cookie = 'catalog-primary-until'
+        self.check_interval = 10
+        self.max_lag = 30
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('READ_YOUR_WRITES_WINDOW', 30)
+        self.cookie = app.config.get('READ_YOUR_WRITES_COOKIE', 'catalog-primary-until')
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', 30)
+        options = app.config.get('REPLICA_ENGINE_OPTIONS', {})
+        urls = app.config.get('REPLICA_DATABASE_URLS', [])
+        if urls and self.window < self.max_lag:
+            raise ValueError(f'READ_YOUR_WRITES_WINDOW ({self.window}s) must be at least REPLICA_MAX_LAG '
+                             f'({self.max_lag}s), or writers may read a replica that lacks their writes')
+        self.replicas = []
+        for number, url in enumerate(urls):
+            replica = Replica(f'replica{number}', create_engine(url, **options))
+            event.listen(replica.engine, 'handle_error', self._error_handler(replica))
+            if instrumentation.enabled:
+                instrumentation.instrument_engine(replica.engine, replica.name)
+            self.replicas.append(replica)
+        app.extensions['replicas'] = self
+        if self.replicas:
+            app.after_request(self._after_request)
+
+    def reads(self, view):
+        """Decorate a view (or a Namespace, through `decorators`) whose reads may be
+        served by a replica."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.replicas and request.method in READ_METHODS:
+                if self.pinned():
+                    # The response cache may hold what this client read before writing
+                    g.fresh_read = True
+                else:
+                    replica = self.choose()
+                    if replica is not None:
+                        g.db_engine = replica.engine
+                        g.db_replica = replica.name
+                        try:
+                            return view(*args, **kwargs)
+                        except DBAPIError:
+                            if replica.healthy:
+                                raise
+                        # The replica went away mid-request; reads are safe to repeat on the primary
+                        db.session.rollback()
+                        g.pop('db_engine', None)
+                        g.pop('db_replica', None)
+            return view(*args, **kwargs)
+        return wrapper
+
+    def pinned(self):
+        """Whether the client wrote recently enough to read from the primary."""
+        try:
+            return float(request.cookies.get(self.cookie, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def choose(self):
+        """The next healthy replica, checking those due for it; None when none is."""
+        now = time.monotonic()
+        with self._lock:
+            due = [replica for replica in self.replicas
+                   if not replica.checking and now - replica.checked_at >= self.check_interval]
+            for replica in due:
+                replica.checking = True
+        for replica in due:
+            self.check(replica)
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def check(self, replica):
+        """Run a query on `replica` and record whether it can serve reads."""
+        try:
+            with replica.engine.connect() as connection:
+                lag_query = LAG_QUERIES.get(replica.engine.dialect.name)
+                if lag_query is None:
+                    connection.execute(text('SELECT 1'))
+                    replica.lag = None
+                else:
+                    replica.lag = float(connection.execute(lag_query).scalar() or 0)
+            healthy = replica.lag is None or replica.lag <= self.max_lag
+        except Exception:
+            healthy = False
+        with self._lock:
+            replica.healthy = healthy
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+
+    def _error_handler(self, replica):
+        def handle_error(context):
+            # Lost or refused connections take the replica out until its next check
+            if context.is_disconnect or context.connection is None:
+                with self._lock:
+                    replica.healthy = False
+                    replica.checked_at = time.monotonic()
+        return handle_error
+
+    def _after_request(self, response):
+        if request.method not in READ_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+            response.set_cookie(self.cookie, f'{time.time() + self.window:.3f}', max_age=math.ceil(self.window),
+                                httponly=True, samesite='Lax')
+        return response
+
+    def status(self):
+        return [replica.status() for replica in self.replicas]
+
+    def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+
+replicas = ReplicaRouter()
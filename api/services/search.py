@@ -0,0 +1,233 @@
+# services/search.py
+import re
+
+from sqlalchemy import DDL, event, func, literal_column, select, text
+
+from models import db, Book, BookParticipant, Participant
+
+# Postgres keeps a weighted tsvector on books in sync through triggers, so a search
+# never has to join participants. Trigram indexes back the substring fallbacks and
+# the ilike filters of BookList.get. Keep in sync with postgres/scripts/ddl.catalog.sql.
+POSTGRES_DDL = [
+    "create extension if not exists pg_trgm",
+    "alter table books add column if not exists search_vector tsvector",
+    """
+    create or replace function books_search_vector(b books) returns tsvector as $$
+        select setweight(to_tsvector('simple', coalesce(b.title, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce((
+                   select string_agg(p.name, ' ')
+                   from bookparticipants bp
+                   join participants p on p.participantid = bp.participantid
+                   where bp.bookid = b.bookid), '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(b.isbn, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(b.publisher, '') || ' ' || coalesce(b.publicationplace, '')), 'C')
+    $$ language sql stable
+    """,
+    """
+    create or replace function books_search_vector_trigger() returns trigger as $$
+    begin
+        new.search_vector := books_search_vector(new);
+        return new;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists books_search_vector_update on books",
+    """
+    create trigger books_search_vector_update before insert or update on books
+        for each row execute function books_search_vector_trigger()
+    """,
+    """
+    create or replace function bookparticipants_search_vector_trigger() returns trigger as $$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            update books set search_vector = null where bookid = old.bookid;
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            update books set search_vector = null where bookid = new.bookid;
+        end if;
+        return null;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists bookparticipants_search_vector_update on bookparticipants",
+    """
+    create trigger bookparticipants_search_vector_update after insert or update or delete on bookparticipants
+        for each row execute function bookparticipants_search_vector_trigger()
+    """,
+    """
+    create or replace function participants_search_vector_trigger() returns trigger as $$
+    begin
+        update books set search_vector = null
+        where bookid in (select bookid from bookparticipants where participantid = new.participantid);
+        return null;
+    end
+    $$ language plpgsql
+    """,
+    "drop trigger if exists participants_search_vector_update on participants",
+    """
+    create trigger participants_search_vector_update after update of name on participants
+        for each row when (old.name is distinct from new.name)
+        execute function participants_search_vector_trigger()
+    """,
+    "create index if not exists books_search_vector_idx on books using gin (search_vector)",
+    "create index if not exists books_title_trgm_idx on books using gin (title gin_trgm_ops)",
+    "create index if not exists books_isbn_trgm_idx on books using gin (isbn gin_trgm_ops)",
+    "create index if not exists books_publisher_trgm_idx on books using gin (publisher gin_trgm_ops)",
+    "create index if not exists books_publicationplace_trgm_idx on books using gin (publicationplace gin_trgm_ops)",
+    "create index if not exists participants_name_trgm_idx on participants using gin (name gin_trgm_ops)",
+]
+
+# SQLite has no tsvector, so an FTS5 table keyed by bookid mirrors the searchable text
+SQLITE_PARTICIPANT_NAMES = """(
+    select group_concat(p.name, ' ')
+    from bookparticipants bp
+    join participants p on p.participantid = bp.participantid
+    where bp.bookid = {bookid})"""
+
+SQLITE_DDL = [
+    """
+    create virtual table if not exists books_fts using fts5(
+        title, publisher, publicationplace, isbn, participants,
+        tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    f"""
+    create trigger if not exists books_fts_insert after insert on books begin
+        insert into books_fts (rowid, title, publisher, publicationplace, isbn, participants)
+        values (new.bookid, new.title, new.publisher, new.publicationplace, new.isbn,
+                {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')});
+    end
+    """,
+    f"""
+    create trigger if not exists books_fts_update after update on books begin
+        delete from books_fts where rowid = old.bookid;
+        insert into books_fts (rowid, title, publisher, publicationplace, isbn, participants)
+        values (new.bookid, new.title, new.publisher, new.publicationplace, new.isbn,
+                {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')});
+    end
+    """,
+    """
+    create trigger if not exists books_fts_delete after delete on books begin
+        delete from books_fts where rowid = old.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_insert after insert on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')}
+        where rowid = new.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_update after update on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='old.bookid')}
+        where rowid = old.bookid;
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='new.bookid')}
+        where rowid = new.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists bookparticipants_fts_delete after delete on bookparticipants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='old.bookid')}
+        where rowid = old.bookid;
+    end
+    """,
+    f"""
+    create trigger if not exists participants_fts_update after update of name on participants begin
+        update books_fts set participants = {SQLITE_PARTICIPANT_NAMES.format(bookid='books_fts.rowid')}
+        where rowid in (select bookid from bookparticipants where participantid = new.participantid);
+    end
+    """,
+]
+
+# bookparticipants is created last by create_all, so every table the triggers touch exists
+for statement in POSTGRES_DDL:
+    event.listen(BookParticipant.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(BookParticipant.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Book.__table__, 'before_drop',
+             DDL('drop table if exists books_fts').execute_if(dialect='sqlite'))
+
+
+def tokenize(term):
+    """Split a search term into lowercase word tokens."""
+    return [token.lower() for token in re.findall(r'\w+', term)]
+
+
+class LikeSearch:
+    """Portable fallback: substring match on book columns and participant names."""
+
+    def apply(self, query, term):
+        pattern = f'%{term}%'
+        participant_match = db.session.query(BookParticipant.id).join(Participant).filter(
+            BookParticipant.bookid == Book.bookid,
+            Participant.name.ilike(pattern)
+        ).exists()
+        query = query.filter(db.or_(
+            Book.title.ilike(pattern),
+            Book.publisher.ilike(pattern),
+            Book.publicationplace.ilike(pattern),
+            Book.isbn.ilike(pattern),
+            participant_match
+        ))
+        return query, literal_column('0')
+
+
+class PostgresSearch:
+    """Prefix full-text match on books.search_vector ranked with ts_rank, plus trigram
+    substring matches on title and ISBN."""
+
+    def apply(self, query, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return LikeSearch().apply(query, term)
+        pattern = f'%{term}%'
+        search_vector = literal_column('books.search_vector')
+        ts_query = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+        query = query.filter(db.or_(
+            search_vector.op('@@')(ts_query),
+            Book.title.ilike(pattern),
+            Book.isbn.ilike(pattern)
+        ))
+        return query, func.ts_rank(search_vector, ts_query)
+
+
+class SqliteSearch:
+    """FTS5 match on books_fts ranked with bm25, plus substring matches on title and ISBN."""
+
+    def apply(self, query, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return LikeSearch().apply(query, term)
+        pattern = f'%{term}%'
+        fts_query = ' '.join(f'"{token}"*' for token in tokens)
+        matches = select(
+            literal_column('rowid').label('bookid'),
+            literal_column('rank').label('rank')
+        ).select_from(text('books_fts')).where(
+            text('books_fts MATCH :fts_query').bindparams(fts_query=fts_query)
+        ).subquery()
+        query = query.outerjoin(matches, matches.c.bookid == Book.bookid).filter(db.or_(
+            matches.c.bookid.isnot(None),
+            Book.title.ilike(pattern),
+            Book.isbn.ilike(pattern)
+        ))
+        # bm25 scores are negative with the best match lowest
+        return query, func.coalesce(-matches.c.rank, 0)
+
+
+backends = {
+    'postgresql': PostgresSearch(),
+    'sqlite': SqliteSearch(),
+}
+
+
+def search_books(query, term):
+    """Restrict a Book query (or select() statement) to `term` matches.
+
+    Returns the filtered query and a relevance score expression (higher is better).
+    Only ever joins one row per book, so composing it with other filters does not
+    duplicate results.
+    """
+    backend = backends.get(db.engine.dialect.name, LikeSearch())
+    return backend.apply(query, term)
@@ -0,0 +1,190 @@
+# services/serializer.py
+from functools import wraps
+from http import HTTPStatus
+
+from flask import current_app, g, request
+from flask_restx import abort, fields as restx_fields, marshal
+from flask_restx.representations import output_json as restx_output_json
+from flask_restx.utils import unpack
+
+# Field classes whose output is `format(value)` for non-null values and null otherwise
+# (when they have no default), mapped to the expression that formats `value`.
+SIMPLE_FORMATS = {
+    restx_fields.Raw: '{value}',
+    restx_fields.String: 'str({value})',
+    restx_fields.Integer: 'int({value})',
+    restx_fields.Float: 'float({value})',
+}
+
+
+class ModelCompiler:
+    """Compiles flask-restx models into plain Python functions.
+
+    `marshal` walks the field tree and resolves every attribute through `get_value` on
+    each call. The compiled function does the same work with straight-line
+    `getattr` calls generated once per model. Its output is identical to
+    `marshal(obj, model)`. Fields the compiler does not specialize call
+    `field.output()`, and dict inputs (error payloads) go through `marshal`.
+    """
+
+    def __init__(self):
+        self._compiled = {}  # (id(model), only) -> compiled function
+        self._models = []  # keeps compiled models alive so their ids stay unique
+
+    def compile(self, model, only=None):
+        """Return the function serializing `model`, restricted to the `only` keys if given."""
+        key = (id(model), only)
+        if key not in self._compiled:
+            # Register before building so recursive models terminate
+            self._models.append(model)
+            self._compiled[key] = None
+            self._compiled[key] = self._build(model, only)
+        return self._compiled[key]
+
+    def _build(self, model, only):
+        model_fields = getattr(model, 'resolved', model)
+        if only is not None:
+            model_fields = {key: model_fields[key] for key in only}
+        if getattr(model, '__mask__', None):
+            return lambda obj: marshal(obj, model_fields)
+        namespace = {'marshal': marshal, 'model': model_fields}
+        lines = []
+        items = []
+        for index, (key, field) in enumerate(model_fields.items()):
+            field = field() if isinstance(field, type) else field
+            namespace[f'f{index}'] = field
+            value = f'v{index}'
+            attribute = field.attribute if field.attribute is not None else key
+            simple_getter = isinstance(attribute, str) and '.' not in attribute and field.mask is None
+
+            fmt = SIMPLE_FORMATS.get(type(field))
+            if fmt and simple_getter and field.default is None:
+                lines.append(f'{value} = getattr(obj, {attribute!r}, None)')
+                expr = f'None if {value} is None else ' + fmt.format(value=value)
+            elif type(field) is restx_fields.Nested and simple_getter and not field.skip_none:
+                namespace[f'n{index}'] = self._nested(field.nested)
+                lines.append(f'{value} = getattr(obj, {attribute!r}, None)')
+                if field.allow_null:
+                    expr = f'None if {value} is None else n{index}({value})'
+                elif field.default is not None:
+                    expr = f'f{index}.default if {value} is None else n{index}({value})'
+                else:
+                    expr = f'n{index}({value})'
+            elif (type(field) is restx_fields.List and simple_getter
+                  and type(field.container) is restx_fields.Nested
+                  and field.container.attribute is None
+                  and not field.container.allow_null and field.container.default is None
+                  and not field.container.skip_none):
+                namespace[f'n{index}'] = self._nested(field.container.nested)
+                lines.append(f'{value} = getattr(obj, {attribute!r}, None)')
+                expr = (f'[n{index}(item) for item in {value}] if isinstance({value}, (list, tuple)) '
+                        f'else f{index}.output({key!r}, obj)')
+            else:
+                expr = f'f{index}.output({key!r}, obj)'
+            items.append(f'{key!r}: {expr}')
+
+        body = '\n    '.join(lines)
+        source = (
+            'def serialize(obj):\n'
+            '    if isinstance(obj, dict):\n'
+            '        return marshal(obj, model)\n'
+            f'    {body}\n'
+            f'    return {{{", ".join(items)}}}\n'
+        )
+        exec(compile(source, f"<serializer {getattr(model, 'name', 'fields')}>", 'exec'), namespace)
+        return namespace['serialize']
+
+    def _nested(self, model):
+        """Late-bound reference to a nested model's function (it may still be compiling)."""
+        self.compile(model)
+        compiled = self._compiled
+        key = (id(model), None)
+
+        def nested(obj):
+            return compiled[key](obj)
+        return compiled[key] or nested
+
+
+compiler = ModelCompiler()
+
+
+def requested_fields(model):
+    """Parse the `fields` query argument into the `model` keys to output.
+
+    Returns a tuple in model order, or None when every field is wanted. Unknown
+    names abort with 400.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None
+    model_fields = getattr(model, 'resolved', model)
+    wanted = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = wanted - set(model_fields)
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(sorted(unknown))}. "
+                   f"Available fields: {', '.join(model_fields)}")
+    return tuple(key for key in model_fields if key in wanted)
+
+
+def marshal_with(ns, model, as_list=False, code=HTTPStatus.OK, description=None, sparse=False):
+    """Drop-in replacement for `Namespace.marshal_with` backed by a compiled serializer.
+
+    The Swagger documentation is registered by flask-restx itself. With `sparse`, the
+    `fields` query argument (see `requested_fields`) limits the keys that are output.
+    Requests that send a field mask header keep using `marshal`, which implements
+    the mask. The unmarshalled result is left in `g.view_rows`, from which
+    `cache.cached` tags the entry.
+    """
+    compiler.compile(model)
+
+    def decorator(f):
+        documented = ns.marshal_with(model, as_list=as_list, code=code, description=description)(f)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            resp = f(*args, **kwargs)
+            data, status, headers = unpack(resp)
+            g.view_rows = data
+            only = requested_fields(model) if sparse else None
+            mask = request.headers.get(current_app.config['RESTX_MASK_HEADER'])
+            if mask:
+                model_fields = getattr(model, 'resolved', model)
+                if only is not None:
+                    model_fields = {key: model_fields[key] for key in only}
+                data = marshal(data, model_fields, mask=mask)
+            else:
+                serialize = compiler.compile(model, only)
+                if isinstance(data, (list, tuple)):
+                    data = [serialize(item) for item in data]
+                else:
+                    data = serialize(data)
+            return (data, status, headers) if isinstance(resp, tuple) else data
+
+        wrapper.__apidoc__ = documented.__apidoc__
+        return wrapper
+    return decorator
+
+
+def marshal_list_with(ns, model, **kwargs):
+    """Shortcut for `marshal_with(..., as_list=True)`."""
+    return marshal_with(ns, model, as_list=True, **kwargs)
+
+
+def output_json(data, code, headers=None):
+    """JSON representation for the Api.
+
+    Defaults to the flask-restx encoder, whose output the compiled serializer matches
+    byte for byte. With JSON_ENCODER = 'orjson' (and orjson installed) bodies are
+    encoded by orjson instead, which is faster but emits compact separators.
+    """
+    if current_app.config.get('JSON_ENCODER') == 'orjson' and not current_app.debug:
+        try:
+            import orjson  # optional dependency
+        except ImportError:
+            return restx_output_json(data, code, headers)
+        resp = current_app.response_class(
+            orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) + b'\n',
+            status=code, mimetype='application/json')
+        resp.headers.extend(headers or {})
+        return resp
+    return restx_output_json(data, code, headers)
@@ -0,0 +1,15 @@
+# services/signals.py
+from blinker import Namespace
+from flask import current_app
+
+_signals = Namespace()
+
+# Sent by the write handlers after a successful commit. Receivers get the entity
+# ('book', 'participant', 'role' or 'assignment'), the action ('create', 'update'
+# or 'delete') and the ids involved as keyword arguments.
+catalog_changed = _signals.signal('catalog-changed')
+
+
+def notify(entity, action, **ids):
+    """Announce a committed change to the catalog."""
+    catalog_changed.send(current_app._get_current_object(), entity=entity, action=action, **ids)
@@ -0,0 +1,90 @@
+# services/versioning.py
+from flask import request
+from flask_restx import fields
+from sqlalchemy import exists, select, update
+
+from models import db
+
+
+# Python types accepted in PATCH bodies per API field type
+PATCH_TYPES = {fields.Integer: int, fields.String: str}
+
+
+class PreconditionFailed(Exception):
+    """The If-Match header of a conditional write names none of the row's versions."""
+
+
+def patch_values(payload, model):
+    """Check a PATCH body against the writable fields of the API `model`.
+
+    Every key must be a field of `model` with a value of its type; null is
+    accepted unless the field is required. Returns the values to write and
+    raises ValueError otherwise.
+    """
+    if not isinstance(payload, dict) or not payload:
+        raise ValueError('Expected an object with the fields to change')
+    for key, value in payload.items():
+        field = model.get(key)
+        if field is None:
+            raise ValueError(f'Unknown field {key!r}')
+        if value is None:
+            if field.required:
+                raise ValueError(f'{key} cannot be null')
+        elif isinstance(value, bool) or not isinstance(value, PATCH_TYPES.get(type(field), object)):
+            raise ValueError(f'{key} must be of type {field.__schema_type__}')
+    return dict(payload)
+
+
+def put_values(payload, model):
+    """A PUT body without the columns the server manages: the primary key, the row
+    version and the timestamps, which a client echoing a GET body sends back.
+
+    Writing the version would reset it and let stale If-Match headers match again.
+    """
+    managed = {column.key for column in model.__mapper__.primary_key}
+    managed.add(model.__mapper__.version_id_col.key)
+    managed.update(('created_at', 'updated_at'))
+    return {key: value for key, value in (payload or {}).items() if key not in managed}
+
+
+def etag_headers(version):
+    """ETag header of a single-entity GET: the row version, which the response
+    cache extends with a digest of the rendered body."""
+    return {'ETag': f'"{version}"'}
+
+
+def if_match_versions():
+    """Row versions allowed by the request's If-Match header, or None when any is.
+
+    Entity tags are compared strongly, as If-Match requires: weak tags and tags
+    not led by a version never match.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = set()
+    for tag in request.if_match.as_set():
+        version = tag.split('-', 1)[0]
+        if version.isdigit():
+            versions.add(int(version))
+    return versions
+
+
+def versioned_update(model, key, values):
+    """Apply `values` to the `model` row with primary key `key` in one UPDATE.
+
+    The row version is bumped in the same statement and, with If-Match, must be
+    one of the listed versions; nothing is read before the write. Returns the new
+    version, None when there is no such row, and raises PreconditionFailed when
+    the row exists at another version.
+    """
+    key_column = model.__mapper__.primary_key[0]
+    versions = if_match_versions()
+    statement = update(model).where(key_column == key).values(**values, version=model.version + 1)
+    if versions is not None:
+        statement = statement.where(model.version.in_(versions))
+    version = db.session.execute(
+        statement.returning(model.version).execution_options(synchronize_session=False)).scalar()
+    if version is None and versions is not None \
+            and db.session.execute(select(exists().where(key_column == key))).scalar():
+        raise PreconditionFailed(f'{model.__tablename__} row {key} has been changed since it was read')
+    return version
@@ -33,3 +33,78 @@ CREATE TABLE IF NOT EXISTS bookparticipants (
     CONSTRAINT fk_participant FOREIGN KEY (participantid) REFERENCES participants(participantid) ON DELETE RESTRICT,
     CONSTRAINT fk_role FOREIGN KEY (roleid) REFERENCES roles(roleid) ON DELETE RESTRICT
 );
+
+-- Join-table and lookup indexes (mirrors api/migrations/versions/0002_catalog_indexes.py;
+-- later schema changes ship as migrations only: run `flask db upgrade` in api/)
+create unique index if not exists uq_bookparticipants_book_participant_role
+    on bookparticipants (bookid, participantid, roleid);
+create index if not exists ix_bookparticipants_participantid on bookparticipants (participantid);
+create index if not exists ix_bookparticipants_roleid on bookparticipants (roleid);
+create index if not exists ix_participants_name on participants (name);
+create index if not exists ix_books_title_bookid on books (title, bookid);
+
+-- Full-text search support for GET /api/books?search=
+-- (mirrors POSTGRES_DDL in api/services/search.py)
+create extension if not exists pg_trgm;
+
+alter table books add column if not exists search_vector tsvector;
+
+-- Weighted document: title (A), participant names and ISBN (B), publisher and place (C)
+create or replace function books_search_vector(b books) returns tsvector as $$
+    select setweight(to_tsvector('simple', coalesce(b.title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((
+               select string_agg(p.name, ' ')
+               from bookparticipants bp
+               join participants p on p.participantid = bp.participantid
+               where bp.bookid = b.bookid), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(b.isbn, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(b.publisher, '') || ' ' || coalesce(b.publicationplace, '')), 'C')
+$$ language sql stable;
+
+create or replace function books_search_vector_trigger() returns trigger as $$
+begin
+    new.search_vector := books_search_vector(new);
+    return new;
+end
+$$ language plpgsql;
+
+drop trigger if exists books_search_vector_update on books;
+create trigger books_search_vector_update before insert or update on books
+    for each row execute function books_search_vector_trigger();
+
+-- Touching the book row recomputes its vector when its participants change
+create or replace function bookparticipants_search_vector_trigger() returns trigger as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        update books set search_vector = null where bookid = old.bookid;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        update books set search_vector = null where bookid = new.bookid;
+    end if;
+    return null;
+end
+$$ language plpgsql;
+
+drop trigger if exists bookparticipants_search_vector_update on bookparticipants;
+create trigger bookparticipants_search_vector_update after insert or update or delete on bookparticipants
+    for each row execute function bookparticipants_search_vector_trigger();
+
+create or replace function participants_search_vector_trigger() returns trigger as $$
+begin
+    update books set search_vector = null
+    where bookid in (select bookid from bookparticipants where participantid = new.participantid);
+    return null;
+end
+$$ language plpgsql;
+
+drop trigger if exists participants_search_vector_update on participants;
+create trigger participants_search_vector_update after update of name on participants
+    for each row when (old.name is distinct from new.name)
+    execute function participants_search_vector_trigger();
+
+create index if not exists books_search_vector_idx on books using gin (search_vector);
+create index if not exists books_title_trgm_idx on books using gin (title gin_trgm_ops);
+create index if not exists books_isbn_trgm_idx on books using gin (isbn gin_trgm_ops);
+create index if not exists books_publisher_trgm_idx on books using gin (publisher gin_trgm_ops);
+create index if not exists books_publicationplace_trgm_idx on books using gin (publicationplace gin_trgm_ops);
+create index if not exists participants_name_trgm_idx on participants using gin (name gin_trgm_ops);